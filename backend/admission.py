@@ -0,0 +1,234 @@
+"""
+Priority admission queue in front of LLM calls.
+
+All analyses used to compete for the same threads and LLM concurrency in
+arrival order, so a spike of free users slowed subscribers down just as
+much. ``AdmissionController`` caps the number of concurrent LLM calls and
+orders waiting calls with weighted fair queuing by tier:
+
+- each tier ('subscriber', 'credit', 'free') has a weight; a waiter gets a
+  virtual finish tag of max(virtual time, tier's last tag) + 1/weight and
+  the smallest tag is admitted first, so tiers share capacity in
+  proportion to their weights without starving the lowest one;
+- each tier has a concurrency floor: slots that stay reserved for it while
+  it uses fewer, so a busy lower tier cannot occupy all capacity.
+
+Capacity is ADMISSION_MAX_CONCURRENT, lowered to the LLM guard's adaptive
+concurrency limit whenever that limit is smaller: while the provider is
+failing or slow, calls wait here in tier order instead of being admitted
+and then shed by ``llm_guard.protect``. When the limit drops below the sum
+of the floors, the floors shrink in proportion, and a call of any tier is
+admitted while nothing is in flight: the limit only rises after completed
+calls, so a tier that had to wait for it would never get in.
+
+Calls that wait longer than the queue timeout, or find their tier's queue
+full, are rejected with ``AdmissionRejectedError`` (503 with Retry-After).
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from resilience import LLMUnavailableError, llm_guard
+
+TIERS = ('subscriber', 'credit', 'free')
+
+
+class AdmissionRejectedError(LLMUnavailableError):
+    pass
+
+
+def parse_tier_values(spec, cast=float):
+    """Parse 'subscriber=6,credit=3,free=1' into a dict"""
+    values = {}
+    for item in (spec or '').split(','):
+        name, sep, value = item.partition('=')
+        if sep and name.strip():
+            values[name.strip()] = cast(value)
+    return values
+
+
+class _Waiter:
+    __slots__ = ('tier', 'tag', 'enqueued', 'admitted', 'event')
+
+    def __init__(self, tier, tag):
+        self.tier = tier
+        self.tag = tag
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        self.event = threading.Event()
+
+
+class TierStats:
+    """Counters and a window of recent queue waits for one tier"""
+
+    def __init__(self, window=1000):
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waits = deque(maxlen=window)
+
+    def to_dict(self):
+        waits = sorted(self.waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p / 100.0 * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'wait_ms_p50': pct(50),
+            'wait_ms_p95': pct(95),
+            'wait_ms_max': round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
+
+
+class AdmissionController:
+    """Weighted fair queue with per-tier concurrency floors
+
+    `limit` is an optional callable returning a dynamic concurrency limit;
+    the effective capacity is the smaller of it and `capacity`.
+    """
+
+    def __init__(self, limit=None):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.capacity = 8
+        self.limit = limit
+        self.weights = {'subscriber': 6.0, 'credit': 3.0, 'free': 1.0}
+        self.floors = {'subscriber': 2, 'credit': 1, 'free': 0}
+        self.queue_timeout = 30.0
+        self.max_queue = 100
+        self._reset()
+
+    def _reset(self):
+        self._queues = {tier: deque() for tier in TIERS}
+        self._in_flight = dict.fromkeys(TIERS, 0)
+        self._last_tag = dict.fromkeys(TIERS, 0.0)
+        self._virtual_time = 0.0
+        self._stats = {tier: TierStats() for tier in TIERS}
+
+    def init_app(self, app):
+        config = app.config
+        with self._lock:
+            self.enabled = config.get('ADMISSION_ENABLED', True)
+            self.capacity = config.get('ADMISSION_MAX_CONCURRENT', 8)
+            self.weights.update(parse_tier_values(config.get('ADMISSION_WEIGHTS', '')))
+            self.floors.update(parse_tier_values(config.get('ADMISSION_FLOORS', ''), cast=int))
+            self.queue_timeout = config.get('ADMISSION_QUEUE_TIMEOUT', 30.0)
+            self.max_queue = config.get('ADMISSION_MAX_QUEUE', 100)
+            unknown = (set(self.weights) | set(self.floors)) - set(TIERS)
+            if unknown:
+                raise ValueError(f"Unknown admission tiers {sorted(unknown)} (expected {list(TIERS)})")
+            if sum(self.floors.values()) > self.capacity:
+                raise ValueError("ADMISSION_FLOORS add up to more than ADMISSION_MAX_CONCURRENT")
+            self._reset()
+
+    @property
+    def effective_capacity(self):
+        if self.limit is None:
+            return self.capacity
+        return max(1, min(self.capacity, self.limit()))
+
+    def effective_floors(self, capacity):
+        """Floors scaled down in proportion when they add up to more than `capacity`"""
+        total = sum(self.floors.values())
+        if total <= capacity:
+            return self.floors
+        return {tier: self.floors[tier] * capacity // total for tier in TIERS}
+
+    def _can_admit(self, tier, capacity, floors):
+        # Caller holds the lock
+        total = sum(self._in_flight.values())
+        if total >= capacity:
+            return False
+        if total == 0 or self._in_flight[tier] < floors[tier]:
+            return True
+        reserved = sum(max(0, floors[t] - self._in_flight[t]) for t in TIERS if t != tier)
+        return total + reserved < capacity
+
+    def _dispatch(self):
+        # Caller holds the lock: admit waiters in tag order while slots allow
+        capacity = self.effective_capacity
+        floors = self.effective_floors(capacity)
+        while True:
+            heads = [
+                queue[0] for tier, queue in self._queues.items()
+                if queue and self._can_admit(tier, capacity, floors)
+            ]
+            if not heads:
+                return
+            waiter = min(heads, key=lambda w: w.tag)
+            self._queues[waiter.tier].popleft()
+            self._virtual_time = max(self._virtual_time, waiter.tag)
+            self._in_flight[waiter.tier] += 1
+            stats = self._stats[waiter.tier]
+            stats.admitted += 1
+            stats.waits.append(time.monotonic() - waiter.enqueued)
+            waiter.admitted = True
+            waiter.event.set()
+
+    def acquire(self, tier):
+        """Block until the tier is admitted; raise AdmissionRejectedError otherwise"""
+        with self._lock:
+            if len(self._queues[tier]) >= self.max_queue:
+                self._stats[tier].rejected += 1
+                raise AdmissionRejectedError('Analysis queue is full, try again shortly', 5)
+            tag = max(self._virtual_time, self._last_tag[tier]) + 1.0 / self.weights[tier]
+            self._last_tag[tier] = tag
+            waiter = _Waiter(tier, tag)
+            self._queues[tier].append(waiter)
+            self._dispatch()
+
+        if waiter.event.wait(self.queue_timeout):
+            return
+        with self._lock:
+            if waiter.admitted:
+                return  # admitted just as the wait timed out
+            self._queues[tier].remove(waiter)
+            self._stats[tier].timed_out += 1
+            self._dispatch()
+        raise AdmissionRejectedError('Timed out waiting for analysis capacity', 5)
+
+    def release(self, tier):
+        with self._lock:
+            self._in_flight[tier] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, tier):
+        """Hold one admission slot for `tier` around an LLM call"""
+        if not self.enabled:
+            yield
+            return
+        tier = tier if tier in TIERS else 'free'
+        self.acquire(tier)
+        try:
+            yield
+        finally:
+            self.release(tier)
+
+    def to_dict(self):
+        with self._lock:
+            capacity = self.effective_capacity
+            floors = self.effective_floors(capacity)
+            tiers = {}
+            for tier in TIERS:
+                tiers[tier] = self._stats[tier].to_dict()
+                tiers[tier].update({
+                    'waiting': len(self._queues[tier]),
+                    'in_flight': self._in_flight[tier],
+                    'weight': self.weights[tier],
+                    'floor': self.floors[tier],
+                    'effective_floor': floors[tier],
+                })
+            return {
+                'enabled': self.enabled, 'capacity': self.capacity,
+                'effective_capacity': capacity, 'tiers': tiers,
+            }
+
+
+# llm_guard.init_app replaces the limiter, so look it up on every dispatch
+admission = AdmissionController(limit=lambda: llm_guard.limiter.limit)
@@ -0,0 +1,405 @@
+"""
+Dream analysis engine shared by the blocking, streaming and background job paths.
+"""
+
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert
+
+from models import db, DreamAnalysis, APIUsage, Purchase
+from analysis_cache import analysis_cache
+from singleflight import llm_singleflight
+from llm_backends import LLMNotConfiguredError
+from resilience import llm_guard, LLMUnavailableError, CircuitOpenError
+from eventlog import event_log
+from admission import admission
+from interpreter import interpreter
+from symbols import merge_tags
+from search import search_index
+from similar import similar_index
+from etag import bump as bump_data_version
+
+DEFAULT_ADVICE = "استمر في تدوين أحلامك لفهم أفضل لذاتك."
+COST_PER_TOKEN = 0.000002
+MAX_DREAM_LENGTH = 5000
+
+SYSTEM_PROMPT = (
+    "أنت محلل أحلام خبير ومتخصص في علم النفس. "
+    "استخدم دائماً المعلومات الشخصية المرفقة (إن وجدت) لإضفاء طابع شخصي على التحليل. "
+    "أجب باللغة العربية فقط."
+)
+
+# `fallback` marks results produced by the offline interpreter instead of the LLM
+AnalysisResult = namedtuple('AnalysisResult', ['analysis', 'advice', 'tokens_used', 'cached', 'fallback'],
+                            defaults=[False, False])
+
+# Missing API key, open circuit or shed load: answer with the offline interpreter
+FALLBACK_ERRORS = (LLMNotConfiguredError, LLMUnavailableError)
+
+
+def validate_dream_text(data):
+    """Return (dream_text, error_message) for a request payload"""
+    if not isinstance(data, dict) or 'dreamText' not in data:
+        return None, 'Dream text is required'
+
+    dream_text = data['dreamText']
+    if dream_text is not None and not isinstance(dream_text, str):
+        return None, 'Dream text must be a string'
+
+    dream_text = (dream_text or '').strip()
+    if not dream_text:
+        return None, 'Dream text cannot be empty'
+
+    if len(dream_text) > MAX_DREAM_LENGTH:
+        return None, f'Dream text is too long (max {MAX_DREAM_LENGTH} characters)'
+
+    return dream_text, None
+
+
+def build_messages(dream_text, user_context=None):
+    """Build chat messages with the user context as a dedicated turn"""
+    dream_prompt = (
+        f"الحلم: {dream_text}\n"
+        "يرجى تقديم:\n"
+        "1. تحليل شامل للحلم مع تفسير الرموز والمعاني\n"
+        "2. الرسائل النفسية والعاطفية\n"
+        "3. الدلالات المحتملة في الحياة الواقعية\n"
+        "4. نصائح شخصية مرتبطة بالمعلومات السابقة"
+    )
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+    ]
+
+    if user_context:
+        messages.append({"role": "user", "content": f"معلومات عن الشخص: {user_context}"})
+
+    messages.append({"role": "user", "content": dream_prompt})
+    return messages
+
+
+def split_analysis(ai_response):
+    """Extract analysis and advice sections from the AI response"""
+    if "نصائح:" in ai_response or "النصائح:" in ai_response:
+        parts = ai_response.split("نصائح:" if "نصائح:" in ai_response else "النصائح:")
+        analysis = parts[0].strip()
+        advice = parts[1].strip() if len(parts) > 1 else DEFAULT_ADVICE
+    else:
+        analysis = ai_response
+        advice = DEFAULT_ADVICE
+    return analysis, advice
+
+
+def has_active_subscription(user, now=None):
+    """True when the user has an active, unexpired subscription"""
+    now = now or datetime.utcnow()
+    return bool(
+        user.subscription_status == 'active' and
+        user.subscription_end_date and
+        user.subscription_end_date > now
+    )
+
+
+def user_tier(user, now=None):
+    """Admission tier: 'subscriber', 'credit' (has bought credits) or 'free'"""
+    if has_active_subscription(user, now):
+        return 'subscriber'
+    purchased = db.session.query(Purchase.id).filter(
+        Purchase.user_id == user.id, Purchase.credits_granted > 0
+    ).first()
+    return 'credit' if purchased else 'free'
+
+
+def _prepare_llm_call(dream_text, user_context):
+    config = current_app.config
+    backend = current_app.extensions['llm_backend']
+    messages = build_messages(dream_text, user_context)
+
+    # Sampled and truncated; written off the request thread (EVENT_LOG_* in config.py)
+    event_log.emit('prompt', model=config['OPENAI_MODEL'], messages=messages)
+
+    return backend, messages, {
+        'model': config['OPENAI_MODEL'],
+        'max_tokens': config['OPENAI_MAX_TOKENS'],
+        'temperature': config['OPENAI_TEMPERATURE'],
+    }
+
+
+def _cached_result(key):
+    value = analysis_cache.get(key)
+    if value is None:
+        return None
+    analysis, advice, tokens_used = value
+    return AnalysisResult(analysis, advice, tokens_used, cached=True)
+
+
+def _fallback_result(dream_text, error):
+    """Analyze with the offline interpreter, or re-raise when fallback is disabled"""
+    if not current_app.config.get('ANALYSIS_FALLBACK_ENABLED', True):
+        raise error
+    if isinstance(error, LLMNotConfiguredError):
+        reason = 'not_configured'
+    elif isinstance(error, CircuitOpenError):
+        reason = 'circuit_open'
+    else:
+        reason = 'load_shed'
+    interpreter.record(reason)
+    event_log.emit('fallback', reason=reason, error=str(error))
+    analysis, advice, _ = interpreter.interpret(dream_text)
+    return AnalysisResult(analysis, advice, 0, fallback=True)
+
+
+def _complete_analysis(key, dream_text, user_context, tier):
+    backend, messages, params = _prepare_llm_call(dream_text, user_context)
+
+    try:
+        with admission.slot(tier):
+            started = time.monotonic()
+            with llm_guard.protect():
+                completion = backend.complete(messages, **params)
+    except FALLBACK_ERRORS as e:
+        # Not cached: the LLM should answer this dream once it is available
+        return _fallback_result(dream_text, e)
+    event_log.emit('llm_call', backend=backend.name, mode='complete', tokens=completion.tokens_used,
+                   latency_ms=round((time.monotonic() - started) * 1000, 1))
+    analysis, advice = split_analysis(completion.text)
+    result = AnalysisResult(analysis, advice, completion.tokens_used)
+    analysis_cache.set(key, result[:3])
+    return result
+
+
+def run_analysis(dream_text, user_context=None, tier='free'):
+    """Return an AnalysisResult from the cache or the LLM. Raises on failure.
+
+    Concurrent requests with the same fingerprint share one completion;
+    callers that joined an in-flight call get the result as a cache hit.
+    LLM calls are admitted in priority order of `tier`.
+    """
+    key = analysis_cache.make_key(dream_text, user_context)
+    cached = _cached_result(key)
+    if cached is not None:
+        return cached
+
+    result, shared = llm_singleflight.do(key, lambda: _complete_analysis(key, dream_text, user_context, tier))
+    if shared:
+        return result._replace(cached=True)
+    return result
+
+
+class SectionSplitter:
+    """Incrementally routes streamed text into the analysis and advice sections
+
+    Holds back just enough characters to recognise the advice marker when it
+    is split across two chunks.
+    """
+
+    MARKER = "نصائح:"
+
+    def __init__(self):
+        self.section = 'analysis'
+        self._pending = ''
+
+    def feed(self, text):
+        """Return a list of (section, text) pieces that are safe to emit"""
+        if self.section == 'advice':
+            return [('advice', text)] if text else []
+
+        self._pending += text
+        index = self._pending.find(self.MARKER)
+        if index >= 0:
+            before = self._pending[:index]
+            after = self._pending[index + len(self.MARKER):].lstrip()
+            self._pending = ''
+            self.section = 'advice'
+            return [(s, t) for s, t in (('analysis', before), ('advice', after)) if t]
+
+        keep = len(self.MARKER) - 1
+        if len(self._pending) <= keep:
+            return []
+        ready, self._pending = self._pending[:-keep], self._pending[-keep:]
+        return [('analysis', ready)]
+
+    def flush(self):
+        pending, self._pending = self._pending, ''
+        return [(self.section, pending)] if pending else []
+
+
+def stream_analysis(dream_text, user_context=None, tier='free'):
+    """Yield ('analysis' | 'advice', text) deltas as tokens arrive
+
+    The final item is ('result', AnalysisResult) built from the complete
+    response exactly as run_analysis would build it. Cache hits are emitted
+    as a single delta per section.
+    """
+    key = analysis_cache.make_key(dream_text, user_context)
+    cached = _cached_result(key)
+    if cached is not None:
+        yield 'analysis', cached.analysis
+        yield 'advice', cached.advice
+        yield 'result', cached
+        return
+
+    backend, messages, params = _prepare_llm_call(dream_text, user_context)
+
+    splitter = SectionSplitter()
+    chunks = []
+    tokens_used = 0
+    try:
+        with admission.slot(tier), llm_guard.protect():
+            started = time.monotonic()
+            first_token_ms = None
+            for chunk in backend.stream(messages, **params):
+                if chunk.tokens_used is not None:
+                    tokens_used = chunk.tokens_used
+                if chunk.delta:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.monotonic() - started) * 1000, 1)
+                    chunks.append(chunk.delta)
+                    yield from splitter.feed(chunk.delta)
+    except FALLBACK_ERRORS as e:
+        if chunks:
+            raise  # part of the LLM answer was already sent
+        result = _fallback_result(dream_text, e)
+        yield 'analysis', result.analysis
+        yield 'advice', result.advice
+        yield 'result', result
+        return
+    event_log.emit('llm_call', backend=backend.name, mode='stream', tokens=tokens_used,
+                   latency_ms=round((time.monotonic() - started) * 1000, 1), first_token_ms=first_token_ms)
+
+    yield from splitter.flush()
+    analysis, advice = split_analysis(''.join(chunks).strip())
+    result = AnalysisResult(analysis, advice, tokens_used)
+    analysis_cache.set(key, result[:3])
+    yield 'result', result
+
+
+def save_analysis(user_id, dream_text, result, data=None, endpoint='analyze_dream'):
+    """Add the DreamAnalysis and APIUsage rows to the session (caller commits)"""
+    data = data or {}
+    dream_analysis = DreamAnalysis(
+        user_id=user_id, dream_text=dream_text, analysis=result.analysis, advice=result.advice,
+        mood_before=data.get('mood_before'), mood_after=data.get('mood_after'),
+        tags=merge_tags(data.get('tags'), dream_text)
+    )
+    db.session.add(dream_analysis)
+
+    # Track API usage (cache hits and fallbacks did not call the API)
+    if not result.cached and not result.fallback:
+        api_usage = APIUsage(
+            user_id=user_id, endpoint=endpoint, tokens_used=result.tokens_used,
+            cost=result.tokens_used * COST_PER_TOKEN
+        )
+        db.session.add(api_usage)
+    return dream_analysis
+
+
+def apply_analysis(dream_id, result, endpoint='import_dreams'):
+    """Store `result` on an existing dream (one imported without analysis); caller commits"""
+    dream_analysis = db.session.get(DreamAnalysis, dream_id)
+    if dream_analysis is None:
+        raise LookupError(f'Dream {dream_id} no longer exists')
+    dream_analysis.analysis = result.analysis
+    dream_analysis.advice = result.advice
+
+    if not result.cached and not result.fallback:
+        db.session.add(APIUsage(
+            user_id=dream_analysis.user_id, endpoint=endpoint, tokens_used=result.tokens_used,
+            cost=result.tokens_used * COST_PER_TOKEN
+        ))
+    return dream_analysis
+
+
+def run_batch(items, concurrency, tier='free'):
+    """Analyze (dream_text, user_context) pairs with at most `concurrency` in flight
+
+    Returns one AnalysisResult or Exception per item, in input order.
+    Each worker thread gets its own app context and database session.
+    """
+    app = current_app._get_current_object()
+
+    def analyze_one(item):
+        dream_text, user_context = item
+        with app.app_context():
+            try:
+                return run_analysis(dream_text, user_context, tier)
+            except Exception as e:
+                app.logger.error(f"Batch item analysis error: {str(e)}")
+                return e
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as executor:
+        return list(executor.map(analyze_one, items))
+
+
+def bulk_save_analyses(user_id, entries, endpoint='analyze_dream_batch'):
+    """Insert DreamAnalysis and APIUsage rows for (dream_text, result, data) entries
+
+    Uses one multi-row INSERT per table instead of an ORM add per row.
+    Returns the inserted dream rows as dicts (caller commits).
+    """
+    now = datetime.utcnow()
+    dream_rows = []
+    usage_rows = []
+    for dream_text, result, data in entries:
+        dream_rows.append({
+            'id': str(uuid.uuid4()), 'user_id': user_id, 'dream_text': dream_text,
+            'analysis': result.analysis, 'advice': result.advice,
+            'mood_before': data.get('mood_before'), 'mood_after': data.get('mood_after'),
+            'tags': merge_tags(data.get('tags'), dream_text), 'is_private': True, 'created_at': now, 'updated_at': now
+        })
+        if not result.cached and not result.fallback:
+            usage_rows.append({
+                'id': str(uuid.uuid4()), 'user_id': user_id, 'endpoint': endpoint,
+                'tokens_used': result.tokens_used, 'cost': result.tokens_used * COST_PER_TOKEN,
+                'created_at': now
+            })
+
+    insert_dreams(dream_rows)
+    if usage_rows:
+        db.session.execute(insert(APIUsage), usage_rows)
+    return dream_rows
+
+
+def insert_dreams(dream_rows):
+    """One multi-row INSERT of DreamAnalysis dicts, indexed for search and similar dreams
+
+    Also bumps the owners' data_version (caller commits).
+    """
+    if not dream_rows:
+        return
+    db.session.execute(insert(DreamAnalysis), dream_rows)
+    search_index.index_rows(db.session.connection(), dream_rows)
+    similar_index.stage(db.session, dream_rows)
+    bump_data_version(db.session.connection(), {row['user_id'] for row in dream_rows})
+
+
+def is_billable(result):
+    """Whether a result costs a credit: cache hits and fallbacks may be free"""
+    config = current_app.config
+    if result.cached and not config.get('ANALYSIS_CACHE_CHARGE_CREDITS', True):
+        return False
+    if result.fallback and not config.get('ANALYSIS_FALLBACK_CHARGE_CREDITS', False):
+        return False
+    return True
+
+
+def refund_if_unbilled(reservation, result):
+    """Release the reserved credit when the result is not billable"""
+    if reservation.charged and not is_billable(result):
+        reservation.release()
+
+
+def analysis_response(dream_analysis, cached=False, fallback=False):
+    """Response body shared by every analysis endpoint"""
+    return {
+        'success': True, 'dream_id': dream_analysis.id, 'dream_text': dream_analysis.dream_text,
+        'analysis': dream_analysis.analysis, 'advice': dream_analysis.advice,
+        'timestamp': dream_analysis.created_at.isoformat(), 'cached': cached, 'fallback': fallback
+    }
@@ -0,0 +1,187 @@
+"""
+Two-tier cache of LLM analyses keyed on normalized dream text.
+
+The key hashes the normalized dream text and context together with the model
+parameters, so whitespace, diacritics or tatweel differences hit the same
+entry while a model or temperature change does not. Lookups go to an
+in-process LRU with TTL first and then to the ``analysis_cache`` table,
+which is shared by every worker and survives restarts.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from models import db, AnalysisCacheEntry
+from textnorm import normalize
+
+logger = logging.getLogger(__name__)
+
+# Bump when the key derivation changes so old entries are no longer matched
+KEY_VERSION = 2
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters"""
+
+    FIELDS = ('memory_hits', 'db_hits', 'misses', 'stores', 'evictions', 'expired', 'errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def to_dict(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['memory_hits'] + counts['db_hits'] + counts['misses']
+        hits = counts['memory_hits'] + counts['db_hits']
+        counts['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        return counts
+
+
+class AnalysisCache:
+    """In-process LRU with TTL in front of a persistent database tier"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.stats = CacheStats()
+        self.enabled = False
+        self.persist = False
+        self.max_entries = 1000
+        self.ttl = 3600
+        self.db_ttl = 30 * 24 * 3600
+        self._params = {}
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('ANALYSIS_CACHE_ENABLED', True)
+        self.persist = config.get('ANALYSIS_CACHE_PERSIST', True)
+        self.max_entries = config.get('ANALYSIS_CACHE_SIZE', 1000)
+        self.ttl = config.get('ANALYSIS_CACHE_TTL', 3600)
+        self.db_ttl = config.get('ANALYSIS_CACHE_DB_TTL', 30 * 24 * 3600)
+        self._params = {
+            'model': config.get('OPENAI_MODEL'),
+            'temperature': config.get('OPENAI_TEMPERATURE'),
+            'max_tokens': config.get('OPENAI_MAX_TOKENS'),
+        }
+
+    def make_key(self, dream_text, user_context=None):
+        """Hash normalized input and model parameters into a cache key"""
+        if user_context is not None and not isinstance(user_context, str):
+            user_context = json.dumps(user_context, sort_keys=True, ensure_ascii=False)
+        material = json.dumps([
+            KEY_VERSION,
+            normalize(dream_text),
+            normalize(user_context),
+            self._params.get('model'),
+            self._params.get('temperature'),
+            self._params.get('max_tokens'),
+        ], ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return (analysis, advice, tokens_used) for a key, or None"""
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.stats.incr('memory_hits')
+                    return value
+                del self._entries[key]
+                self.stats.incr('expired')
+
+        if self.persist:
+            value = self._db_get(key)
+            if value is not None:
+                self.stats.incr('db_hits')
+                self._memory_set(key, value)
+                return value
+
+        self.stats.incr('misses')
+        return None
+
+    def set(self, key, value):
+        """Store (analysis, advice, tokens_used) in both tiers"""
+        if not self.enabled:
+            return
+        self._memory_set(key, value)
+        if self.persist:
+            self._db_set(key, value)
+        self.stats.incr('stores')
+
+    def _memory_set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def _db_get(self, key):
+        # Read on a short-lived connection so the lookup never flushes or
+        # extends the caller's session transaction across the LLM call
+        try:
+            with db.engine.connect() as connection:
+                row = connection.execute(
+                    select(AnalysisCacheEntry.analysis, AnalysisCacheEntry.advice,
+                           AnalysisCacheEntry.tokens_used, AnalysisCacheEntry.expires_at)
+                    .where(AnalysisCacheEntry.key == key)
+                ).first()
+        except Exception as e:
+            self.stats.incr('errors')
+            logger.warning(f"Analysis cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        if row.expires_at <= datetime.utcnow():
+            self.stats.incr('expired')
+            return None
+        return (row.analysis, row.advice, row.tokens_used)
+
+    def _db_set(self, key, value):
+        analysis, advice, tokens_used = value
+        now = datetime.utcnow()
+        try:
+            # Own short transaction, like _db_get: a store never joins or
+            # fails the caller's transaction. Replace any older entry.
+            with db.engine.begin() as connection:
+                connection.execute(delete(AnalysisCacheEntry).where(AnalysisCacheEntry.key == key))
+                connection.execute(insert(AnalysisCacheEntry).values(
+                    key=key, analysis=analysis, advice=advice, tokens_used=tokens_used,
+                    model=self._params.get('model'), created_at=now,
+                    expires_at=now + timedelta(seconds=self.db_ttl)
+                ))
+        except Exception as e:
+            self.stats.incr('errors')
+            logger.warning(f"Analysis cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def to_dict(self):
+        stats = self.stats.to_dict()
+        with self._lock:
+            stats['memory_entries'] = len(self._entries)
+        stats.update({'enabled': self.enabled, 'persist': self.persist, 'max_entries': self.max_entries})
+        return stats
+
+
+analysis_cache = AnalysisCache()
@@ -1,6 +1,6 @@
 import os
 import sys
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity, unset_jwt_cookies
 from flask_migrate import Migrate, upgrade
@@ -11,8 +11,33 @@ from logging.handlers import RotatingFileHandler
 
 # Import our modules
 from config import get_config
-from models import db, bcrypt, User, DreamAnalysis, APIUsage
+from models import db, bcrypt, User, DreamAnalysis, AnalysisJob
 from auth import auth_bp
+import llm_backends
+import jsonprovider
+from llm_client import llm_clients
+from analysis import (
+    validate_dream_text, has_active_subscription, user_tier, run_analysis, stream_analysis,
+    run_batch, save_analysis, bulk_save_analyses, is_billable, refund_if_unbilled, analysis_response
+)
+from analysis_cache import analysis_cache
+from singleflight import llm_singleflight
+from resilience import llm_guard, LLMUnavailableError, CircuitOpenError
+from credits import CreditReservation, reserve_credits
+from eventlog import event_log
+from ratelimit import rate_limiter, rate_limit
+from admission import admission
+from interpreter import interpreter
+from search import search_index
+from similar import similar_index
+from pagination import keyset_page, InvalidCursorError
+from projection import parse_fields, row_to_dict, columns as projection_columns
+from etag import user_versions, conditional_get
+from compression import response_compressor
+from export import FORMATS as EXPORT_FORMATS, resume_cursor, export_rows, ndjson_chunks, csv_chunks
+from journal_import import NDJSON_MIMETYPES, ImportFormatError, iter_ndjson, iter_json_array, import_dreams
+from jobs import enqueue_job, job_workers
+from schema import MIGRATIONS_DIR, upgrade_database
 
 def create_app(config_name=None):
     """Application factory pattern"""
@@ -31,10 +56,22 @@ def create_app(config_name=None):
     app.config.from_object(config_class)
     
     # Initialize extensions
+    jsonprovider.init_app(app)
     db.init_app(app)
     bcrypt.init_app(app)
     jwt = JWTManager(app)
-    migrate = Migrate(app, db)
+    migrate = Migrate(app, db, directory=MIGRATIONS_DIR)
+    llm_clients.configure(app.config)
+    llm_backends.init_app(app)
+    analysis_cache.init_app(app)
+    llm_guard.init_app(app)
+    event_log.init_app(app)
+    rate_limiter.init_app(app)
+    admission.init_app(app)
+    search_index.init_app(app)
+    similar_index.init_app(app)
+    user_versions.init_app(app)
+    response_compressor.init_app(app)
     
     # Configure CORS - Allow mobile apps and web clients
     if app.config.get('FLASK_ENV') == 'production':
@@ -94,6 +131,26 @@ def create_app(config_name=None):
             'version': '2.0.0'
         }), 200
     
+    # Runtime metrics endpoint
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics():
+        """Expose per-worker runtime metrics"""
+        return jsonify({
+            'llm_backend': app.extensions['llm_backend'].stats(),
+            'llm_pool': llm_clients.pool_stats(),
+            'analysis_cache': analysis_cache.to_dict(),
+            'singleflight': llm_singleflight.to_dict(),
+            'llm_guard': llm_guard.to_dict(),
+            'event_log': event_log.to_dict(),
+            'rate_limit': rate_limiter.to_dict(),
+            'admission': admission.to_dict(),
+            'fallback': interpreter.to_dict(),
+            'similar': similar_index.to_dict(),
+            'etag': user_versions.to_dict(),
+            'compression': response_compressor.to_dict(),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+    
     # Database status endpoint
     @app.route('/api/database/status', methods=['GET'])
     def database_status():
@@ -176,9 +233,36 @@ def create_app(config_name=None):
         """Test login page"""
         return send_from_directory('.', 'test_login.html')
     
+    def reserve_analysis_credit(user, amount=1):
+        """Reserve credits for an analysis, or return None when the balance is too low"""
+        user_id = user.id
+        if has_active_subscription(user) or amount == 0:
+            db.session.commit()  # end the read transaction before the LLM call
+            return CreditReservation.none(user_id)
+        return CreditReservation.reserve(user_id, amount)
+    
+    def no_credits_response(user, required=1):
+        db.session.rollback()
+        user = User.query.get(user.id)
+        body = {
+            'message': 'No credits available' if required == 1 else 'Not enough credits for this batch',
+            'requires_subscription': True,
+            'subscription_status': user.subscription_status
+        }
+        if required != 1:
+            body.update({'required_credits': required, 'credits': user.credits})
+        return jsonify(body), 402  # Payment Required
+    
+    def llm_unavailable_response(error):
+        """503 with Retry-After for requests shed by the LLM guard"""
+        response = jsonify({'message': str(error), 'retry_after': error.retry_after})
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response, 503
+    
     # Dream analysis endpoint
     @app.route('/api/dreams/analyze', methods=['POST'])
     @jwt_required()
+    @rate_limit('analyze')
     def analyze_dream():
         """Analyze a dream with AI"""
         current_user_id = get_jwt_identity()
@@ -187,170 +271,492 @@ def create_app(config_name=None):
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
-        # Check subscription status
-        now = datetime.utcnow()
-        has_active_subscription = (
-            user.subscription_status == 'active' and 
-            user.subscription_end_date and 
-            user.subscription_end_date > now
-        )
-        
-        # If no active subscription, check credits
-        if not has_active_subscription:
-            if user.credits <= 0:
-                return jsonify({
-                    'message': 'No credits available',
-                    'requires_subscription': True,
-                    'subscription_status': user.subscription_status
-                }), 402  # Payment Required
-            
-            # Consume one credit
-            user.credits -= 1
-        
         data = request.get_json()
-        if not data or 'dreamText' not in data:
-            return jsonify({'message': 'Dream text is required'}), 400
+        dream_text, error = validate_dream_text(data)
+        if error:
+            return jsonify({'message': error}), 400
         
-        dream_text = data['dreamText'].strip()
         # Optional user context (age, gender, etc.) sent from mobile app
         user_context = data.get('context')
-
-        if not dream_text:
-            return jsonify({'message': 'Dream text cannot be empty'}), 400
+        tier = user_tier(user)
         
-        if len(dream_text) > 5000:
-            return jsonify({'message': 'Dream text is too long (max 5000 characters)'}), 400
-
-        # This variable must be declared *before* the try block
-        # so it's accessible in the `finally` clause.
-        original_proxies = (
-            os.environ.get('https_proxy'),
-            os.environ.get('http_proxy')
-        )
+        # Reserve a credit (committed at once) unless the user has an active subscription
+        reservation = reserve_analysis_credit(user)
+        if reservation is None:
+            return no_credits_response(user)
+        user_id = reservation.user_id
 
-        try:
-            # Check for OpenAI API key. If not present, fallback to basic analysis.
-            if not app.config.get('OPENAI_API_KEY'):
-                app.logger.warning("OPENAI_API_KEY not set. Falling back to basic analysis.")
-                raise ValueError("OpenAI API Key not configured.")
+        # Opt-in asynchronous mode: enqueue and let the worker pool call the LLM
+        wants_async = data.get('async') is True or 'respond-async' in request.headers.get('Prefer', '')
+        if wants_async and app.config.get('ANALYSIS_JOBS_ENABLED'):
+            payload = {
+                'dreamText': dream_text, 'context': user_context,
+                'mood_before': data.get('mood_before'), 'mood_after': data.get('mood_after'),
+                'tags': data.get('tags', []), 'tier': tier
+            }
+            try:
+                job = enqueue_job(user_id, payload, credit_charged=reservation.charged)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                reservation.release()
+                app.logger.error(f"Enqueue analysis job error: {str(e)}")
+                return jsonify({'message': 'Analysis failed', 'error': str(e)}), 500
+            reservation.confirm()  # the job owns the credit from here on
+            job_workers.ensure_started()
+            job_workers.notify()
 
-            # To solve proxy issues, we explicitly create an httpx client
-            # with proxies disabled and pass it to the OpenAI client.
-            import httpx
-            from openai import OpenAI
+            status_url = f'/api/dreams/jobs/{job.id}'
+            response = jsonify({
+                'success': True, 'job_id': job.id, 'status': 'queued', 'status_url': status_url
+            })
+            response.headers['Location'] = status_url
+            return response, 202
 
-            http_client_no_proxy = httpx.Client(trust_env=False)
+        try:
+            # No transaction is open here: the LLM call holds no locks
+            result = run_analysis(dream_text, user_context, tier)
+            refund_if_unbilled(reservation, result)
 
-            client = OpenAI(
-                api_key=app.config['OPENAI_API_KEY'],
-                http_client=http_client_no_proxy
-            )
+            # Save successful analysis to database
+            dream_analysis = save_analysis(user_id, dream_text, result, data)
+            db.session.commit()
+            reservation.confirm()
+            
+            return jsonify(analysis_response(dream_analysis, cached=result.cached, fallback=result.fallback)), 200
+            
+        except LLMUnavailableError as e:
+            db.session.rollback()
+            reservation.release()
+            return llm_unavailable_response(e)
+        
+        except Exception as e:
+            db.session.rollback()
+            reservation.release()
+            app.logger.error(f"Dream analysis error: {str(e)}")
+            return jsonify({'message': 'Analysis failed', 'error': str(e)}), 500
 
-            # -------- Build messages with context as a dedicated turn --------
-            system_msg = (
-                "أنت محلل أحلام خبير ومتخصص في علم النفس. "
-                "استخدم دائماً المعلومات الشخصية المرفقة (إن وجدت) لإضفاء طابع شخصي على التحليل. "
-                "أجب باللغة العربية فقط."
-            )
+    # Streaming dream analysis (Server-Sent Events)
+    @app.route('/api/dreams/analyze/stream', methods=['POST'])
+    @jwt_required()
+    @rate_limit('analyze')
+    def analyze_dream_stream():
+        """Analyze a dream and stream the response as Server-Sent Events"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+        
+        data = request.get_json()
+        dream_text, error = validate_dream_text(data)
+        if error:
+            return jsonify({'message': error}), 400
+        
+        user_context = data.get('context')
+        tier = user_tier(user)
 
-            dream_prompt = (
-                f"الحلم: {dream_text}\n"
-                "يرجى تقديم:\n"
-                "1. تحليل شامل للحلم مع تفسير الرموز والمعاني\n"
-                "2. الرسائل النفسية والعاطفية\n"
-                "3. الدلالات المحتملة في الحياة الواقعية\n"
-                "4. نصائح شخصية مرتبطة بالمعلومات السابقة"
+        # Fail fast while the LLM circuit is open, unless the offline interpreter answers instead
+        if not llm_guard.available() and not app.config['ANALYSIS_FALLBACK_ENABLED']:
+            return llm_unavailable_response(
+                CircuitOpenError('LLM circuit is open', app.config['LLM_BREAKER_RESET_TIMEOUT'])
             )
+        
+        reservation = reserve_analysis_credit(user)
+        if reservation is None:
+            return no_credits_response(user)
+        user_id = reservation.user_id
 
-            messages = [
-                {"role": "system", "content": system_msg},
-            ]
+        def sse(event, payload):
+            return f"event: {event}\ndata: {app.json.dumps(payload)}\n\n"
 
-            if user_context:
-                messages.append({"role": "user", "content": f"معلومات عن الشخص: {user_context}"})
+        def generate():
+            # Flush headers and a first event immediately to minimise time-to-first-byte
+            yield sse('start', {'status': 'analyzing'})
+            try:
+                result = None
+                for section, value in stream_analysis(dream_text, user_context, tier):
+                    if section == 'result':
+                        result = value
+                    else:
+                        yield sse(section, {'delta': value})
 
-            messages.append({"role": "user", "content": dream_prompt})
+                # Persist exactly as the blocking endpoint does
+                refund_if_unbilled(reservation, result)
+                dream_analysis = save_analysis(user_id, dream_text, result, data)
+                db.session.commit()
+                reservation.confirm()
+                yield sse('done', analysis_response(dream_analysis, cached=result.cached, fallback=result.fallback))
 
-            # Log the messages for debugging (will appear in Railway logs)
-            app.logger.info("PROMPT_MESSAGES=%s", messages)
-            print("PROMPT_MESSAGES=", messages, flush=True)
+            except LLMUnavailableError as e:
+                db.session.rollback()
+                reservation.release()
+                yield sse('error', {'message': str(e), 'retry_after': e.retry_after})
 
-            response = client.chat.completions.create(
-                model=app.config['OPENAI_MODEL'],
-                messages=messages,
-                max_tokens=app.config['OPENAI_MAX_TOKENS'],
-                temperature=app.config['OPENAI_TEMPERATURE']
-            )
-            ai_response = response.choices[0].message.content.strip()
-            tokens_used = response.usage.total_tokens
-            
-            # Extract analysis and advice from AI response
-            if "نصائح:" in ai_response or "النصائح:" in ai_response:
-                parts = ai_response.split("نصائح:" if "نصائح:" in ai_response else "النصائح:")
-                analysis = parts[0].strip()
-                advice = parts[1].strip() if len(parts) > 1 else "استمر في تدوين أحلامك لفهم أفضل لذاتك."
-            else:
-                analysis = ai_response
-                advice = "استمر في تدوين أحلامك لفهم أفضل لذاتك."
+            except Exception as e:
+                db.session.rollback()
+                reservation.release()
+                app.logger.error(f"Dream analysis stream error: {str(e)}")
+                yield sse('error', {'message': 'Analysis failed', 'error': str(e)})
 
-            # Save successful analysis to database
-            dream_analysis = DreamAnalysis(
-                user_id=user.id, dream_text=dream_text, analysis=analysis, advice=advice,
-                mood_before=data.get('mood_before'), mood_after=data.get('mood_after'), tags=data.get('tags', [])
-            )
-            db.session.add(dream_analysis)
+            finally:
+                # Client disconnected mid-stream: nothing was stored, give the credit back
+                if not reservation.settled:
+                    db.session.rollback()
+                    reservation.release()
 
-            # Track API usage
-            api_usage = APIUsage(
-                user_id=user.id, endpoint='analyze_dream', tokens_used=tokens_used,
-                cost=tokens_used * 0.000002
-            )
-            db.session.add(api_usage)
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    # Batch dream analysis
+    @app.route('/api/dreams/analyze/batch', methods=['POST'])
+    @jwt_required()
+    @rate_limit('analyze_batch')
+    def analyze_dream_batch():
+        """Analyze several dreams with bounded concurrency"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+        
+        data = request.get_json()
+        items = data.get('dreams') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return jsonify({'message': 'A non-empty dreams list is required'}), 400
+        
+        max_items = app.config['ANALYSIS_BATCH_MAX_ITEMS']
+        if len(items) > max_items:
+            return jsonify({'message': f'Too many dreams in one batch (max {max_items})'}), 400
+        
+        # Validate every item up front; invalid items are reported and never charged
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            dream_text, error = validate_dream_text(item if isinstance(item, dict) else None)
+            if error:
+                results[index] = {'index': index, 'success': False, 'message': error}
+            else:
+                valid.append((index, dream_text, item))
+        
+        # Check and reserve credits once for the whole batch
+        tier = user_tier(user)
+        reservation = reserve_analysis_credit(user, len(valid))
+        if reservation is None:
+            return no_credits_response(user, required=len(valid))
+        user_id = reservation.user_id
+        
+        outcomes = run_batch(
+            [(dream_text, item.get('context')) for _, dream_text, item in valid],
+            app.config['ANALYSIS_BATCH_CONCURRENCY'],
+            tier
+        )
+        
+        try:
+            entries = []
+            refund = 0
+            for (index, dream_text, item), outcome in zip(valid, outcomes):
+                if isinstance(outcome, Exception):
+                    results[index] = {
+                        'index': index, 'success': False, 'message': 'Analysis failed', 'error': str(outcome)
+                    }
+                    if isinstance(outcome, LLMUnavailableError):
+                        results[index]['retry_after'] = outcome.retry_after
+                    refund += 1
+                    continue
+                if not is_billable(outcome):
+                    refund += 1
+                entries.append((index, dream_text, outcome, item))
             
+            rows = bulk_save_analyses(user_id, [(d, r, item) for _, d, r, item in entries])
+            for (index, _, outcome, _), row in zip(entries, rows):
+                results[index] = {
+                    'index': index, 'success': True, 'dream_id': row['id'], 'dream_text': row['dream_text'],
+                    'analysis': row['analysis'], 'advice': row['advice'],
+                    'timestamp': row['created_at'].isoformat(), 'cached': outcome.cached,
+                    'fallback': outcome.fallback
+                }
             db.session.commit()
             
-            return jsonify({
-                'success': True, 'dream_id': dream_analysis.id, 'dream_text': dream_analysis.dream_text,
-                'analysis': dream_analysis.analysis, 'advice': dream_analysis.advice,
-                'timestamp': dream_analysis.created_at.isoformat()
-            }), 200
-            
         except Exception as e:
             db.session.rollback()
-            app.logger.error(f"Dream analysis error: {str(e)}")
-            return jsonify({'message': 'Analysis failed', 'error': str(e)}), 500
+            reservation.release()
+            app.logger.error(f"Batch analysis save error: {str(e)}")
+            return jsonify({'message': 'Batch analysis failed', 'error': str(e)}), 500
+        
+        reservation.release(refund)
+        reservation.confirm()
+        
+        succeeded = sum(1 for r in results if r['success'])
+        return jsonify({
+            'success': succeeded > 0,
+            'results': results,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'credits_charged': reservation.amount
+        }), 200
+
+    # Poll an asynchronous analysis job
+    @app.route('/api/dreams/jobs/<job_id>', methods=['GET'])
+    @jwt_required()
+    def get_analysis_job(job_id):
+        """Get status and result of an analysis job"""
+        current_user_id = get_jwt_identity()
+        job = AnalysisJob.query.filter_by(id=job_id, user_id=current_user_id).first()
+        if not job:
+            return jsonify({'message': 'Job not found'}), 404
+        
+        if app.config.get('ANALYSIS_JOBS_ENABLED'):
+            job_workers.ensure_started()
         
-        finally:
-            # ALWAYS restore original proxy settings
-            https_proxy, http_proxy = original_proxies
-            if https_proxy:
-                os.environ['https_proxy'] = https_proxy
-            if http_proxy:
-                os.environ['http_proxy'] = http_proxy
+        body = {'success': True, 'job': job.to_dict()}
+        if job.status == 'succeeded' and job.dream:
+            body.update(analysis_response(job.dream))
+            body['dream'] = job.dream.to_dict()
+        return jsonify(body), 200
 
+    # Search the user's dreams
+    @app.route('/api/dreams/search', methods=['GET'])
+    @jwt_required()
+    def search_dreams():
+        """Full-text search over the user's dream history, best matches first"""
+        current_user_id = get_jwt_identity()
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'message': 'Search query (q) is required'}), 400
+        
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+        
+        matches, total = search_index.search(current_user_id, query, limit=per_page, offset=(page - 1) * per_page)
+        dreams = {
+            dream.id: dream for dream in
+            DreamAnalysis.query.filter(DreamAnalysis.id.in_([dream_id for dream_id, _ in matches]))
+        } if matches else {}
+        results = []
+        for dream_id, score in matches:
+            if dream_id in dreams:
+                results.append(dict(dreams[dream_id].to_dict(), score=round(score, 4)))
+        
+        return jsonify({
+            'success': True, 'query': query, 'dreams': results,
+            'total': total, 'pages': (total + per_page - 1) // per_page, 'current_page': page, 'per_page': per_page
+        }), 200
+    
+    # Dreams most like one of the user's dreams
+    @app.route('/api/dreams/<dream_id>/similar', methods=['GET'])
+    @jwt_required()
+    def similar_dreams(dream_id):
+        """The user's past dreams closest to this one, most similar first"""
+        current_user_id = get_jwt_identity()
+        dream = DreamAnalysis.query.filter_by(id=dream_id, user_id=current_user_id).first()
+        if not dream:
+            return jsonify({'message': 'Dream not found'}), 404
+        if not similar_index.available:
+            return jsonify({'message': 'Similar dreams are not available'}), 503
+        
+        limit = min(max(request.args.get('limit', 5, type=int), 1), 20)
+        # Ask for extra matches: dreams deleted since they were indexed are skipped below
+        matches = similar_index.similar(current_user_id, dream.id, dream.dream_text, limit=limit * 2)
+        dreams = {
+            d.id: d for d in
+            DreamAnalysis.query.filter(DreamAnalysis.id.in_([match_id for match_id, _ in matches]))
+        } if matches else {}
+        results = [
+            dict(dreams[match_id].to_dict(), similarity=round(score, 4))
+            for match_id, score in matches if match_id in dreams
+        ][:limit]
+        similar_index.note_deleted(current_user_id, [match_id for match_id, _ in matches if match_id not in dreams])
+        
+        return jsonify({'success': True, 'dream_id': dream.id, 'similar': results}), 200
+    
     # Get user's dreams
     @app.route('/api/dreams', methods=['GET'])
     @jwt_required()
+    @conditional_get
     def get_dreams():
-        """Get user's dream history"""
+        """Get user's dream history, newest first
+        
+        Pass the returned next_cursor as ?cursor= for the next page; add
+        include_total=true for an exact count. ?page= keeps the older
+        offset pagination for existing clients. ?view=summary or
+        ?fields=a,b,c return only those fields (see projection.py).
+        """
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+        try:
+            fields = parse_fields(request.args.get('view'), request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
         
-        dreams = DreamAnalysis.query.filter_by(user_id=user.id)\
-            .order_by(DreamAnalysis.created_at.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        if fields:
+            query = db.session.query(*projection_columns(fields)).filter(DreamAnalysis.user_id == user.id)
+            serialize = lambda row: row_to_dict(row, fields)
+        else:
+            query = DreamAnalysis.query.filter_by(user_id=user.id)
+            serialize = lambda dream: dream.to_dict()
         
-        return jsonify({
+        if 'page' in request.args and 'cursor' not in request.args:
+            page = request.args.get('page', 1, type=int)
+            dreams = query.order_by(DreamAnalysis.created_at.desc(), DreamAnalysis.id.desc())\
+                .paginate(page=page, per_page=per_page, error_out=False)
+            return jsonify({
+                'success': True,
+                'dreams': [serialize(dream) for dream in dreams.items],
+                'total': dreams.total, 'pages': dreams.pages, 'current_page': page, 'per_page': per_page
+            }), 200
+        
+        try:
+            dreams, next_cursor = keyset_page(
+                query, DreamAnalysis.created_at, DreamAnalysis.id,
+                cursor=request.args.get('cursor'), per_page=per_page
+            )
+        except InvalidCursorError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        
+        body = {
             'success': True,
-            'dreams': [dream.to_dict() for dream in dreams.items],
-            'total': dreams.total, 'pages': dreams.pages, 'current_page': page, 'per_page': per_page
-        }), 200
+            'dreams': [serialize(dream) for dream in dreams],
+            'next_cursor': next_cursor, 'has_more': next_cursor is not None, 'per_page': per_page
+        }
+        if request.args.get('include_total', 'false').lower() == 'true':
+            body['total'] = DreamAnalysis.query.filter_by(user_id=user.id).count()
+        return jsonify(body), 200
+
+    # Import a journal from another app
+    @app.route('/api/dreams/import', methods=['POST'])
+    @jwt_required()
+    @rate_limit('import')
+    def import_journal():
+        """Bulk-insert dreams from an NDJSON or JSON array body (see journal_import.py)
+
+        ?analyze=true queues an analysis job per imported dream, charged
+        one credit each (free for subscribers); needs background jobs.
+        """
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+
+        analyze = request.args.get('analyze', 'false').lower() == 'true'
+        if analyze and not app.config.get('ANALYSIS_JOBS_ENABLED'):
+            return jsonify({'message': 'Analysis of imported dreams is not available'}), 400
+        if request.mimetype in NDJSON_MIMETYPES:
+            items = iter_ndjson(request.stream)
+        elif request.mimetype == 'application/json':
+            items = iter_json_array(request.stream)
+        else:
+            return jsonify({'message': 'Send NDJSON (application/x-ndjson) or a JSON array (application/json)'}), 415
+
+        user_id = user.id
+        tier = user_tier(user)
+        charged = not has_active_subscription(user)
+        try:
+            result = import_dreams(
+                user_id, items, chunk_size=app.config['IMPORT_CHUNK_SIZE'], max_rows=app.config['IMPORT_MAX_ROWS'],
+                max_errors=app.config['IMPORT_MAX_ERRORS'], analyze=analyze
+            )
+            body = {'success': result.imported > 0, **result.to_dict()}
+            if result.to_analyze:
+                # Credits, dreams and jobs are committed together
+                if charged and not reserve_credits(user_id, len(result.to_analyze), commit=False):
+                    return no_credits_response(user, required=len(result.to_analyze))
+                jobs = [
+                    enqueue_job(user_id, {'dreamText': text, 'dream_id': dream_id, 'tier': tier}, credit_charged=charged)
+                    for dream_id, text in result.to_analyze
+                ]
+                db.session.flush()
+                body['jobs'] = [job.id for job in jobs]
+                body['credits_charged'] = len(jobs) if charged else 0
+            db.session.commit()
+
+        except ImportFormatError as e:
+            db.session.rollback()
+            return jsonify({'message': str(e)}), 400
+
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Journal import error: {str(e)}")
+            return jsonify({'message': 'Import failed', 'error': str(e)}), 500
+
+        if result.to_analyze:
+            job_workers.ensure_started()
+            job_workers.notify()
+        return jsonify(body), 200
+
+    # Export the whole journal as one stream
+    @app.route('/api/dreams/export', methods=['GET'])
+    @jwt_required()
+    @rate_limit('export')
+    def export_dreams():
+        """Stream every dream of the user, newest first, as NDJSON (default) or CSV
+
+        ?format=ndjson|csv, ?view= / ?fields= as for /api/dreams. To resume
+        an interrupted export pass ?after=<id of the last dream received>
+        (or a /api/dreams next_cursor as ?cursor=).
+        """
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'message': f"Unknown format '{export_format}' (allowed: {', '.join(EXPORT_FORMATS)})"}), 400
+        try:
+            fields = parse_fields(request.args.get('view'), request.args.get('fields')) or DreamAnalysis.to_dict.fields
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        cursor = request.args.get('cursor')
+        after = request.args.get('after')
+        if after:
+            cursor = resume_cursor(user.id, after)
+            if cursor is None:
+                return jsonify({'message': 'Dream to resume after not found'}), 400
+        try:
+            batches = export_rows(user.id, fields, cursor, app.config['EXPORT_BATCH_SIZE'])
+        except InvalidCursorError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+
+        if export_format == 'csv':
+            chunks = csv_chunks(batches, fields, header=not cursor)
+        else:
+            chunks = ndjson_chunks(batches, fields, app.json.dumps)
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        filename = f"dreams-{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Cache-Control': 'no-store',
+                'X-Accel-Buffering': 'no',
+            }
+        )
+
+    # Get one dream in full
+    @app.route('/api/dreams/<dream_id>', methods=['GET'])
+    @jwt_required()
+    @conditional_get
+    def get_dream(dream_id):
+        """Full text of one of the user's dreams"""
+        current_user_id = get_jwt_identity()
+        dream = DreamAnalysis.query.filter_by(id=dream_id, user_id=current_user_id).first()
+        if not dream:
+            return jsonify({'message': 'Dream not found'}), 404
+        return jsonify({'success': True, 'dream': dream.to_dict()}), 200
             
+    # Background analysis workers (only when async jobs are enabled)
+    job_workers.init_app(app)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -366,9 +772,9 @@ def create_app(config_name=None):
 # Create the app instance for gunicorn
 app = create_app()
 
-# Initialize database tables
+# Create or migrate the database tables
 with app.app_context():
-    db.create_all()
+    upgrade_database()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
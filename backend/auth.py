@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 from email_validator import validate_email, EmailNotValidError
 import re
 from models import db, User, UserSession, DreamAnalysis
+from ratelimit import rate_limit
+from etag import conditional_get
 from functools import wraps
 import traceback
 
@@ -34,6 +36,7 @@ def validate_password(password):
     return True, "Password is valid"
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit('register', per='ip')
 def register():
     """Register a new user"""
     try:
@@ -134,6 +137,7 @@ def register():
         return jsonify({'message': 'Registration failed', 'error': str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('login', per='ip')
 def login():
     """Login user"""
     try:
@@ -251,6 +255,7 @@ def refresh():
 
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
+@conditional_get
 def get_profile():
     """Get user profile"""
     try:
@@ -322,6 +327,7 @@ def update_profile():
 
 @auth_bp.route('/change-password', methods=['POST'])
 @jwt_required()
+@rate_limit('change_password')
 def change_password():
     """Change user password"""
     try:
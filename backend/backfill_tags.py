@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Add automatically extracted symbol tags to existing dream analyses.
+
+New analyses are tagged when they are saved; this fills in the rows
+stored before. Safe to run repeatedly: client tags are kept and only
+missing symbols are appended.
+
+Usage:
+    python backfill_tags.py --batch-size 500
+"""
+
+import argparse
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill DreamAnalysis.tags from dream text')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    from app import app
+    from symbols import backfill_tags
+
+    started = time.perf_counter()
+    with app.app_context():
+        updated = backfill_tags(batch_size=args.batch_size)
+    print(f"Tagged {updated} dreams in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
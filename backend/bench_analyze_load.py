@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Offline load test of the dream analysis endpoint.
+
+Runs the whole Flask stack in-process against a temporary SQLite database
+with the stub LLM backend, so no network access or OpenAI tokens are needed.
+
+Usage:
+    python bench_analyze_load.py --requests 200 --concurrency 16 --latency lognormal:800,0.4
+    python bench_analyze_load.py --tiers subscriber=0.2,credit=0.3,free=0.5 --concurrency 32
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test /api/dreams/analyze with the stub LLM')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', default='lognormal:800,0.4', help='STUB_LLM_LATENCY_MS distribution')
+    parser.add_argument('--tokens', default='uniform:350,650', help='STUB_LLM_TOKENS distribution')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--unique', type=int, default=0, help='number of distinct dreams (0 = all unique)')
+    parser.add_argument('--endpoint', default='/api/dreams/analyze')
+    parser.add_argument('--tiers', default='free=1', help='share of requests per tier, e.g. subscriber=0.2,free=0.8')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    args = parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='dream-bench-')
+    os.environ.update({
+        'FLASK_ENV': 'development',
+        'DATABASE_URL': f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+        'LLM_BACKEND': 'stub',
+        'STUB_LLM_LATENCY_MS': args.latency,
+        'STUB_LLM_TOKENS': args.tokens,
+        'STUB_LLM_FAILURE_RATE': str(args.failure_rate),
+        'RATELIMIT_ENABLED': 'false',
+    })
+
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from app import app
+    from admission import parse_tier_values
+    from models import db, User, Purchase
+
+    shares = parse_tier_values(args.tiers)
+    with app.app_context():
+        for tier in shares:
+            user = User(email=f'{tier}@example.com', username=f'bench-{tier}', credits=args.requests * 2)
+            user.set_password('benchmark')
+            if tier == 'subscriber':
+                user.subscription_status = 'active'
+                user.subscription_end_date = datetime.utcnow() + timedelta(days=30)
+            db.session.add(user)
+            db.session.flush()
+            if tier == 'credit':
+                db.session.add(Purchase(
+                    user_id=user.id, product_id='pack_10_dreams', purchase_token=f'bench-{user.id}',
+                    purchase_time=datetime.utcnow(), purchase_state=0, consumption_state=1,
+                    acknowledgement_state=1, credits_granted=10, is_subscription=False
+                ))
+        db.session.commit()
+
+    client = app.test_client()
+    tier_headers = {}
+    for tier in shares:
+        login = {'login': f'bench-{tier}', 'password': 'benchmark'}
+        tier_headers[tier] = {'Authorization': f"Bearer {client.post('/api/auth/login', json=login).json['access_token']}"}
+
+    # Deterministic interleaving of tiers in proportion to their shares
+    schedule = []
+    credit_by_tier = dict.fromkeys(shares, 0.0)
+    for _ in range(args.requests):
+        for tier in shares:
+            credit_by_tier[tier] += shares[tier]
+        tier = max(credit_by_tier, key=credit_by_tier.get)
+        credit_by_tier[tier] -= sum(shares.values())
+        schedule.append(tier)
+
+    latencies = []
+    tier_latencies = defaultdict(list)
+    statuses = Counter()
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker():
+        local = app.test_client()
+        for i in counter:
+            n = i % args.unique if args.unique else i
+            tier = schedule[i]
+            started = time.perf_counter()
+            response = local.post(args.endpoint, json={'dreamText': f'رأيت في المنام رقم {n} أنني أطير فوق البحر'},
+                                  headers=tier_headers[tier])
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                tier_latencies[tier].append(elapsed)
+                statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    print(f"requests={args.requests} concurrency={args.concurrency} latency={args.latency}")
+    print(f"wall={wall:.2f}s throughput={args.requests / wall:.1f} req/s")
+    print(f"status codes: {dict(statuses)}")
+    print(
+        f"latency ms: mean={statistics.mean(latencies) * 1000:.1f} "
+        f"p50={percentile(latencies, 50) * 1000:.1f} p95={percentile(latencies, 95) * 1000:.1f} "
+        f"p99={percentile(latencies, 99) * 1000:.1f} max={max(latencies) * 1000:.1f}"
+    )
+    if len(shares) > 1:
+        for tier, values in tier_latencies.items():
+            print(f"  {tier}: n={len(values)} p50={percentile(values, 50) * 1000:.1f} "
+                  f"p95={percentile(values, 95) * 1000:.1f}")
+    print(f"metrics: {client.get('/api/metrics').json}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
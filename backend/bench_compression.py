@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+CPU cost vs bytes saved of response compression on dream-history payloads.
+
+Builds one user's journal of Arabic dreams with analyses of realistic
+length, fetches the real responses (full history page, summary page, one
+dream) through the app without compression, then times each encoding and
+level on those bodies: compressed size, ratio, milliseconds per response
+and input MB/s. Finally it requests the same pages with Accept-Encoding so
+the middleware's own overhead is visible end to end.
+
+Usage:
+    python bench_compression.py --dreams 200 --per-page 20
+    python bench_compression.py --gzip-levels 1,6,9 --brotli-qualities 1,4,6,11
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+WORDS = (
+    'رأيت في المنام أنني أمشي في سوق قديم مزدحم بالناس والبيوت الطينية '
+    'ثم ظهر لي رجل يلبس ثوبا أبيض وأعطاني مفتاحا من ذهب وقال افتح الباب '
+    'فوجدت بحرا واسعا وسفينة بيضاء وأمي تنادي من بعيد وكنت خائفا وسعيدا '
+    'تدل رؤيا البحر على السعة في الرزق والمفتاح على الفرج بعد الضيق والثوب '
+    'الأبيض على صفاء النية وننصحك بالصبر والدعاء والتأمل في علاقاتك العائلية'
+).split()
+
+
+def paragraph(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark gzip/brotli on dream history responses')
+    parser.add_argument('--dreams', type=int, default=200)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--gzip-levels', default='1,6,9')
+    parser.add_argument('--brotli-qualities', default='1,4,6,11')
+    parser.add_argument('--runs', type=int, default=30)
+    return parser.parse_args()
+
+
+def median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    args = parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='dream-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'development'
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert
+    from app import app
+    from compression import brotli, response_compressor
+    from models import db, User, DreamAnalysis
+
+    rng = random.Random(42)
+    with app.app_context():
+        user = User(email=f'{uuid.uuid4().hex}@bench.local', username=uuid.uuid4().hex[:20], credits=0)
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        token = create_access_token(identity=user_id)
+        now = datetime.utcnow()
+        db.session.execute(insert(DreamAnalysis), [{
+            'id': str(uuid.uuid4()), 'user_id': user_id,
+            'dream_text': paragraph(rng, rng.randint(40, 160)),
+            'analysis': paragraph(rng, rng.randint(250, 500)),
+            'advice': paragraph(rng, rng.randint(40, 100)),
+            'tags': rng.sample(['بحر', 'مفتاح', 'أم', 'سفينة', 'سوق', 'خوف'], 3),
+            'created_at': now - timedelta(hours=n), 'updated_at': now,
+        } for n in range(args.dreams)])
+        db.session.commit()
+        dream_id = db.session.query(DreamAnalysis.id).first()[0]
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    pages = {
+        'history_full': ('/api/dreams', {'per_page': args.per_page}),
+        'history_summary': ('/api/dreams', {'per_page': args.per_page, 'view': 'summary'}),
+        'dream': (f'/api/dreams/{dream_id}', {}),
+    }
+    bodies = {}
+    for name, (path, params) in pages.items():
+        response = client.get(path, query_string=params, headers=dict(headers, **{'Accept-Encoding': 'identity'}))
+        assert response.status_code == 200 and 'Content-Encoding' not in response.headers
+        bodies[name] = response.get_data()
+
+    codecs = [('gzip', int(level)) for level in args.gzip_levels.split(',')]
+    if brotli is not None:
+        codecs += [('br', int(quality)) for quality in args.brotli_qualities.split(',')]
+    else:
+        print('Brotli is not installed: gzip only')
+
+    print(f"{'payload':<16} {'codec':<8} {'bytes':>9} {'ratio':>7} {'ms':>8} {'MB/s':>8}")
+    saved_gzip, saved_br = response_compressor.gzip_level, response_compressor.brotli_quality
+    for name, body in bodies.items():
+        print(f"{name:<16} {'none':<8} {len(body):>9}")
+        for encoding, level in codecs:
+            if encoding == 'br':
+                response_compressor.brotli_quality = level
+            else:
+                response_compressor.gzip_level = level
+            compressed = response_compressor.compress(body, encoding)
+            ms = median_ms(lambda: response_compressor.compress(body, encoding), args.runs)
+            mbps = len(body) / 1e6 / (ms / 1000) if ms else float('inf')
+            print(f"{'':<16} {f'{encoding}-{level}':<8} {len(compressed):>9} "
+                  f"{len(compressed) / len(body):>7.3f} {ms:>8.3f} {mbps:>8.1f}")
+    response_compressor.gzip_level, response_compressor.brotli_quality = saved_gzip, saved_br
+
+    print(f"\nend to end (gzip-{saved_gzip}, br-{saved_br}, min size {response_compressor.min_size} B)")
+    print(f"{'payload':<16} {'encoding':<9} {'bytes':>9} {'ms':>8}")
+    for name, (path, params) in pages.items():
+        for accept in ('identity', 'gzip', 'br'):
+            if accept == 'br' and brotli is None:
+                continue
+            request_headers = dict(headers, **{'Accept-Encoding': accept})
+            response = client.get(path, query_string=params, headers=request_headers)
+            ms = median_ms(lambda: client.get(path, query_string=params, headers=request_headers), args.runs)
+            print(f"{name:<16} {response.headers.get('Content-Encoding', 'identity'):<9} "
+                  f"{len(response.get_data()):>9} {ms:>8.2f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
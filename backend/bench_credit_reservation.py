@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark of credit charging around the LLM call.
+
+Compares the legacy pattern (read the balance, decrement it in the ORM
+session, call the LLM, commit) with reservations (atomic conditional UPDATE
+committed at once, LLM called with no transaction open, then confirm or
+release). Many threads spend the credits of one user at the same time.
+
+Reported per mode:
+- overspend: analyses stored beyond the credits the user actually had
+- lock wait: time each attempt spent beyond the simulated LLM latency
+- errors: attempts that failed, e.g. "database is locked"
+
+Usage:
+    python bench_credit_reservation.py --threads 16 --credits 20 --attempts 64 --latency 50
+    DATABASE_URL=postgresql://... python bench_credit_reservation.py
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark credit charging under concurrency')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--credits', type=int, default=20, help='starting balance of the user')
+    parser.add_argument('--attempts', type=int, default=64, help='total analyses attempted')
+    parser.add_argument('--latency', type=float, default=50.0, help='simulated LLM latency in ms')
+    parser.add_argument('--mode', choices=['legacy', 'reservation', 'both'], default='both')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    args = parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        db_dir = tempfile.mkdtemp(prefix='dream-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'development'
+
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from app import app
+    from models import db, User, DreamAnalysis
+    from credits import CreditReservation
+
+    latency = args.latency / 1000.0
+
+    def store(user_id, n):
+        db.session.add(DreamAnalysis(user_id=user_id, dream_text=f'حلم {n}', analysis='تحليل', advice='نصيحة'))
+
+    def legacy_attempt(user_id, n):
+        # The pre-reservation endpoint: check-then-decrement, commit after the LLM
+        user = db.session.get(User, user_id)
+        if user.credits <= 0:
+            db.session.rollback()
+            return 'no_credits'
+        user.credits -= 1
+        db.session.flush()
+        time.sleep(latency)
+        store(user_id, n)
+        db.session.commit()
+        return 'ok'
+
+    def reservation_attempt(user_id, n):
+        reservation = CreditReservation.reserve(user_id)
+        if reservation is None:
+            return 'no_credits'
+        try:
+            time.sleep(latency)
+            store(user_id, n)
+            db.session.commit()
+            reservation.confirm()
+        except Exception:
+            db.session.rollback()
+            reservation.release()
+            raise
+        return 'ok'
+
+    def run(mode, attempt):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(email=f'{mode}@example.com', username=mode, credits=args.credits)
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+        outcomes = Counter()
+        waits = []
+        lock = threading.Lock()
+        counter = iter(range(args.attempts))
+
+        def worker():
+            for n in counter:
+                with app.app_context():
+                    started = time.perf_counter()
+                    try:
+                        outcome = attempt(user_id, n)
+                    except Exception as e:
+                        db.session.rollback()
+                        outcome = f'error: {type(e).__name__}'
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    outcomes[outcome] += 1
+                    if outcome == 'ok':
+                        waits.append(max(0.0, elapsed - latency))
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        with app.app_context():
+            stored = DreamAnalysis.query.filter_by(user_id=user_id).count()
+            balance = db.session.get(User, user_id).credits
+
+        errors = sum(count for outcome, count in outcomes.items() if outcome.startswith('error'))
+        print(f"[{mode}] wall={wall:.2f}s outcomes={dict(outcomes)}")
+        print(f"[{mode}] stored={stored} final_balance={balance} "
+              f"overspend={max(0, stored - args.credits)} errors={errors}")
+        if waits:
+            print(f"[{mode}] lock wait ms: mean={statistics.mean(waits) * 1000:.1f} "
+                  f"p50={percentile(waits, 50) * 1000:.1f} p95={percentile(waits, 95) * 1000:.1f} "
+                  f"max={max(waits) * 1000:.1f}")
+
+    print(f"database={os.environ['DATABASE_URL'].split('://')[0]} threads={args.threads} "
+          f"credits={args.credits} attempts={args.attempts} latency={args.latency:.0f}ms")
+    if args.mode in ('legacy', 'both'):
+        run('legacy', legacy_attempt)
+    if args.mode in ('reservation', 'both'):
+        run('reservation', reservation_attempt)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark of GET /api/dreams: offset pages vs keyset cursors.
+
+Fills one user's journal, walks it with cursors to check every dream comes
+back exactly once in order (many dreams share a created_at on purpose),
+then times the request for shallow and deep pages in both modes. Keyset
+latency should stay flat with depth while offset latency grows.
+
+Usage:
+    python bench_dream_pagination.py --dreams 20000 --per-page 20 --pages 1,100,500
+    DATABASE_URL=postgresql://... python bench_dream_pagination.py
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark offset vs keyset pagination of dream history')
+    parser.add_argument('--dreams', type=int, default=20000)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--pages', default='1,100,500', help='comma-separated page numbers to time')
+    parser.add_argument('--runs', type=int, default=20, help='requests timed per page and mode')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    pages = [int(page) for page in args.pages.split(',')]
+
+    if not os.environ.get('DATABASE_URL'):
+        db_dir = tempfile.mkdtemp(prefix='dream-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'development'
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert
+    from app import app
+    from models import db, User, DreamAnalysis
+
+    with app.app_context():
+        user = User(email=f'{uuid.uuid4().hex}@bench.local', username=uuid.uuid4().hex[:20], credits=0)
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        token = create_access_token(identity=user_id)
+
+        started = datetime.utcnow()
+        rows = [{
+            'id': str(uuid.uuid4()), 'user_id': user_id,
+            'dream_text': f'حلم رقم {n}', 'analysis': 'تحليل', 'advice': 'نصيحة',
+            # Groups of five share a timestamp so ties are broken by id
+            'created_at': started - timedelta(seconds=n // 5), 'updated_at': started,
+        } for n in range(args.dreams)]
+        for i in range(0, len(rows), 5000):
+            db.session.execute(insert(DreamAnalysis), rows[i:i + 5000])
+        db.session.commit()
+    print(f"inserted {args.dreams} dreams")
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def get(**params):
+        response = client.get('/api/dreams', query_string=dict(params, per_page=args.per_page), headers=headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return response.get_json()
+
+    # Walk every page with cursors, remembering the cursor that starts each page
+    cursors = {1: None}
+    seen = []
+    cursor, page = None, 1
+    while True:
+        body = get(cursor=cursor) if cursor else get()
+        seen.extend(dream['id'] for dream in body['dreams'])
+        if not body['next_cursor']:
+            break
+        cursor, page = body['next_cursor'], page + 1
+        cursors[page] = cursor
+    expected = [row['id'] for row in sorted(rows, key=lambda r: (r['created_at'], r['id']), reverse=True)]
+    assert seen == expected, 'keyset walk does not match (created_at, id) order'
+    print(f"keyset walk: {page} pages, every dream exactly once in order")
+
+    def timed(**params):
+        samples = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            get(**params)
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
+
+    print(f"{'page':>6} {'offset ms':>10} {'keyset ms':>10}")
+    for page in pages:
+        if page not in cursors:
+            print(f"{page:>6} (beyond the last page)")
+            continue
+        offset_ms = timed(page=page)
+        keyset_ms = timed(cursor=cursors[page]) if cursors[page] else timed()
+        print(f"{page:>6} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+    print(f"keyset with include_total: {timed(include_total='true'):.2f} ms")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
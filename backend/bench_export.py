@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Throughput and peak memory of GET /api/dreams/export by journal size.
+
+Fills journals of increasing size, streams each export through the app
+(consuming chunks as a client would, never holding the body) and reports
+rows/s, bytes and the peak Python memory traced while streaming. With
+yield_per the peak should stay flat as the journal grows; paging through
+/api/dreams for the same rows is timed for comparison.
+
+Usage:
+    python bench_export.py --sizes 2000,20000 --format ndjson
+    DATABASE_URL=postgresql://... python bench_export.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+WORDS = 'رأيت في المنام بحرا واسعا وسفينة بيضاء وأمي تنادي من بعيد ومفتاحا من ذهب'.split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark streaming journal export')
+    parser.add_argument('--sizes', default='2000,20000', help='comma-separated journal sizes')
+    parser.add_argument('--format', default='ndjson', choices=('ndjson', 'csv'))
+    parser.add_argument('--per-page', type=int, default=100, help='page size of the /api/dreams comparison')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        db_dir = tempfile.mkdtemp(prefix='dream-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'development'
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import insert
+    from app import app
+    from models import db, User, DreamAnalysis
+
+    client = app.test_client()
+    print(f"batch size {app.config['EXPORT_BATCH_SIZE']}, format {args.format}\n")
+    print(f"{'dreams':>8} {'export s':>9} {'rows/s':>9} {'MB':>7} {'peak KB':>8} {'paged s':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        with app.app_context():
+            user = User(email=f'{uuid.uuid4().hex}@bench.local', username=uuid.uuid4().hex[:20], credits=0)
+            user.password_hash = 'x'
+            db.session.add(user)
+            db.session.commit()
+            now = datetime.utcnow()
+            rows = [{
+                'id': str(uuid.uuid4()), 'user_id': user.id,
+                'dream_text': ' '.join(WORDS[(n + i) % len(WORDS)] for i in range(60)),
+                'analysis': ' '.join(WORDS[(n * i) % len(WORDS)] for i in range(300)),
+                'advice': 'نصيحة', 'created_at': now - timedelta(minutes=n), 'updated_at': now,
+            } for n in range(size)]
+            for i in range(0, size, 5000):
+                db.session.execute(insert(DreamAnalysis), rows[i:i + 5000])
+            db.session.commit()
+            headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+        del rows
+
+        def export():
+            response = client.get('/api/dreams/export', query_string={'format': args.format},
+                                  headers=headers, buffered=False)
+            assert response.status_code == 200
+            received = 0
+            for chunk in response.response:
+                received += len(chunk)
+            response.close()
+            return received
+
+        # Timed untraced; tracemalloc slows allocation-heavy code several times
+        started = time.perf_counter()
+        received = export()
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        export()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        cursor, paged = None, 0
+        while True:
+            params = {'per_page': args.per_page, **({'cursor': cursor} if cursor else {})}
+            body = client.get('/api/dreams', query_string=params, headers=headers).get_json()
+            paged += len(body['dreams'])
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        paged_elapsed = time.perf_counter() - started
+        assert paged == size
+
+        print(f"{size:>8} {elapsed:>9.2f} {size / elapsed:>9.0f} {received / 1e6:>7.1f} "
+              f"{peak / 1024:>8.0f} {paged_elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN and latency of the hot dream-history queries, before and after the
+composite ix_dream_analyses_user_id_created_at index (migration
+20261017_090000).
+
+Fills dream_analyses for many users, drops the composite index, prints the
+plan and median latency of each query, creates the index, runs ANALYZE and
+prints them again. Queries:
+
+- history:     first page of GET /api/dreams (keyset order)
+- history_deep: a keyset page deep into one user's journal
+- history_offset: the legacy ?page= offset page at the same depth
+- recent_count: the 30-day count of GET /api/auth/stats
+
+SQLite prints EXPLAIN QUERY PLAN; PostgreSQL prints EXPLAIN (ANALYZE, BUFFERS).
+
+Usage:
+    python bench_history_indexes.py --users 200 --dreams-per-user 500
+    DATABASE_URL=postgresql://... python bench_history_indexes.py
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+INDEX_NAME = 'ix_dream_analyses_user_id_created_at'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='EXPLAIN dream history queries with and without the composite index')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--dreams-per-user', type=int, default=500)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=400, help='rows skipped by the deep history queries')
+    parser.add_argument('--runs', type=int, default=50)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        db_dir = tempfile.mkdtemp(prefix='dream-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'development'
+
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from sqlalchemy import func, insert, select, text
+    from app import app
+    from models import db, User, DreamAnalysis
+    from pagination import after_cursor, encode_cursor
+
+    index = next(ix for ix in DreamAnalysis.__table__.indexes if ix.name == INDEX_NAME)
+
+    with app.app_context():
+        now = datetime.utcnow()
+        user_ids = []
+        for _ in range(args.users):
+            user = User(email=f'{uuid.uuid4().hex}@bench.local', username=uuid.uuid4().hex[:20], credits=0)
+            user.password_hash = 'x'
+            db.session.add(user)
+            db.session.flush()
+            user_ids.append(user.id)
+        # Users' dreams are interleaved over a year, as in a real table
+        rows = [{
+            'id': str(uuid.uuid4()), 'user_id': user_id,
+            'dream_text': 'حلم', 'analysis': 'تحليل', 'advice': 'نصيحة',
+            'created_at': now - timedelta(minutes=n * args.users + u), 'updated_at': now,
+        } for n in range(args.dreams_per_user) for u, user_id in enumerate(user_ids)]
+        for i in range(0, len(rows), 10000):
+            db.session.execute(insert(DreamAnalysis), rows[i:i + 10000])
+        db.session.commit()
+        print(f"{len(rows)} dreams for {args.users} users")
+
+        user_id = user_ids[len(user_ids) // 2]
+        mine = sorted((r for r in rows if r['user_id'] == user_id),
+                      key=lambda r: (r['created_at'], r['id']), reverse=True)
+        cursor_row = mine[args.depth - 1]
+        cursor = encode_cursor(cursor_row['created_at'], cursor_row['id'])
+
+        base = select(DreamAnalysis).where(DreamAnalysis.user_id == user_id)
+        order = (DreamAnalysis.created_at.desc(), DreamAnalysis.id.desc())
+        queries = {
+            'history': base.order_by(*order).limit(args.per_page + 1),
+            'history_deep': after_cursor(base, DreamAnalysis.created_at, DreamAnalysis.id, cursor)
+            .order_by(*order).limit(args.per_page + 1),
+            'history_offset': base.order_by(*order).offset(args.depth).limit(args.per_page),
+            'recent_count': select(func.count()).select_from(DreamAnalysis).where(
+                DreamAnalysis.user_id == user_id, DreamAnalysis.created_at >= now - timedelta(days=30)),
+        }
+
+        with db.engine.begin() as connection:
+            index.drop(connection, checkfirst=True)
+            connection.execute(text('ANALYZE'))
+        report('before (ix_dream_analyses_user_id only)', queries, args.runs)
+
+        with db.engine.begin() as connection:
+            index.create(connection)
+            connection.execute(text('ANALYZE'))
+        report(f'after ({INDEX_NAME})', queries, args.runs)
+
+
+def report(title, queries, runs):
+    from models import db
+
+    print(f"\n== {title}")
+    with db.engine.connect() as connection:
+        for name, statement in queries.items():
+            samples = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                connection.execute(statement).all()
+                samples.append((time.perf_counter() - started) * 1000)
+            print(f"-- {name}: median {statistics.median(samples):.3f} ms")
+            for line in explain(connection, statement):
+                print(f"   {line}")
+
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+        return [row[-1] for row in rows]
+    prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if connection.dialect.name == 'postgresql' else 'EXPLAIN '
+    return [str(row[0]) for row in connection.exec_driver_sql(prefix + str(compiled), params).all()]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Throughput of POST /api/dreams/import against one ORM add per dream.
+
+Builds a journal of realistic Arabic dreams as NDJSON and as a JSON array,
+imports it through the app for each chunk size and reports rows/s, then
+inserts the same dreams with ``db.session.add`` per row (what a naive
+import would do) for comparison. Every import goes to a fresh user.
+
+Usage:
+    python bench_import.py --rows 5000 --chunk-sizes 100,500,1000
+    DATABASE_URL=postgresql://... python bench_import.py
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+WORDS = (
+    'رأيت في المنام أنني أمشي في سوق قديم مزدحم بالناس ثم ظهر لي رجل يلبس ثوبا أبيض '
+    'وأعطاني مفتاحا من ذهب فوجدت بحرا واسعا وسفينة بيضاء وقطة سوداء وأمي تنادي من بعيد'
+).split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark bulk journal import')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--chunk-sizes', default='100,500,1000')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        db_dir = tempfile.mkdtemp(prefix='dream-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'development'
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    os.environ.setdefault('IMPORT_MAX_ROWS', str(args.rows))
+
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from flask_jwt_extended import create_access_token
+    from app import app
+    from models import db, User, DreamAnalysis
+    from journal_import import validate_row
+
+    rng = random.Random(3)
+    now = datetime.utcnow()
+    dreams = [{
+        'dream_text': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 120))),
+        'analysis': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(100, 300))),
+        'mood_before': 'قلق', 'tags': ['رحلة'],
+        'created_at': (now - timedelta(hours=n)).isoformat(),
+    } for n in range(args.rows)]
+    bodies = {
+        'ndjson': ('application/x-ndjson', ''.join(json.dumps(d, ensure_ascii=False) + '\n' for d in dreams)),
+        'json': ('application/json', json.dumps(dreams, ensure_ascii=False)),
+    }
+
+    client = app.test_client()
+
+    def new_user():
+        with app.app_context():
+            user = User(email=f'{uuid.uuid4().hex}@bench.local', username=uuid.uuid4().hex[:20], credits=0)
+            user.password_hash = 'x'
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    print(f"{args.rows} dreams, {len(bodies['ndjson'][1].encode()) / 1e6:.1f} MB as NDJSON\n")
+    print(f"{'method':<24} {'chunk':>6} {'seconds':>8} {'rows/s':>8}")
+    for chunk_size in (int(c) for c in args.chunk_sizes.split(',')):
+        app.config['IMPORT_CHUNK_SIZE'] = chunk_size
+        for name, (content_type, body) in bodies.items():
+            _, headers = new_user()
+            started = time.perf_counter()
+            response = client.post('/api/dreams/import', data=body.encode('utf-8'),
+                                   headers=dict(headers, **{'Content-Type': content_type}))
+            elapsed = time.perf_counter() - started
+            assert response.status_code == 200 and response.get_json()['imported'] == args.rows, response.get_json()
+            print(f"{'import ' + name:<24} {chunk_size:>6} {elapsed:>8.2f} {args.rows / elapsed:>8.0f}")
+
+    # Same validation, then one ORM add per row and a single commit
+    user_id, _ = new_user()
+    with app.app_context():
+        started = time.perf_counter()
+        for item in dreams:
+            row, _ = validate_row(item, user_id, now)
+            db.session.add(DreamAnalysis(**row))
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+    print(f"{'ORM add per row':<24} {'-':>6} {elapsed:>8.2f} {args.rows / elapsed:>8.0f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Serialization cost of 100-item dream history pages.
+
+Loads a page of DreamAnalysis rows with realistic Arabic texts and times,
+separately and together, the two halves of a history response:
+
+- to_dict: the previous hand-written method vs the generated column
+  serializer (models.py, serializers.py);
+- encoding: Flask's stdlib provider vs OrjsonProvider (jsonprovider.py),
+  on the full page and on the summary projection;
+- jsonify end to end inside an app context with each provider installed.
+
+Usage:
+    python bench_json.py --items 100 --runs 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+WORDS = (
+    'رأيت في المنام أنني أمشي في سوق قديم مزدحم بالناس والبيوت الطينية '
+    'ثم ظهر لي رجل يلبس ثوبا أبيض وأعطاني مفتاحا من ذهب وقال افتح الباب '
+    'فوجدت بحرا واسعا وسفينة بيضاء وأمي تنادي من بعيد وكنت خائفا وسعيدا'
+).split()
+
+
+def handwritten_to_dict(self):
+    """DreamAnalysis.to_dict before the generated serializers, for comparison"""
+    return {
+        'id': str(self.id),
+        'user_id': str(self.user_id),
+        'dream_text': self.dream_text,
+        'analysis': self.analysis,
+        'advice': self.advice,
+        'mood_before': self.mood_before,
+        'mood_after': self.mood_after,
+        'tags': self.tags or [],
+        'is_private': self.is_private,
+        'created_at': self.created_at.isoformat(),
+        'timestamp': self.created_at.isoformat(),
+        'updated_at': self.updated_at.isoformat()
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark JSON serialization of dream history pages')
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=200)
+    return parser.parse_args()
+
+
+def median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    args = parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='dream-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'development'
+
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from flask import jsonify
+    from flask.json.provider import DefaultJSONProvider
+    from sqlalchemy import insert, select
+    from app import app
+    from jsonprovider import OrjsonProvider, orjson
+    from models import db, User, DreamAnalysis
+    from projection import VIEWS, columns, row_to_dict
+
+    if orjson is None:
+        print('orjson is not installed: OrjsonProvider falls back to the stdlib encoder')
+
+    rng = random.Random(7)
+    text = lambda n: ' '.join(rng.choice(WORDS) for _ in range(n))
+    app.debug = False  # debug pretty-prints responses
+    with app.app_context():
+        user = User(email=f'{uuid.uuid4().hex}@bench.local', username=uuid.uuid4().hex[:20], credits=0)
+        user.password_hash = 'x'
+        db.session.add(user)
+        db.session.commit()
+        now = datetime.utcnow()
+        db.session.execute(insert(DreamAnalysis), [{
+            'id': str(uuid.uuid4()), 'user_id': user.id,
+            'dream_text': text(rng.randint(40, 160)), 'analysis': text(rng.randint(250, 500)),
+            'advice': text(rng.randint(40, 100)), 'tags': rng.sample(WORDS, 3),
+            'mood_before': 'قلق', 'created_at': now - timedelta(hours=n), 'updated_at': now,
+        } for n in range(args.items)])
+        db.session.commit()
+
+        dreams = DreamAnalysis.query.filter_by(user_id=user.id).all()
+        assert [handwritten_to_dict(d) for d in dreams] == [d.to_dict() for d in dreams]
+        summary_fields = VIEWS['summary']
+        summary_rows = db.session.execute(select(*columns(summary_fields))).all()
+
+        stdlib = DefaultJSONProvider(app)
+        fast = OrjsonProvider(app)
+        full_page = {'success': True, 'dreams': [d.to_dict() for d in dreams], 'next_cursor': None}
+        summary_page = {'success': True, 'dreams': [row_to_dict(r, summary_fields) for r in summary_rows]}
+
+        print(f"{args.items} dreams per page, median of {args.runs} runs\n")
+        print(f"{'step':<34} {'ms':>8} {'bytes':>9}")
+        rows = [
+            ('to_dict, hand-written', lambda: [handwritten_to_dict(d) for d in dreams], None),
+            ('to_dict, generated', lambda: [d.to_dict() for d in dreams], None),
+            ('encode full page, stdlib', lambda: stdlib.dumps(full_page), stdlib.dumps(full_page)),
+            ('encode full page, orjson', lambda: fast.dumps(full_page), fast.dumps(full_page)),
+            ('encode summary page, stdlib', lambda: stdlib.dumps(summary_page), stdlib.dumps(summary_page)),
+            ('encode summary page, orjson', lambda: fast.dumps(summary_page), fast.dumps(summary_page)),
+        ]
+        for name, fn, output in rows:
+            size = len(output.encode('utf-8')) if output is not None else ''
+            print(f"{name:<34} {median_ms(fn, args.runs):>8.3f} {size:>9}")
+
+        with app.test_request_context():
+            for name, provider in (('stdlib', stdlib), ('orjson', fast)):
+                app.json = provider
+                page = lambda: jsonify({'success': True, 'dreams': [d.to_dict() for d in dreams]})
+                print(f"{f'jsonify(to_dict page), {name}':<34} {median_ms(page, args.runs):>8.3f} "
+                      f"{len(page().get_data()):>9}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
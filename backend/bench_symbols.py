@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of the symbol extractor.
+
+Measures automaton build time, extraction speed in characters per second
+on long Arabic and English text, and time per dream of typical length.
+
+Usage:
+    python bench_symbols.py --chars 2000000
+"""
+
+import argparse
+import sys
+import time
+
+ARABIC = (
+    'رأيت في المنام أنني أطير فوق البحر ثم سقطت في الماء وكنت خائفاً، '
+    'وبعدها كان ثعبان يطاردني في البيت القديم حتى استيقظت وأنا أبكي. '
+)
+ENGLISH = 'I was flying over the sea, then fell into dark water while a snake chased me through the house. '
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark Aho-Corasick symbol extraction')
+    parser.add_argument('--chars', type=int, default=2000000, help='characters of text per run')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dream-chars', type=int, default=600, help='length of one dream for the per-dream timing')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    from symbols import SymbolExtractor
+
+    started = time.perf_counter()
+    extractor = SymbolExtractor()
+    build = time.perf_counter() - started
+    print(f"build: {build * 1000:.1f}ms patterns={extractor.pattern_count} states={extractor._automaton.states}")
+
+    for name, sample in (('arabic', ARABIC), ('english', ENGLISH)):
+        text = (sample * (args.chars // len(sample) + 1))[:args.chars]
+        best = min(_timed(extractor.extract, text) for _ in range(args.repeat))
+        print(f"{name}: {len(text) / best / 1e6:.2f}M chars/s ({best * 1000:.0f}ms for {len(text)} chars)")
+
+        dream = text[:args.dream_chars]
+        runs = 2000
+        per_dream = _timed(lambda: [extractor.extract(dream) for _ in range(runs)]) / runs
+        print(f"{name}: {per_dream * 1e6:.0f}us per {len(dream)}-char dream")
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of textnorm.
+
+Normalizes typical dreams (Arabic with harakat, tatweel, hamza variants and
+Arabic-Indic digits; plain English) one at a time and as a batch, next to
+the previous regex-based implementation for reference, plus the LRU hit
+path for a dream normalized again within a request. Exits with status 1
+when single-string Arabic throughput is below --target, so it can gate a
+change to the translation tables.
+
+Usage:
+    python bench_textnorm.py --dreams 20000 --target 10
+"""
+
+import argparse
+import re
+import sys
+import time
+
+ARABIC = (
+    'رَأَيْتُ فِي المَنامِ أنّني أطيـــر فوق البحر ثم سقطتُ في الماءِ وكنتُ خائفةً، '
+    'وبعدها كان ثعبانٌ يطاردني في البيت القديم رقم ١٢ حتى استيقظتُ الساعة ٣ وأنا أبكي إلى الصباح. '
+)
+ENGLISH = 'I was flying over the sea at 3am, then fell into dark water while a snake chased me through the house. '
+
+_LEGACY_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+_LEGACY_WHITESPACE = re.compile(r'\s+')
+_LEGACY_FOLD = str.maketrans({
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0622': '\u0627', '\u0671': '\u0627',
+    '\u0649': '\u064a', '\u0629': '\u0647', '\u0624': '\u0648', '\u0626': '\u064a',
+})
+
+
+def legacy_normalize(text):
+    """The regex implementation this module replaced (no digit folding)"""
+    if not text:
+        return ''
+    text = _LEGACY_DIACRITICS.sub('', text).replace('\u0640', '')
+    return _LEGACY_WHITESPACE.sub(' ', text).strip().casefold().translate(_LEGACY_FOLD)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark Arabic text normalization')
+    parser.add_argument('--dreams', type=int, default=20000, help='dreams per run')
+    parser.add_argument('--dream-chars', type=int, default=600, help='length of one dream')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--target', type=float, default=10.0,
+                        help='minimum single-string Arabic throughput in M chars/s')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    from textnorm import normalize, normalize_many
+
+    arabic_rate = None
+    for name, sample in (('arabic', ARABIC), ('english', ENGLISH)):
+        text = (sample * (args.dream_chars // len(sample) + 1))[:args.dream_chars]
+        # Distinct strings so nothing is served from an interned result
+        dreams = [f'{i} {text}' for i in range(args.dreams)]
+        chars = sum(len(dream) for dream in dreams)
+
+        legacy = _best(args.repeat, lambda: [legacy_normalize(dream) for dream in dreams])
+        single = _best(args.repeat, lambda: [normalize(dream) for dream in dreams])
+        batch = _best(args.repeat, lambda: normalize_many(dreams))
+        # The same dream again, as for its cache key, tags, search and vector
+        repeated = _best(args.repeat, lambda: [normalize(dreams[i % 4]) for i in range(args.dreams)])
+        assert normalize_many(dreams[:100]) == [normalize(dream) for dream in dreams[:100]]
+
+        print(f"{name}: {args.dreams} dreams x {args.dream_chars} chars")
+        results = (('legacy regex', legacy), ('normalize', single), ('normalize_many', batch), ('repeat (LRU)', repeated))
+        for label, seconds in results:
+            print(f"  {label:15s} {chars / seconds / 1e6:7.1f}M chars/s  {seconds / args.dreams * 1e6:6.1f}us/dream")
+        if name == 'arabic':
+            arabic_rate = chars / single / 1e6
+
+    if arabic_rate < args.target:
+        print(f"FAIL: arabic normalize at {arabic_rate:.1f}M chars/s is below the {args.target:.1f}M target")
+        return 1
+    print(f"OK: arabic normalize at {arabic_rate:.1f}M chars/s (target {args.target:.1f}M)")
+    return 0
+
+
+def _best(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Negotiated response compression (gzip, and brotli when installed).
+
+History pages and analyses are large JSON bodies of Arabic text, sent to
+mobile clients over cellular links. ``ResponseCompressor`` runs after each
+request and picks the best encoding the client accepts (Accept-Encoding,
+with q-values; brotli preferred on a tie):
+
+- buffered bodies at least COMPRESSION_MIN_SIZE bytes are compressed in
+  one call on the bytes Flask already holds, and replace them;
+- streamed bodies (SSE analysis, exports) are compressed chunk by chunk as
+  they are sent, flushing after each chunk so events are not held back;
+  the inner iterator is closed with the response so its cleanup runs;
+- small bodies, non-text types, 204/304, responses that already have a
+  Content-Encoding and ``Cache-Control: no-transform`` are left alone.
+
+Compressed responses get ``Vary: Accept-Encoding`` and strong ETags gain
+a ``-gzip``/``-br`` suffix, since the bytes differ (etag.py accepts the
+suffixed form in If-None-Match).
+"""
+
+import gzip
+import threading
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+ENCODINGS = ('br', 'gzip')
+DEFAULT_MIMETYPES = (
+    'application/json', 'application/x-ndjson', 'text/event-stream',
+    'text/csv', 'text/html', 'text/plain', 'application/javascript', 'text/css',
+)
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data):
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+
+class ResponseCompressor:
+    """after_request hook that negotiates and applies Content-Encoding"""
+
+    def __init__(self):
+        self.enabled = False
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        self.compress_streams = True
+        self.mimetypes = frozenset(DEFAULT_MIMETYPES)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._stats = {encoding: {'responses': 0, 'bytes_in': 0, 'bytes_out': 0} for encoding in ENCODINGS}
+        self._stats['streams'] = 0
+        self._stats['skipped_small'] = 0
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('COMPRESSION_ENABLED', True)
+        self.min_size = config.get('COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = config.get('COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = config.get('COMPRESSION_BROTLI_QUALITY', 4)
+        self.compress_streams = config.get('COMPRESSION_STREAMS', True)
+        mimetypes = config.get('COMPRESSION_MIMETYPES')
+        if mimetypes:
+            self.mimetypes = frozenset(m.strip() for m in mimetypes.split(',') if m.strip())
+        if self.enabled:
+            app.after_request(self.after_request)
+
+    @property
+    def available_encodings(self):
+        return ENCODINGS if brotli is not None else ('gzip',)
+
+    def negotiate(self):
+        """Best encoding the client accepts, or None"""
+        return request.accept_encodings.best_match(self.available_encodings)
+
+    def _compressible(self, response):
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        if response.mimetype not in self.mimetypes:
+            return False
+        return 'no-transform' not in response.headers.get('Cache-Control', '')
+
+    def after_request(self, response):
+        if not self._compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            if not self.compress_streams:
+                return response
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+            self._record(encoding, streamed=True)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                self._record(None)
+                return response
+            compressed = self.compress(body, encoding)
+            response.set_data(compressed)
+            self._record(encoding, len(body), len(compressed))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+        return response
+
+    def compress(self, data, encoding):
+        """One-shot compression of `data` with `encoding` at the configured level"""
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def _stream(self, chunks, encoding):
+        encoder = _BrotliStream(self.brotli_quality) if encoding == 'br' else _GzipStream(self.gzip_level)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                if chunk:
+                    yield encoder.compress(chunk)
+            yield encoder.finish()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def _record(self, encoding, bytes_in=0, bytes_out=0, streamed=False):
+        with self._lock:
+            if encoding is None:
+                self._stats['skipped_small'] += 1
+            elif streamed:
+                self._stats['streams'] += 1
+            else:
+                stats = self._stats[encoding]
+                stats['responses'] += 1
+                stats['bytes_in'] += bytes_in
+                stats['bytes_out'] += bytes_out
+
+    def to_dict(self):
+        with self._lock:
+            stats = {key: dict(value) if isinstance(value, dict) else value for key, value in self._stats.items()}
+        for encoding in ENCODINGS:
+            entry = stats[encoding]
+            entry['ratio'] = round(entry['bytes_out'] / entry['bytes_in'], 3) if entry['bytes_in'] else None
+        stats.update({'enabled': self.enabled, 'encodings': list(self.available_encodings), 'min_size': self.min_size})
+        return stats
+
+
+response_compressor = ResponseCompressor()
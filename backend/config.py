@@ -27,7 +27,123 @@ class Config:
     
     # OpenAI Configuration
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
-    
+    OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+    OPENAI_MAX_TOKENS = int(os.environ.get('OPENAI_MAX_TOKENS', 1000))
+    OPENAI_TEMPERATURE = float(os.environ.get('OPENAI_TEMPERATURE', 0.7))
+
+    # LLM backend: 'openai' or 'stub' (deterministic offline backend for load tests)
+    LLM_BACKEND = os.environ.get('LLM_BACKEND', 'openai')
+    STUB_LLM_LATENCY_MS = os.environ.get('STUB_LLM_LATENCY_MS', 'lognormal:800,0.4')  # fixed|uniform|normal|lognormal
+    STUB_LLM_TOKENS = os.environ.get('STUB_LLM_TOKENS', 'uniform:350,650')
+    STUB_LLM_FIRST_TOKEN_FRACTION = float(os.environ.get('STUB_LLM_FIRST_TOKEN_FRACTION', 0.15))
+    STUB_LLM_FAILURE_RATE = float(os.environ.get('STUB_LLM_FAILURE_RATE', 0.0))
+    STUB_LLM_CHUNK_CHARS = int(os.environ.get('STUB_LLM_CHUNK_CHARS', 8))
+    STUB_LLM_SEED = int(os.environ.get('STUB_LLM_SEED', 42))
+
+    # Circuit breaker and AIMD concurrency limit around LLM calls
+    LLM_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('LLM_BREAKER_FAILURE_THRESHOLD', 5))
+    LLM_BREAKER_RESET_TIMEOUT = float(os.environ.get('LLM_BREAKER_RESET_TIMEOUT', 30))
+    LLM_BREAKER_HALF_OPEN_MAX_CALLS = int(os.environ.get('LLM_BREAKER_HALF_OPEN_MAX_CALLS', 1))
+    LLM_LIMIT_INITIAL = int(os.environ.get('LLM_LIMIT_INITIAL', 8))
+    LLM_LIMIT_MIN = int(os.environ.get('LLM_LIMIT_MIN', 1))
+    LLM_LIMIT_MAX = int(os.environ.get('LLM_LIMIT_MAX', 64))
+    LLM_LIMIT_LATENCY_TARGET = float(os.environ.get('LLM_LIMIT_LATENCY_TARGET', 20))  # seconds
+    LLM_LIMIT_BACKOFF = float(os.environ.get('LLM_LIMIT_BACKOFF', 0.7))
+
+    # Pooled LLM HTTP client (one per worker process)
+    LLM_POOL_MAX_CONNECTIONS = int(os.environ.get('LLM_POOL_MAX_CONNECTIONS', 20))
+    LLM_POOL_MAX_KEEPALIVE = int(os.environ.get('LLM_POOL_MAX_KEEPALIVE', 10))
+    LLM_POOL_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_POOL_KEEPALIVE_EXPIRY', 30))
+    LLM_HTTP2 = os.environ.get('LLM_HTTP2', 'false').lower() == 'true'  # requires the 'h2' package
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 60))
+    LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', 5))
+
+    # Asynchronous analysis jobs (opt-in per request with "async": true or "Prefer: respond-async")
+    ANALYSIS_JOBS_ENABLED = os.environ.get('ANALYSIS_JOBS_ENABLED', 'false').lower() == 'true'
+    ANALYSIS_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 4))
+    ANALYSIS_JOB_POLL_INTERVAL = float(os.environ.get('ANALYSIS_JOB_POLL_INTERVAL', 2))
+    ANALYSIS_JOB_MAX_ATTEMPTS = int(os.environ.get('ANALYSIS_JOB_MAX_ATTEMPTS', 3))
+    ANALYSIS_JOB_STALE_SECONDS = int(os.environ.get('ANALYSIS_JOB_STALE_SECONDS', 300))
+
+    # Analysis cache (in-process LRU in front of the analysis_cache table)
+    ANALYSIS_CACHE_ENABLED = os.environ.get('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true'
+    ANALYSIS_CACHE_PERSIST = os.environ.get('ANALYSIS_CACHE_PERSIST', 'true').lower() == 'true'
+    ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', 1000))
+    ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 3600))  # seconds, in-process tier
+    ANALYSIS_CACHE_DB_TTL = int(os.environ.get('ANALYSIS_CACHE_DB_TTL', 30 * 24 * 3600))  # seconds, database tier
+    ANALYSIS_CACHE_CHARGE_CREDITS = os.environ.get('ANALYSIS_CACHE_CHARGE_CREDITS', 'true').lower() == 'true'
+
+    # Offline rule-based interpreter used when the API key is missing, the circuit is open or load is shed
+    ANALYSIS_FALLBACK_ENABLED = os.environ.get('ANALYSIS_FALLBACK_ENABLED', 'true').lower() == 'true'
+    ANALYSIS_FALLBACK_CHARGE_CREDITS = os.environ.get('ANALYSIS_FALLBACK_CHARGE_CREDITS', 'false').lower() == 'true'
+
+    # Batch analysis
+    ANALYSIS_BATCH_MAX_ITEMS = int(os.environ.get('ANALYSIS_BATCH_MAX_ITEMS', 20))
+    ANALYSIS_BATCH_CONCURRENCY = int(os.environ.get('ANALYSIS_BATCH_CONCURRENCY', 4))
+
+    # Priority admission of LLM calls (weighted fair queuing by tier: subscriber, credit, free)
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 8))  # keep <= LLM_LIMIT_MAX
+    ADMISSION_WEIGHTS = os.environ.get('ADMISSION_WEIGHTS', 'subscriber=6,credit=3,free=1')
+    ADMISSION_FLOORS = os.environ.get('ADMISSION_FLOORS', 'subscriber=2,credit=1,free=0')  # slots reserved per tier
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30))  # seconds
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 100))  # waiting calls per tier
+
+    # Conditional GET (ETag / If-None-Match) on dream history and profile
+    ETAG_ENABLED = os.environ.get('ETAG_ENABLED', 'true').lower() == 'true'
+
+    # JSON encoding of responses: orjson (stdlib fallback when it is not installed) or stdlib
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')
+
+    # Journal export (GET /api/dreams/export): rows fetched and sent per batch
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+
+    # Journal import (POST /api/dreams/import): rows per multi-row INSERT and limits per request
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+    IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', 5000))
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 100))  # listed; the rest are only counted
+
+    # Response compression negotiated from Accept-Encoding (brotli needs the Brotli package)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes; smaller bodies are sent as is
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+    COMPRESSION_STREAMS = os.environ.get('COMPRESSION_STREAMS', 'true').lower() == 'true'  # SSE and exports
+    COMPRESSION_MIMETYPES = os.environ.get('COMPRESSION_MIMETYPES', '')  # comma-separated; empty keeps the defaults
+
+    # Full-text search over dream history (SQLite FTS5, PostgreSQL tsvector, LIKE elsewhere)
+    SEARCH_ENABLED = os.environ.get('SEARCH_ENABLED', 'true').lower() == 'true'
+    SEARCH_PG_CONFIG = os.environ.get('SEARCH_PG_CONFIG', 'simple')  # text is normalized in Python first
+    SEARCH_MAX_TERMS = int(os.environ.get('SEARCH_MAX_TERMS', 8))
+
+    # "Similar dreams": hashed n-gram vectors in memory-mapped files per user (needs numpy)
+    SIMILAR_ENABLED = os.environ.get('SIMILAR_ENABLED', 'true').lower() == 'true'
+    SIMILAR_INDEX_DIR = os.environ.get('SIMILAR_INDEX_DIR')  # default: <instance path>/similar
+    SIMILAR_DIMENSIONS = int(os.environ.get('SIMILAR_DIMENSIONS', 512))
+    SIMILAR_MAX_OPEN = int(os.environ.get('SIMILAR_MAX_OPEN', 256))
+    SIMILAR_COMPACT_DEAD_ROWS = int(os.environ.get('SIMILAR_COMPACT_DEAD_ROWS', 256))  # superseded or deleted rows per user
+
+    # Structured event log (JSON lines written to stdout from a background thread)
+    EVENT_LOG_ENABLED = os.environ.get('EVENT_LOG_ENABLED', 'true').lower() == 'true'
+    EVENT_LOG_SAMPLE_RATES = os.environ.get('EVENT_LOG_SAMPLE_RATES', 'prompt=0.01,llm_call=0.1')  # event=rate,...
+    EVENT_LOG_DEFAULT_SAMPLE_RATE = float(os.environ.get('EVENT_LOG_DEFAULT_SAMPLE_RATE', 1.0))
+    EVENT_LOG_MAX_FIELD_CHARS = int(os.environ.get('EVENT_LOG_MAX_FIELD_CHARS', 500))
+    EVENT_LOG_MAX_EVENT_BYTES = int(os.environ.get('EVENT_LOG_MAX_EVENT_BYTES', 8192))
+    EVENT_LOG_QUEUE_SIZE = int(os.environ.get('EVENT_LOG_QUEUE_SIZE', 10000))  # events dropped when full
+
+    # Rate limiting: token buckets of 'count/period[;burst=n]' per route; empty disables a rule
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE', 'memory')  # 'memory' (per worker) or 'database' (shared)
+    RATELIMIT_MEMORY_MAX_KEYS = int(os.environ.get('RATELIMIT_MEMORY_MAX_KEYS', 100000))
+    RATELIMIT_TRUST_FORWARDED = os.environ.get('RATELIMIT_TRUST_FORWARDED', 'false').lower() == 'true'  # behind a proxy
+    RATELIMIT_LOGIN = os.environ.get('RATELIMIT_LOGIN', '10/minute')  # per IP
+    RATELIMIT_REGISTER = os.environ.get('RATELIMIT_REGISTER', '5/hour')  # per IP
+    RATELIMIT_CHANGE_PASSWORD = os.environ.get('RATELIMIT_CHANGE_PASSWORD', '5/minute')  # per user
+    RATELIMIT_ANALYZE = os.environ.get('RATELIMIT_ANALYZE', '30/hour;burst=5')  # per user, shared by all analyze routes
+    RATELIMIT_ANALYZE_BATCH = os.environ.get('RATELIMIT_ANALYZE_BATCH', '5/hour;burst=2')  # per user
+    RATELIMIT_EXPORT = os.environ.get('RATELIMIT_EXPORT', '20/hour')  # per user, resumed exports included
+    RATELIMIT_IMPORT = os.environ.get('RATELIMIT_IMPORT', '10/hour')  # per user
+
     # Google Play Configuration
     GOOGLE_APPLICATION_CREDENTIALS = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
     GOOGLE_PLAY_DEVELOPER_EMAIL = os.environ.get('GOOGLE_PLAY_DEVELOPER_EMAIL')
@@ -36,6 +152,9 @@ class Config:
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
     ALLOWED_ORIGINS = os.environ.get('ALLOWED_ORIGINS', '*').split(',')
     
+    # Apply pending Alembic migrations at startup (schema.py); false only runs db.create_all()
+    DATABASE_UPGRADE_ON_START = os.environ.get('DATABASE_UPGRADE_ON_START', 'true').lower() == 'true'
+
     # SQLAlchemy Configuration
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_RECORD_QUERIES = True
@@ -0,0 +1,54 @@
+"""
+Shared pytest fixtures: the app on an in-memory SQLite database, answering
+with the deterministic stub LLM backend (no API key or network needed).
+"""
+
+import os
+import uuid
+
+# Read by config.py at import time, so set before the app is imported
+os.environ['FLASK_ENV'] = 'testing'
+os.environ['LLM_BACKEND'] = 'stub'
+os.environ['STUB_LLM_LATENCY_MS'] = 'fixed:0'
+os.environ['RATELIMIT_ENABLED'] = 'false'
+os.environ['EVENT_LOG_ENABLED'] = 'false'
+os.environ['SIMILAR_ENABLED'] = 'false'
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user; returns (user id, Authorization headers)"""
+    from models import db, User
+
+    def make(credits=5):
+        with app.app_context():
+            user = User(email=f'{uuid.uuid4().hex}@test.local', username=uuid.uuid4().hex[:20], credits=credits)
+            user.set_password('secret1')
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+    return make
+
+
+@pytest.fixture
+def credits_of(app):
+    from models import db, User
+
+    def credits(user_id):
+        with app.app_context():
+            return db.session.get(User, user_id).credits
+    return credits
@@ -0,0 +1,91 @@
+"""
+Short-lived credit reservations.
+
+Analyses used to decrement ``user.credits`` in the ORM session and commit only
+after the LLM answered, keeping a transaction (and on Postgres/MySQL a row
+lock) open for the whole call, while concurrent requests could read the same
+balance and overspend. Instead a credit is reserved with one atomic
+conditional UPDATE that is committed immediately; the LLM is called with no
+transaction open, and the reservation is then confirmed or released.
+"""
+
+from sqlalchemy import update
+
+from models import db, User
+
+
+def reserve_credits(user_id, amount=1, commit=True):
+    """Atomically take `amount` credits if the balance allows it
+
+    Commits at once, unless `commit` is False (the caller's transaction
+    then takes the credits together with its own writes).
+    """
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user_id, User.credits >= amount)
+        .values(credits=User.credits - amount, data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if commit:
+        db.session.commit()
+    return result.rowcount == 1
+
+
+def release_credits(user_id, amount=1, commit=True):
+    """Atomically give `amount` credits back
+
+    Commits at once, unless `commit` is False (the refund is then stored
+    with the caller's transaction).
+    """
+    if amount <= 0:
+        return
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(credits=User.credits + amount, data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if commit:
+        db.session.commit()
+
+
+class CreditReservation:
+    """Credits held for an in-progress analysis
+
+    Subscribers get an empty reservation (amount 0) so callers can treat
+    both cases the same way.
+    """
+
+    def __init__(self, user_id, amount):
+        self.user_id = user_id
+        self.amount = amount
+        self.settled = False
+
+    @classmethod
+    def reserve(cls, user_id, amount=1):
+        """Return a reservation, or None when the balance is too low"""
+        if amount and not reserve_credits(user_id, amount):
+            return None
+        return cls(user_id, amount)
+
+    @classmethod
+    def none(cls, user_id):
+        return cls(user_id, 0)
+
+    @property
+    def charged(self):
+        return self.amount > 0
+
+    def confirm(self):
+        """Keep the reserved credits; the analysis has been stored"""
+        self.settled = True
+
+    def release(self, amount=None):
+        """Refund all (or `amount` of) the reserved credits that are still held"""
+        if self.settled:
+            return
+        refund = self.amount if amount is None else min(amount, self.amount)
+        release_credits(self.user_id, refund)
+        self.amount -= refund
+        if self.amount == 0:
+            self.settled = True
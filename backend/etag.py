@@ -0,0 +1,139 @@
+"""
+Conditional GET for user-scoped routes.
+
+Every user row carries ``data_version``, a counter bumped in the same
+transaction as any change to the user's profile or dreams:
+
+- ORM writes through a session before_flush hook (new, changed or deleted
+  dreams; changed user rows);
+- Core writes explicitly: credit reservations, bulk dream inserts and the
+  tag backfill call ``bump`` or increment the column in their UPDATE.
+
+``conditional_get`` turns (route, query string, user, version) into a
+strong ETag. A request whose If-None-Match matches gets a 304 after one
+primary-key lookup of the counter, before the view loads any rows or runs
+``to_dict``. The counter is read before the view runs, so a write racing
+with the request can only make the ETag older than the body, never newer:
+the next request then sees a mismatch and downloads again.
+"""
+
+import hashlib
+import threading
+from functools import wraps
+
+from flask import make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, select, update
+
+from compression import ENCODINGS
+from models import db, DreamAnalysis, User
+
+# Bump when the JSON of conditional routes changes shape, so cached bodies expire
+REPRESENTATION_VERSION = 1
+
+
+def bump(connection, user_ids):
+    """Increment data_version of `user_ids` on `connection` (the writer's transaction)"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if user_ids:
+        connection.execute(
+            update(User).where(User.id.in_(user_ids))
+            # Keep updated_at: a new dream is not a profile update
+            .values(data_version=User.data_version + 1, updated_at=User.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+
+
+class UserVersions:
+    """Keeps data_version in step with ORM writes and counts conditional hits"""
+
+    def __init__(self):
+        self.enabled = False
+        self._listening = False
+        self._lock = threading.Lock()
+        self._counts = {'not_modified': 0, 'sent': 0}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ETAG_ENABLED', True)
+        # Bump even when conditional responses are off, so turning them on is safe
+        if not self._listening:
+            event.listen(db.session, 'before_flush', self._before_flush)
+            self._listening = True
+
+    def _before_flush(self, session, flush_context, instances):
+        user_ids = set()
+        for obj in session.new:
+            if isinstance(obj, DreamAnalysis):
+                user_ids.add(obj.user_id)
+        for obj in session.dirty:
+            if isinstance(obj, DreamAnalysis) and session.is_modified(obj):
+                user_ids.add(obj.user_id)
+            elif isinstance(obj, User) and session.is_modified(obj, include_collections=False):
+                user_ids.add(obj.id)
+        for obj in session.deleted:
+            if isinstance(obj, DreamAnalysis):
+                user_ids.add(obj.user_id)
+        if user_ids:
+            bump(session.connection(), user_ids)
+
+    def current(self, user_id):
+        """The user's data_version, or None if there is no such user"""
+        return db.session.execute(select(User.data_version).where(User.id == user_id)).scalar()
+
+    def record(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def to_dict(self):
+        with self._lock:
+            stats = dict(self._counts)
+        stats['enabled'] = self.enabled
+        return stats
+
+
+user_versions = UserVersions()
+
+
+def make_etag(user_id, version):
+    args = '&'.join(f'{key}={value}' for key, value in sorted(request.args.items(multi=True)))
+    material = f'{REPRESENTATION_VERSION}:{user_id}:{version}:{request.path}?{args}'
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:32]
+
+
+def _matching_etag(etag):
+    """The form of `etag` in If-None-Match: plain or with a compression suffix"""
+    for candidate in (etag, *(f'{etag}-{encoding}' for encoding in ENCODINGS)):
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def conditional_get(view):
+    """Answer 304 when the caller's ETag matches the user's data version
+
+    Place it below @jwt_required(). Only 200 responses get the ETag, with
+    Cache-Control: private, no-cache so clients revalidate on every use.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not user_versions.enabled:
+            return view(*args, **kwargs)
+        user_id = get_jwt_identity()
+        version = user_versions.current(user_id)
+        if version is None:
+            return view(*args, **kwargs)  # let the view answer for a missing user
+        etag = make_etag(user_id, version)
+        matched = _matching_etag(etag)
+        if matched:
+            user_versions.record('not_modified')
+            response = make_response('', 304)
+            etag = matched  # echo the encoding-specific tag the client holds
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            user_versions.record('sent')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapped
@@ -0,0 +1,193 @@
+"""
+Non-blocking, sampled structured event log.
+
+Request threads used to dump every prompt to stdout twice, synchronously.
+``EventLog.emit`` instead samples the event by name, truncates long string
+fields, and puts a small dict on a bounded in-memory queue. A background
+``QueueListener`` thread serializes each event as one JSON line and writes
+it to stdout. When the queue is full the event is dropped and counted
+instead of blocking the request.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+
+def parse_sample_rates(spec):
+    """Parse 'prompt=0.01,llm_call=0.1' into {'prompt': 0.01, 'llm_call': 0.1}"""
+    rates = {}
+    for item in (spec or '').split(','):
+        name, sep, value = item.partition('=')
+        if not sep or not name.strip():
+            continue
+        rates[name.strip()] = min(1.0, max(0.0, float(value)))
+    return rates
+
+
+def truncate(value, max_chars):
+    """Cap a string (or the strings inside lists and dicts) at max_chars"""
+    if isinstance(value, str):
+        if len(value) > max_chars:
+            return value[:max_chars] + f'…[+{len(value) - max_chars}]'
+        return value
+    if isinstance(value, dict):
+        return {k: truncate(v, max_chars) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [truncate(v, max_chars) for v in value]
+    return value
+
+
+class JSONFormatter(logging.Formatter):
+    """Render the event dict attached to a record as one JSON line"""
+
+    def __init__(self, max_bytes=8192):
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    def format(self, record):
+        event = getattr(record, 'event', None) or {'event': 'log', 'message': record.getMessage()}
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        if len(line.encode('utf-8')) > self.max_bytes:
+            line = json.dumps({
+                'ts': event.get('ts'), 'event': event.get('event'), 'truncated': True,
+                'size': len(line.encode('utf-8')),
+            })
+        return line
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when full
+
+    `count` is called with 'emitted' or 'dropped' for every record.
+    """
+
+    def __init__(self, q, count):
+        super().__init__(q)
+        self._count = count
+
+    def prepare(self, record):
+        # The event dict is formatted on the listener thread, not here
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._count('dropped')
+        else:
+            self._count('emitted')
+
+
+class _Listener(QueueListener):
+    """QueueListener whose stop() waits for room instead of raising on a full queue"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class EventLog:
+    """Process-wide sampled JSON event log written from a background thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'emitted': 0, 'sampled_out': 0, 'dropped': 0}
+        self._listener = None
+        self._queue = None
+        self._pid = None
+        self._rng = random.Random()
+        self.logger = logging.getLogger('dream.events')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.enabled = True
+        self.default_rate = 1.0
+        self.rates = {}
+        self.max_field_chars = 500
+        self.max_event_bytes = 8192
+        self.queue_size = 10000
+        self.stream = sys.stdout
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('EVENT_LOG_ENABLED', True)
+        self.default_rate = config.get('EVENT_LOG_DEFAULT_SAMPLE_RATE', 1.0)
+        self.rates = parse_sample_rates(config.get('EVENT_LOG_SAMPLE_RATES', ''))
+        self.max_field_chars = config.get('EVENT_LOG_MAX_FIELD_CHARS', 500)
+        self.max_event_bytes = config.get('EVENT_LOG_MAX_EVENT_BYTES', 8192)
+        self.queue_size = config.get('EVENT_LOG_QUEUE_SIZE', 10000)
+        self.close()
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._listener is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._listener is not None and self._pid == pid:
+                return
+            # After a fork the parent's listener thread does not exist here
+            self._queue = queue.Queue(self.queue_size)
+            stream_handler = logging.StreamHandler(self.stream)
+            stream_handler.setFormatter(JSONFormatter(self.max_event_bytes))
+            self._listener = _Listener(self._queue, stream_handler)
+            self._listener.start()
+            self.logger.handlers = [_DroppingQueueHandler(self._queue, self._count)]
+            self._pid = pid
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def should_sample(self, event):
+        rate = self.rates.get(event, self.default_rate)
+        return rate >= 1.0 or (rate > 0.0 and self._rng.random() < rate)
+
+    def emit(self, event, **fields):
+        """Queue an event if it is sampled; never blocks the caller"""
+        if not self.enabled:
+            return False
+        if not self.should_sample(event):
+            self._count('sampled_out')
+            return False
+
+        self._ensure_started()
+        payload = {'ts': round(time.time(), 3), 'event': event, 'pid': self._pid}
+        payload.update(truncate(fields, self.max_field_chars))
+        rate = self.rates.get(event, self.default_rate)
+        if rate < 1.0:
+            payload['sample_rate'] = rate
+        record = self.logger.makeRecord(self.logger.name, logging.INFO, __file__, 0, event, None, None,
+                                        extra={'event': payload})
+        self.logger.handle(record)  # counted as emitted or dropped by the queue handler
+        return True
+
+    def close(self):
+        """Flush queued events and stop the listener thread"""
+        with self._lock:
+            listener, self._listener = self._listener, None
+            owned = self._pid == os.getpid()
+            self._pid = None
+        self.logger.handlers = []
+        if listener is not None and owned:
+            listener.stop()
+
+    def to_dict(self):
+        with self._lock:
+            stats = dict(self._counts)
+        stats.update({
+            'enabled': self.enabled,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'default_sample_rate': self.default_rate,
+            'sample_rates': self.rates,
+        })
+        return stats
+
+
+event_log = EventLog()
+atexit.register(event_log.close)
@@ -0,0 +1,88 @@
+"""
+Streaming export of a user's whole dream journal as NDJSON or CSV.
+
+Paging ``/api/dreams`` to download a journal costs one request (and, with
+``include_total``, one COUNT) per 100 dreams. ``export_rows`` instead runs
+a single keyset-ordered SELECT with ``yield_per``: rows arrive in batches
+of EXPORT_BATCH_SIZE (a server-side cursor on PostgreSQL, fetchmany
+elsewhere), ``ndjson_chunks`` or ``csv_chunks`` formats each batch into
+one chunk that is sent at once, and nothing else is kept, so memory does
+not grow with the journal. Only plain columns are selected (projection.py),
+never ORM objects.
+
+Rows come newest first in (created_at, id) order, so an interrupted export
+resumes with ``?after=<id of the last dream received>`` (or a ``cursor``
+from ``/api/dreams``) and continues exactly where it stopped.
+"""
+
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from models import db, DreamAnalysis
+from pagination import after_cursor, encode_cursor
+from projection import columns, row_to_dict
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+
+def resume_cursor(user_id, after_id):
+    """Cursor just past the user's dream `after_id`, or None if there is no such dream"""
+    created_at = db.session.execute(
+        select(DreamAnalysis.created_at).where(DreamAnalysis.id == after_id, DreamAnalysis.user_id == user_id)
+    ).scalar()
+    return encode_cursor(created_at, after_id) if created_at is not None else None
+
+
+def export_rows(user_id, fields, cursor=None, batch_size=500):
+    """Iterator over lists of up to `batch_size` rows of the user's dreams, newest first
+
+    Raises InvalidCursorError for a malformed cursor right away; the query
+    itself runs on first iteration.
+    """
+    statement = after_cursor(
+        select(*columns(fields)).where(DreamAnalysis.user_id == user_id),
+        DreamAnalysis.created_at, DreamAnalysis.id, cursor,
+    ).order_by(DreamAnalysis.created_at.desc(), DreamAnalysis.id.desc())
+    return _partitions(statement.execution_options(yield_per=batch_size))
+
+
+def _partitions(statement):
+    result = db.session.execute(statement)
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()  # also when the client disconnects mid-export
+
+
+def ndjson_chunks(batches, fields, dumps):
+    for rows in batches:
+        yield ''.join(dumps(row_to_dict(row, fields)) + '\n' for row in rows)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, dict, bool)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def csv_chunks(batches, fields, header=True):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        buffer.write('\ufeff')  # lets spreadsheet apps detect UTF-8 (Arabic text)
+        writer.writerow(fields)
+    for rows in batches:
+        writer.writerows([_csv_value(value) for value in row_to_dict(row, fields).values()] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if header and buffer.tell():
+        yield buffer.getvalue()  # header of an empty export
@@ -0,0 +1,56 @@
+"""
+Offline rule-based Arabic dream interpreter.
+
+Used instead of the LLM when no API key is configured, the circuit breaker
+is open, or the server is shedding load. It looks up well-known dream
+symbols (water, snakes, flying, teeth, ...) and emotions with the symbol
+extractor and assembles an analysis and advice from their meanings, within
+a few milliseconds even for the longest dreams and at no cost.
+"""
+
+import threading
+
+from symbols import SYMBOLS, get_extractor
+
+GENERIC_ANALYSIS = (
+    'يحمل حلمك رموزاً شخصية ترتبط بتجاربك وأفكارك الأخيرة؛ '
+    'غالباً ما تعكس الأحلام ما يشغل العقل من مشاعر وقرارات لم تُحسم بعد.'
+)
+GENERIC_ADVICE = 'دوّن أحلامك فور الاستيقاظ ولاحظ الرموز والمشاعر المتكررة فيها لفهم أعمق لذاتك.'
+PREAMBLE = 'تحليل مبدئي للرموز الرئيسية في حلمك:'
+
+
+class RuleBasedInterpreter:
+    """Match lexicon symbols in a dream and compose analysis and advice"""
+
+    def __init__(self, symbols=SYMBOLS, max_symbols=4):
+        self.symbols = symbols
+        self.max_symbols = max_symbols
+        self._by_tag = {symbol.tag: symbol for symbol in symbols}
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def find_symbols(self, dream_text):
+        """Return matched symbols in order of first appearance"""
+        return [self._by_tag[tag] for tag in get_extractor().extract(dream_text) if tag in self._by_tag]
+
+    def interpret(self, dream_text):
+        """Return (analysis, advice, tags) for a dream"""
+        symbols = self.find_symbols(dream_text)[:self.max_symbols]
+        if not symbols:
+            return GENERIC_ANALYSIS, GENERIC_ADVICE, []
+
+        lines = [PREAMBLE] + [f'- {symbol.label}: {symbol.meaning}' for symbol in symbols]
+        advice = ' '.join(symbol.advice for symbol in symbols[:3])
+        return '\n'.join(lines), advice, [symbol.tag for symbol in symbols]
+
+    def record(self, reason):
+        with self._lock:
+            self._counts[reason] = self._counts.get(reason, 0) + 1
+
+    def to_dict(self):
+        with self._lock:
+            return {'fallbacks': dict(self._counts), 'symbols': len(self.symbols)}
+
+
+interpreter = RuleBasedInterpreter()
@@ -0,0 +1,213 @@
+"""
+Durable background queue for asynchronous dream analysis.
+
+Jobs are rows in the ``analysis_jobs`` table, so they survive restarts and
+work with SQLite locally as well as Postgres/MySQL in production. Workers
+claim a job with a conditional UPDATE (``WHERE status = 'queued'``) so that
+several threads, gunicorn workers or instances can drain the same table
+without processing a job twice.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import db, AnalysisJob
+from analysis import run_analysis, save_analysis, apply_analysis, is_billable
+from resilience import LLMUnavailableError
+from credits import release_credits
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_job(user_id, payload, credit_charged):
+    """Add a queued job to the session (caller commits) and return it"""
+    job = AnalysisJob(user_id=user_id, payload=payload, credit_charged=credit_charged)
+    db.session.add(job)
+    return job
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to 'running' and return it"""
+    candidates = db.session.query(AnalysisJob.id)\
+        .filter(AnalysisJob.status == 'queued')\
+        .order_by(AnalysisJob.created_at)\
+        .limit(5).all()
+
+    for (job_id,) in candidates:
+        result = db.session.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id == job_id, AnalysisJob.status == 'queued')
+            .values(status='running', started_at=datetime.utcnow(), attempts=AnalysisJob.attempts + 1)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(AnalysisJob, job_id)
+    return None
+
+
+def requeue_stale_jobs(stale_after_seconds):
+    """Return jobs left 'running' by a crashed or restarted worker to the queue"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after_seconds)
+    result = db.session.execute(
+        update(AnalysisJob)
+        .where(AnalysisJob.status == 'running', AnalysisJob.started_at < cutoff)
+        .values(status='queued', started_at=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def process_job(job, max_attempts):
+    """Run one claimed job to completion, retrying or refunding on failure
+
+    Returns the number of seconds the worker should back off, if any.
+    The credit reserved for the job is refunded in the transaction that
+    records its outcome, and credit_charged is cleared with it, so a
+    failed attempt that is retried never refunds twice.
+    """
+    payload = job.payload or {}
+    try:
+        job_id = job.id
+        db.session.commit()  # no transaction stays open across the LLM call
+
+        result = run_analysis(payload['dreamText'], payload.get('context'), payload.get('tier', 'free'))
+        job = db.session.get(AnalysisJob, job_id)
+        if payload.get('dream_id'):
+            # Imported dream (journal_import.py): fill in its analysis in place
+            dream_analysis = apply_analysis(payload['dream_id'], result)
+        else:
+            dream_analysis = save_analysis(job.user_id, payload['dreamText'], result, payload)
+        db.session.flush()
+
+        if job.credit_charged and not is_billable(result):
+            release_credits(job.user_id, 1, commit=False)
+            job.credit_charged = False
+        job.status = 'succeeded'
+        job.dream_id = dream_analysis.id
+        job.error = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    except LLMUnavailableError as e:
+        # Shed by the circuit breaker or concurrency limit: not the job's fault
+        db.session.rollback()
+        job = db.session.get(AnalysisJob, job.id)
+        job.status = 'queued'
+        job.started_at = None
+        job.attempts = max(0, job.attempts - 1)
+        db.session.commit()
+        return e.retry_after
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Analysis job {job.id} failed (attempt {job.attempts}): {str(e)}")
+
+        job = db.session.get(AnalysisJob, job.id)
+        job.error = str(e)
+        if job.attempts < max_attempts:
+            job.status = 'queued'
+            job.started_at = None
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            if job.credit_charged:
+                # Give back the credit reserved when the job was accepted
+                release_credits(job.user_id, 1, commit=False)
+                job.credit_charged = False
+        db.session.commit()
+    return None
+
+
+class AnalysisWorkerPool:
+    """Threads that drain the analysis job table for one worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._recovered = False
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('ANALYSIS_JOBS_ENABLED'):
+            self.ensure_started()
+
+    def ensure_started(self):
+        """Start worker threads in this process if they are not running yet"""
+        if self._pid == os.getpid() and self._threads:
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            # Threads do not survive a fork, so a child process starts its own
+            self._threads = []
+            self._stopping.clear()
+            self._recovered = False
+            self._pid = os.getpid()
+
+            for i in range(self.app.config['ANALYSIS_JOB_WORKERS']):
+                thread = threading.Thread(target=self._run, args=(i,), name=f'analysis-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self):
+        """Wake idle workers after a job has been committed"""
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def _recover(self):
+        with self.app.app_context():
+            try:
+                requeued = requeue_stale_jobs(self.app.config['ANALYSIS_JOB_STALE_SECONDS'])
+                if requeued:
+                    logger.info(f"Requeued {requeued} stale analysis jobs")
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not requeue stale analysis jobs: {e}")
+            finally:
+                db.session.remove()
+
+    def _run(self, index):
+        poll_interval = self.app.config['ANALYSIS_JOB_POLL_INTERVAL']
+        max_attempts = self.app.config['ANALYSIS_JOB_MAX_ATTEMPTS']
+        idle = True
+        backoff = None
+
+        while not self._stopping.is_set():
+            if backoff:
+                self._stopping.wait(backoff)
+                backoff = None
+            elif idle:
+                # Sleep until notified or the next poll
+                self._wakeup.wait(poll_interval)
+                self._wakeup.clear()
+                if index == 0 and not self._recovered:
+                    self._recovered = True
+                    self._recover()
+
+            idle = True
+            with self.app.app_context():
+                try:
+                    job = claim_next_job()
+                    if job is not None:
+                        backoff = process_job(job, max_attempts)
+                        idle = False
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Analysis worker error: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+job_workers = AnalysisWorkerPool()
@@ -0,0 +1,249 @@
+"""
+Bulk import of dream journals from other apps (POST /api/dreams/import).
+
+The body is NDJSON (one dream per line) or a JSON array of dreams, as
+written by ``GET /api/dreams/export``. It is read from the request stream
+and parsed one dream at a time (array elements are decoded incrementally),
+so a large journal is never held in memory as a whole. Each dream is
+validated on its own; invalid ones are reported by index and skipped.
+Valid rows are inserted IMPORT_CHUNK_SIZE at a time with one multi-row
+INSERT each (``insert_dreams``), instead of an ORM add per row, all in
+the request's transaction: the import is stored completely or not at all,
+so a failed upload can simply be retried.
+
+Fields of a dream: ``dream_text`` (or ``dreamText``, required),
+``analysis``, ``advice``, ``mood_before``, ``mood_after``, ``tags``,
+``is_private`` and ``created_at`` (ISO 8601, defaults to now). Other
+fields, such as the ``id`` of an export, are ignored.
+"""
+
+import codecs
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from analysis import validate_dream_text, insert_dreams
+from symbols import merge_tags
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+MAX_MOOD_LENGTH = 50  # DreamAnalysis.mood_before/mood_after
+MAX_TEXT_LENGTH = 20000  # analysis and advice
+FUTURE_SKEW = timedelta(minutes=5)
+LOOKAHEAD = 64  # characters buffered past an array element before decoding it
+
+
+class ImportFormatError(ValueError):
+    """The body cannot be parsed any further (malformed JSON array)"""
+
+
+def _lines(stream, chunk_size):
+    """Lines of `stream` read chunk_size bytes at a time (the raw WSGI stream reads lines byte by byte)"""
+    pending = b''
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        lines = (pending + data).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_ndjson(stream, chunk_size=1 << 16):
+    """Yield (index, line, dream, error) for each non-blank line of `stream`"""
+    index = 0
+    for line, raw in enumerate(_lines(stream, chunk_size), start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield index, line, json.loads(raw), None
+        except ValueError as e:  # UnicodeDecodeError is a ValueError too
+            yield index, line, None, f'Invalid JSON: {e}'
+        index += 1
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """Yield (index, None, dream, None) for each element of a top-level JSON array
+
+    Reads `stream` chunk_size bytes at a time and decodes one element at a
+    time. Raises ImportFormatError where the array is malformed.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        data = stream.read(chunk_size)
+        eof = not data
+        buffer = buffer[pos:] + utf8.decode(data, final=eof)
+        pos = 0
+
+    def next_char():
+        """First non-whitespace character from pos ('' at the end of the body)"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n\ufeff':
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else ''
+            read_more()
+
+    try:
+        if next_char() != '[':
+            raise ImportFormatError('Expected a JSON array of dreams')
+        pos += 1
+        if next_char() == ']':
+            pos += 1
+        else:
+            index = 0
+            while True:
+                next_char()
+                if not eof and len(buffer) - pos < LOOKAHEAD:
+                    read_more()  # a number cut at the chunk end would decode as a shorter one
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    if eof:
+                        raise ImportFormatError(f'Invalid JSON in dream {index}')
+                    read_more()
+                    continue
+                if end == len(buffer) and not eof:
+                    read_more()
+                    continue
+                pos = end
+                yield index, None, item, None
+                index += 1
+                separator = next_char()
+                pos += 1
+                if separator == ']':
+                    break
+                if separator != ',':
+                    raise ImportFormatError(f'Expected , or ] after dream {index - 1}')
+        if next_char():
+            raise ImportFormatError('Unexpected data after the JSON array')
+    except UnicodeDecodeError as e:
+        raise ImportFormatError('Body is not valid UTF-8') from e
+
+
+def _optional_text(item, name, max_length):
+    value = item.get(name)
+    if value is None:
+        return None, None
+    if not isinstance(value, str):
+        return None, f'{name} must be a string'
+    if len(value) > max_length:
+        return None, f'{name} is too long (max {max_length} characters)'
+    return value, None
+
+
+def _created_at(value, now):
+    if value is None:
+        return now, None
+    if not isinstance(value, str):
+        return None, 'created_at must be an ISO 8601 string'
+    try:
+        created_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None, f"Invalid created_at '{value}'"
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    if created_at > now + FUTURE_SKEW:
+        return None, 'created_at is in the future'
+    return created_at, None
+
+
+def validate_row(item, user_id, now):
+    """Return (DreamAnalysis row dict, error message) for one imported dream"""
+    if not isinstance(item, dict):
+        return None, 'Each dream must be a JSON object'
+    if 'dream_text' not in item and 'dreamText' not in item:
+        return None, 'dream_text is required'
+    text = item.get('dream_text', item.get('dreamText'))
+    if text is not None and not isinstance(text, str):
+        return None, 'dream_text must be a string'
+    dream_text, error = validate_dream_text({'dreamText': text})
+    if error:
+        return None, error
+
+    row = {'id': str(uuid.uuid4()), 'user_id': user_id, 'dream_text': dream_text, 'updated_at': now}
+    for name, max_length in (('analysis', MAX_TEXT_LENGTH), ('advice', MAX_TEXT_LENGTH),
+                             ('mood_before', MAX_MOOD_LENGTH), ('mood_after', MAX_MOOD_LENGTH)):
+        row[name], error = _optional_text(item, name, max_length)
+        if error:
+            return None, error
+    row['analysis'] = row['analysis'] or ''
+    row['advice'] = row['advice'] or ''
+
+    tags = item.get('tags')
+    if tags is not None and not (isinstance(tags, list) and all(isinstance(tag, str) for tag in tags)):
+        return None, 'tags must be a list of strings'
+    row['tags'] = merge_tags(tags, dream_text)
+
+    is_private = item.get('is_private', True)
+    if not isinstance(is_private, bool):
+        return None, 'is_private must be true or false'
+    row['is_private'] = is_private
+
+    row['created_at'], error = _created_at(item.get('created_at'), now)
+    if error:
+        return None, error
+    return row, None
+
+
+class ImportResult:
+    """Counts, per-row errors and rows to analyze of one import"""
+
+    def __init__(self, max_errors):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.to_analyze = []  # (dream id, dream text)
+
+    def error(self, index, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            entry = {'index': index, 'message': message}
+            if line is not None:
+                entry['line'] = line
+            self.errors.append(entry)
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def import_dreams(user_id, items, chunk_size=500, max_rows=5000, max_errors=100, analyze=False):
+    """Validate and insert `items` from iter_ndjson/iter_json_array for the user
+
+    Returns an ImportResult (caller commits). Raises ImportFormatError for
+    a malformed body or more than `max_rows` dreams.
+    """
+    result = ImportResult(max_errors)
+    now = datetime.utcnow()
+    chunk = []
+    for index, line, item, error in items:
+        if index >= max_rows:
+            raise ImportFormatError(f'Too many dreams in one import (max {max_rows})')
+        if error is None:
+            row, error = validate_row(item, user_id, now)
+        if error:
+            result.error(index, line, error)
+            continue
+        chunk.append(row)
+        if analyze:
+            result.to_analyze.append((row['id'], row['dream_text']))
+        if len(chunk) >= chunk_size:
+            insert_dreams(chunk)
+            result.imported += len(chunk)
+            chunk = []
+    insert_dreams(chunk)
+    result.imported += len(chunk)
+    return result
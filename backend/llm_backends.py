@@ -0,0 +1,218 @@
+"""
+Pluggable LLM backends for dream analysis.
+
+``LLM_BACKEND`` in config.py selects the implementation:
+
+- ``openai``: chat completions through the pooled per-process OpenAI client
+- ``stub``: deterministic in-process backend with configurable latency,
+  token counts and failure rate, for load testing the Flask stack offline
+  without burning tokens
+"""
+
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from collections import namedtuple
+
+from llm_client import llm_clients
+
+logger = logging.getLogger(__name__)
+
+LLMCompletion = namedtuple('LLMCompletion', ['text', 'tokens_used'])
+# Streaming chunk: `delta` text, and `tokens_used` on the final usage chunk only
+LLMChunk = namedtuple('LLMChunk', ['delta', 'tokens_used'])
+
+
+class LLMError(Exception):
+    """Raised when a backend fails to produce a completion"""
+
+
+class LLMNotConfiguredError(LLMError, ValueError):
+    """Raised when a backend is missing required configuration"""
+
+
+class LLMBackend:
+    """Interface every LLM backend implements"""
+
+    name = 'base'
+
+    def complete(self, messages, model, max_tokens, temperature):
+        """Return an LLMCompletion for the chat messages"""
+        raise NotImplementedError
+
+    def stream(self, messages, model, max_tokens, temperature):
+        """Yield LLMChunk deltas; the last chunk carries tokens_used"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class OpenAIBackend(LLMBackend):
+    """Chat completions through the pooled OpenAI client"""
+
+    name = 'openai'
+
+    def __init__(self, config):
+        self.api_key = config.get('OPENAI_API_KEY')
+        if not self.api_key:
+            # Logged once here, not on every call: running without a key is a supported mode
+            logger.warning("OPENAI_API_KEY not set. Falling back to basic analysis.")
+
+    def _client(self):
+        if not self.api_key:
+            raise LLMNotConfiguredError("OpenAI API Key not configured.")
+        # Pooled per-process client: reuses keep-alive connections across requests
+        return llm_clients.get_client()
+
+    def complete(self, messages, model, max_tokens, temperature):
+        response = self._client().chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature
+        )
+        return LLMCompletion(response.choices[0].message.content.strip(), response.usage.total_tokens)
+
+    def stream(self, messages, model, max_tokens, temperature):
+        stream = self._client().chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature,
+            stream=True, stream_options={'include_usage': True}
+        )
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    yield LLMChunk('', chunk.usage.total_tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield LLMChunk(chunk.choices[0].delta.content, None)
+        finally:
+            stream.close()
+
+
+def parse_distribution(spec):
+    """Parse 'fixed:800', 'uniform:200,1200', 'normal:800,200' or 'lognormal:800,0.5'
+
+    Values are returned as a sampler taking a random.Random instance.
+    For lognormal the first parameter is the median and the second sigma.
+    """
+    kind, _, params = str(spec).partition(':')
+    if not params:
+        kind, params = 'fixed', kind
+    values = [float(v) for v in params.split(',') if v.strip()]
+    kind = kind.strip().lower()
+
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        low, high = values
+        return lambda rng: rng.uniform(low, high)
+    if kind == 'normal':
+        mean, stddev = values
+        return lambda rng: max(0.0, rng.gauss(mean, stddev))
+    if kind == 'lognormal':
+        median, sigma = values
+        mu = math.log(median)
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown distribution '{spec}'")
+
+
+STUB_RESPONSES = [
+    (
+        "يشير الماء الصافي في حلمك إلى صفاء داخلي ورغبة في التجدد، بينما يعكس اتساعه مشاعر عميقة "
+        "لم تجد طريقها بعد إلى التعبير. قد يدل الحلم على مرحلة انتقالية تمر بها وتبحث فيها عن التوازن.\n"
+        "نصائح: خصص وقتاً للتأمل والكتابة عن مشاعرك، وامنح نفسك فرصة للراحة قبل اتخاذ القرارات الكبيرة."
+    ),
+    (
+        "الطيران في الحلم رمز للحرية والرغبة في تجاوز القيود اليومية، ويعكس طموحاً قوياً وثقة متنامية "
+        "بالنفس. أما الخوف من السقوط فقد يرتبط بقلق من فقدان السيطرة على بعض جوانب حياتك.\n"
+        "نصائح: ضع أهدافاً واقعية على مراحل، واحتفل بالإنجازات الصغيرة لتعزيز شعورك بالأمان."
+    ),
+    (
+        "ظهور الثعبان في المنام يرمز غالباً إلى مخاوف خفية أو شخص تشعر تجاهه بعدم الارتياح، "
+        "وقد يدل أيضاً على طاقة تحول داخلي تحتاج إلى مواجهة بدلاً من الهروب.\n"
+        "نصائح: راجع علاقاتك القريبة بهدوء، وتحدث بصراحة عما يقلقك مع شخص تثق به."
+    ),
+    (
+        "سقوط الأسنان في الحلم يرتبط عادة بالقلق من التغيير أو الخوف من فقدان المكانة، "
+        "وقد يعكس ضغوطاً تتعلق بالمظهر أو بالقدرة على التعبير عن النفس.\n"
+        "نصائح: اهتم بنومك وصحتك، وقسّم مصادر الضغط إلى خطوات صغيرة يمكن التعامل معها."
+    ),
+]
+
+
+class StubBackend(LLMBackend):
+    """Deterministic local backend with realistic timing for load tests
+
+    The canned response is chosen from a hash of the prompt, so identical
+    prompts always get identical text. Latency, token counts and failures
+    are drawn from a seeded generator, so a run is reproducible.
+    """
+
+    name = 'stub'
+
+    def __init__(self, config):
+        self.latency = parse_distribution(config.get('STUB_LLM_LATENCY_MS', 'lognormal:800,0.4'))
+        self.tokens = parse_distribution(config.get('STUB_LLM_TOKENS', 'uniform:350,650'))
+        self.first_token_fraction = config.get('STUB_LLM_FIRST_TOKEN_FRACTION', 0.15)
+        self.failure_rate = config.get('STUB_LLM_FAILURE_RATE', 0.0)
+        self.chunk_chars = config.get('STUB_LLM_CHUNK_CHARS', 8)
+        self._rng = random.Random(config.get('STUB_LLM_SEED', 42))
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._failures = 0
+
+    def _plan(self, messages):
+        prompt = '\n'.join(m.get('content', '') for m in messages)
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        text = STUB_RESPONSES[digest[0] % len(STUB_RESPONSES)]
+
+        with self._lock:
+            self._calls += 1
+            latency = self.latency(self._rng) / 1000.0
+            tokens = int(self.tokens(self._rng))
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self._failures += 1
+        return text, latency, max(tokens, 1), fail
+
+    def complete(self, messages, model, max_tokens, temperature):
+        text, latency, tokens, fail = self._plan(messages)
+        time.sleep(latency)
+        if fail:
+            raise LLMError("Stub LLM injected failure")
+        return LLMCompletion(text, tokens)
+
+    def stream(self, messages, model, max_tokens, temperature):
+        text, latency, tokens, fail = self._plan(messages)
+        first_token = latency * self.first_token_fraction
+        time.sleep(first_token)
+        if fail:
+            raise LLMError("Stub LLM injected failure")
+
+        pieces = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        per_piece = (latency - first_token) / max(len(pieces), 1)
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(per_piece)
+            yield LLMChunk(piece, None)
+        yield LLMChunk('', tokens)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': self.name, 'calls': self._calls, 'injected_failures': self._failures}
+
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'stub': StubBackend,
+}
+
+
+def init_app(app):
+    """Create the configured backend and register it on the app"""
+    name = app.config.get('LLM_BACKEND', 'openai').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND '{name}' (expected one of {sorted(BACKENDS)})")
+    backend = BACKENDS[name](app.config)
+    app.extensions['llm_backend'] = backend
+    return backend
@@ -0,0 +1,175 @@
+"""
+Process-wide pooled HTTP client for LLM calls.
+
+Every analysis used to build a fresh ``httpx.Client`` and ``OpenAI`` object,
+paying TCP+TLS setup on each request and never closing the connection.
+``LLMClientManager`` lazily builds a single pooled client per worker process,
+reuses keep-alive connections across requests and threads, rebuilds itself
+after a fork (gunicorn workers) and closes cleanly at interpreter shutdown.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """HTTP transport that counts requests and newly opened connections"""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    def _trace(self, event_name, info):
+        # httpcore emits this event only when a brand new TCP connection is made
+        if event_name == 'connection.connect_tcp.complete':
+            self._stats.record_connection()
+
+    def handle_request(self, request):
+        self._stats.record_request()
+        request.extensions['trace'] = self._trace
+        return super().handle_request(request)
+
+
+class PoolStats:
+    """Thread-safe counters describing connection reuse"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def to_dict(self):
+        with self._lock:
+            requests, opened = self.requests, self.connections_opened
+        reused = max(requests - opened, 0)
+        return {
+            'requests': requests,
+            'connections_opened': opened,
+            'connections_reused': reused,
+            'reuse_rate': round(reused / requests, 4) if requests else 0.0,
+        }
+
+
+class LLMClientManager:
+    """Lazily builds and owns one pooled OpenAI client per worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._http_client = None
+        self._openai_client = None
+        self._settings = {}
+        self.stats = PoolStats()
+
+    def configure(self, config):
+        """Read pool settings from a Flask config mapping"""
+        self._settings = {
+            'api_key': config.get('OPENAI_API_KEY'),
+            'max_connections': config.get('LLM_POOL_MAX_CONNECTIONS', 20),
+            'max_keepalive': config.get('LLM_POOL_MAX_KEEPALIVE', 10),
+            'keepalive_expiry': config.get('LLM_POOL_KEEPALIVE_EXPIRY', 30.0),
+            'http2': config.get('LLM_HTTP2', False),
+            'timeout': config.get('LLM_TIMEOUT', 60.0),
+            'connect_timeout': config.get('LLM_CONNECT_TIMEOUT', 5.0),
+        }
+
+    def _http2_available(self):
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            logger.warning("LLM_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+            return False
+
+    def _build(self):
+        from openai import OpenAI
+
+        settings = self._settings
+        limits = httpx.Limits(
+            max_connections=settings['max_connections'],
+            max_keepalive_connections=settings['max_keepalive'],
+            keepalive_expiry=settings['keepalive_expiry'],
+        )
+        http2 = bool(settings['http2']) and self._http2_available()
+        transport = _CountingTransport(self.stats, limits=limits, http2=http2, trust_env=False)
+
+        # trust_env=False keeps the client independent of proxy environment variables
+        self._http_client = httpx.Client(
+            transport=transport,
+            trust_env=False,
+            timeout=httpx.Timeout(settings['timeout'], connect=settings['connect_timeout']),
+        )
+        self._openai_client = OpenAI(api_key=settings['api_key'], http_client=self._http_client)
+        self._pid = os.getpid()
+        logger.info(
+            "Built pooled LLM client (pid=%s, max_connections=%s, keepalive=%s, http2=%s)",
+            self._pid, settings['max_connections'], settings['max_keepalive'], http2
+        )
+
+    def get_client(self):
+        """Return the pooled OpenAI client, building it on first use"""
+        if self._openai_client is not None and self._pid == os.getpid():
+            return self._openai_client
+
+        with self._lock:
+            if self._pid is not None and self._pid != os.getpid():
+                # Inherited from the parent process: the sockets are shared with
+                # the parent, so drop them without closing and start fresh.
+                self._http_client = None
+                self._openai_client = None
+                self.stats = PoolStats()
+            if self._openai_client is None:
+                self._build()
+            return self._openai_client
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._http_client = None
+        self._openai_client = None
+        self._pid = None
+        self.stats = PoolStats()
+
+    def close(self):
+        """Close pooled connections owned by this process"""
+        with self._lock:
+            if self._http_client is not None and self._pid == os.getpid():
+                try:
+                    self._http_client.close()
+                except Exception as e:
+                    logger.warning(f"Error closing LLM HTTP client: {e}")
+            self._http_client = None
+            self._openai_client = None
+            self._pid = None
+
+    def pool_stats(self):
+        """Return connection reuse counters and pool state"""
+        stats = self.stats.to_dict()
+        stats.update({
+            'initialized': self._openai_client is not None and self._pid == os.getpid(),
+            'pid': os.getpid(),
+            'max_connections': self._settings.get('max_connections'),
+            'max_keepalive_connections': self._settings.get('max_keepalive'),
+            'http2': bool(self._settings.get('http2')),
+        })
+        return stats
+
+
+llm_clients = LLMClientManager()
+
+atexit.register(llm_clients.close)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=llm_clients._reset_after_fork)
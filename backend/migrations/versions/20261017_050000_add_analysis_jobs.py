@@ -0,0 +1,48 @@
+"""Add analysis_jobs table for asynchronous analyses
+
+Revision ID: 20261017_050000
+Revises: 20250715_031644
+Create Date: 2026-10-17 05:00:00.000000
+
+Queued analyses (``"async": true``) are stored as rows that the worker
+pool in jobs.py claims, runs and finishes. Databases created by
+db.create_all() already have the table.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_050000'
+down_revision = '20250715_031644'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('analysis_jobs'):
+        return
+    op.create_table('analysis_jobs',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('credit_charged', sa.Boolean(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('dream_id', sa.String(length=36), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['dream_id'], ['dream_analyses.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_analysis_jobs_user_id'), 'analysis_jobs', ['user_id'], unique=False)
+    op.create_index(op.f('ix_analysis_jobs_status'), 'analysis_jobs', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_analysis_jobs_status'), table_name='analysis_jobs')
+    op.drop_index(op.f('ix_analysis_jobs_user_id'), table_name='analysis_jobs')
+    op.drop_table('analysis_jobs')
@@ -0,0 +1,40 @@
+"""Add analysis_cache table for the persistent analysis cache
+
+Revision ID: 20261017_060000
+Revises: 20261017_050000
+Create Date: 2026-10-17 06:00:00.000000
+
+Database tier of analysis_cache.py: analyses keyed by a hash of the
+normalized dream text and model parameters, kept until expires_at.
+Databases created by db.create_all() already have the table.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_060000'
+down_revision = '20261017_050000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('analysis_cache'):
+        return
+    op.create_table('analysis_cache',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('analysis', sa.Text(), nullable=False),
+        sa.Column('advice', sa.Text(), nullable=False),
+        sa.Column('tokens_used', sa.Integer(), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_analysis_cache_expires_at'), 'analysis_cache', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_analysis_cache_expires_at'), table_name='analysis_cache')
+    op.drop_table('analysis_cache')
@@ -0,0 +1,34 @@
+"""Add rate_limit_buckets table for shared rate limiting
+
+Revision ID: 20261017_070000
+Revises: 20261017_060000
+Create Date: 2026-10-17 07:00:00.000000
+
+Token buckets used when RATELIMIT_STORAGE = 'database', so that every
+worker and instance enforces the same limits (ratelimit.py). Databases
+created by db.create_all() already have the table.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_070000'
+down_revision = '20261017_060000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('rate_limit_buckets'):
+        return
+    op.create_table('rate_limit_buckets',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('rate_limit_buckets')
@@ -0,0 +1,73 @@
+"""Add dream_search full-text index
+
+Revision ID: 20261017_080000
+Revises: 20261017_070000
+Create Date: 2026-10-17 08:00:00.000000
+
+Search index of search.py, one layout per dialect:
+
+- SQLite: an FTS5 virtual table (user id as an indexed column, dream id
+  unindexed), or the LIKE table when the SQLite build has no FTS5;
+- PostgreSQL: a tsvector document with a GIN index, removed with its dream;
+- anything else: normalized text searched with LIKE.
+
+search.py picks its backend from the table it finds. Dreams stored before
+this revision are indexed here, in the migration transaction.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_080000'
+down_revision = '20261017_070000'
+branch_labels = None
+depends_on = None
+
+
+def _create_like_table():
+    op.create_table('dream_search',
+        sa.Column('dream_id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('dream_id')
+    )
+    op.create_index('ix_dream_search_user_id', 'dream_search', ['user_id'], unique=False)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if sa.inspect(bind).has_table('dream_search'):
+        return
+
+    dialect = bind.dialect.name
+    if dialect == 'sqlite':
+        try:
+            op.execute(
+                "CREATE VIRTUAL TABLE dream_search USING fts5("
+                "dream_text, analysis, user_id, dream_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except sa.exc.OperationalError:
+            _create_like_table()  # no such module: fts5; SQLite keeps the transaction usable
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE dream_search ("
+            "dream_id VARCHAR(36) PRIMARY KEY REFERENCES dream_analyses (id) ON DELETE CASCADE, "
+            "user_id VARCHAR(36) NOT NULL, document TSVECTOR NOT NULL)"
+        )
+        op.execute("CREATE INDEX ix_dream_search_document ON dream_search USING GIN (document)")
+        op.execute("CREATE INDEX ix_dream_search_user_id ON dream_search (user_id)")
+    else:
+        _create_like_table()
+
+    # Only a dream_analyses table in the models' layout (db.create_all) holds dreams to index
+    columns = set() if op.get_context().as_sql else {
+        column['name'] for column in sa.inspect(bind).get_columns('dream_analyses')
+    }
+    if 'dream_text' in columns:
+        from search import search_index
+        search_index.rebuild(bind)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS dream_search")
@@ -0,0 +1,57 @@
+"""Add composite (user_id, created_at, id) index for dream history
+
+Revision ID: 20261017_090000
+Revises: 20261017_080000
+Create Date: 2026-10-17 09:00:00.000000
+
+History pages order a user's dreams by (created_at DESC, id DESC) and the
+stats endpoint counts the last 30 days; with only ix_dream_analyses_user_id
+both sort or filter every dream of the user. The composite index serves
+both as a range scan, and covers the count.
+
+On PostgreSQL the index is built CONCURRENTLY (outside the migration
+transaction) so writes to dream_analyses are not blocked; an INVALID index
+left by an interrupted build is dropped and rebuilt. Elsewhere it is a
+plain CREATE INDEX. Databases created by db.create_all() already have it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_090000'
+down_revision = '20261017_080000'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_dream_analyses_user_id_created_at'
+COLUMNS = ['user_id', 'created_at', 'id']
+
+
+def _is_postgresql():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    if not _is_postgresql():
+        op.create_index(INDEX_NAME, 'dream_analyses', COLUMNS, unique=False, if_not_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        invalid = not op.get_context().as_sql and op.get_bind().execute(sa.text(
+            "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name"
+        ), {'name': INDEX_NAME}).scalar()
+        if invalid:
+            op.drop_index(INDEX_NAME, table_name='dream_analyses', postgresql_concurrently=True)
+        op.create_index(INDEX_NAME, 'dream_analyses', COLUMNS, unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    if not _is_postgresql():
+        op.drop_index(INDEX_NAME, table_name='dream_analyses', if_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX_NAME, table_name='dream_analyses', postgresql_concurrently=True, if_exists=True)
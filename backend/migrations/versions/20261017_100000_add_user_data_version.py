@@ -0,0 +1,32 @@
+"""Add users.data_version for conditional GET
+
+Revision ID: 20261017_100000
+Revises: 20261017_090000
+Create Date: 2026-10-17 10:00:00.000000
+
+A per-user counter bumped with every change to the user's profile or
+dreams; ETags of user-scoped GET routes are derived from it (etag.py).
+Existing users start at 0. Databases created by db.create_all() already
+have the column.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261017_100000'
+down_revision = '20261017_090000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = sa.inspect(op.get_bind()).get_columns('users')
+    if any(column['name'] == 'data_version' for column in columns):
+        return
+    op.add_column('users', sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('data_version')
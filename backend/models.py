@@ -3,6 +3,8 @@ from flask_bcrypt import Bcrypt
 from datetime import datetime
 import uuid
 
+from serializers import column_serializer
+
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 
@@ -24,6 +26,8 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     last_login = db.Column(db.DateTime, nullable=True)
     credits = db.Column(db.Integer, default=0, nullable=False)
+    # Bumped with every change to the user's profile or dreams; feeds ETags (etag.py)
+    data_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # Subscription fields
     subscription_status = db.Column(db.String(20), default='none', nullable=False)  # none, active, expired, cancelled
@@ -55,27 +59,13 @@ class User(db.Model):
         """Get total number of dreams analyzed"""
         return DreamAnalysis.query.filter_by(user_id=self.id).count()
     
-    def to_dict(self):
-        """Convert user to dictionary (excluding sensitive data)"""
-        return {
-            'id': str(self.id),
-            'email': self.email,
-            'username': self.username,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'full_name': self.get_full_name(),
-            'is_active': self.is_active,
-            'email_verified': self.email_verified,
-            'created_at': self.created_at.isoformat(),
-            'last_login': self.last_login.isoformat() if self.last_login else None,
-            'dream_count': self.get_dream_count(),
-            'credits': getattr(self, 'credits', 0),
-            'subscription_status': getattr(self, 'subscription_status', 'none'),
-            'subscription_type': getattr(self, 'subscription_type', None),
-            'subscription_start_date': self.subscription_start_date.isoformat() if getattr(self, 'subscription_start_date', None) else None,
-            'subscription_end_date': self.subscription_end_date.isoformat() if getattr(self, 'subscription_end_date', None) else None,
-            'subscription_auto_renew': getattr(self, 'subscription_auto_renew', True)
-        }
+    to_dict = column_serializer(
+        'id', 'email', 'username', 'first_name', 'last_name',
+        ('full_name', get_full_name), 'is_active', 'email_verified', 'created_at', 'last_login',
+        ('dream_count', get_dream_count), 'credits', 'subscription_status', 'subscription_type',
+        'subscription_start_date', 'subscription_end_date', 'subscription_auto_renew',
+        doc='Convert user to dictionary (excluding sensitive data)',
+    )
 
 class UserSession(db.Model):
     __tablename__ = 'user_sessions'
@@ -104,22 +94,18 @@ class DreamAnalysis(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    def to_dict(self):
-        """Convert dream analysis to dictionary"""
-        return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
-            'dream_text': self.dream_text,
-            'analysis': self.analysis,
-            'advice': self.advice,
-            'mood_before': self.mood_before,
-            'mood_after': self.mood_after,
-            'tags': self.tags or [],
-            'is_private': self.is_private,
-            'created_at': self.created_at.isoformat(),
-            'timestamp': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    __table_args__ = (
+        # History pages (ORDER BY created_at DESC, id DESC) and date-range counts
+        # per user; see migration 20261017_090000
+        db.Index('ix_dream_analyses_user_id_created_at', 'user_id', 'created_at', 'id'),
+    )
+    
+    to_dict = column_serializer(
+        'id', 'user_id', 'dream_text', 'analysis', 'advice', 'mood_before', 'mood_after',
+        'tags', 'is_private', 'created_at', ('timestamp', 'created_at'), 'updated_at',
+        defaults={'tags': []},
+        doc='Convert dream analysis to dictionary',
+    )
 
 class Purchase(db.Model):
     __tablename__ = 'purchases'
@@ -141,25 +127,12 @@ class Purchase(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    def to_dict(self):
-        return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
-            'product_id': self.product_id,
-            'purchase_token': self.purchase_token,
-            'order_id': self.order_id,
-            'purchase_time': self.purchase_time.isoformat(),
-            'purchase_state': self.purchase_state,
-            'consumption_state': self.consumption_state,
-            'acknowledgement_state': self.acknowledgement_state,
-            'credits_granted': self.credits_granted,
-            'is_subscription': self.is_subscription,
-            'subscription_period_start': self.subscription_period_start.isoformat() if self.subscription_period_start else None,
-            'subscription_period_end': self.subscription_period_end.isoformat() if self.subscription_period_end else None,
-            'auto_renewing': self.auto_renewing,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    to_dict = column_serializer(
+        'id', 'user_id', 'product_id', 'purchase_token', 'order_id', 'purchase_time',
+        'purchase_state', 'consumption_state', 'acknowledgement_state', 'credits_granted',
+        'is_subscription', 'subscription_period_start', 'subscription_period_end',
+        'auto_renewing', 'created_at', 'updated_at',
+    )
 
 class APIUsage(db.Model):
     __tablename__ = 'api_usage'
@@ -171,4 +144,52 @@ class APIUsage(db.Model):
     cost = db.Column(db.Numeric(10, 6), default=0.0)  # Track API costs
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     
-    user = db.relationship('User', backref='api_usage') 
\ No newline at end of file
+    user = db.relationship('User', backref='api_usage')
+
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued, running, succeeded, failed
+    payload = db.Column(db.JSON, nullable=False)  # dreamText, context, mood and tags from the request
+    credit_charged = db.Column(db.Boolean, default=False, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    dream_id = db.Column(db.String(36), db.ForeignKey('dream_analyses.id'), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    dream = db.relationship('DreamAnalysis')
+    
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'status': self.status,
+            'attempts': self.attempts,
+            'dream_id': self.dream_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class AnalysisCacheEntry(db.Model):
+    __tablename__ = 'analysis_cache'
+    
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of normalized input and model parameters
+    analysis = db.Column(db.Text, nullable=False)
+    advice = db.Column(db.Text, nullable=False)
+    tokens_used = db.Column(db.Integer, default=0, nullable=False)
+    model = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class RateLimitBucket(db.Model):
+    __tablename__ = 'rate_limit_buckets'
+    
+    key = db.Column(db.String(255), primary_key=True)  # rule:scope:identity
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # unix time of the last refill
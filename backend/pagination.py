@@ -0,0 +1,69 @@
+"""
+Keyset (cursor) pagination on (created_at, id), newest first.
+
+``LIMIT/OFFSET`` reads and discards every skipped row, so page 500 of a
+long journal costs 500 pages of work, and rows inserted meanwhile shift
+what later pages return. A keyset page instead starts right after the
+last row the client saw, with the same index range scan at any depth:
+
+    WHERE user_id = ? AND created_at <= :created_at
+      AND (created_at < :created_at OR id < :id)
+    ORDER BY created_at DESC, id DESC LIMIT :per_page + 1
+
+The position is handed to clients as an opaque ``next_cursor`` (URL-safe
+base64 of the last row's created_at and id); the extra row tells whether
+there is a next page without a COUNT.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor pointing just after the row (created_at, row_id)"""
+    raw = json.dumps([created_at.isoformat(), str(row_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, row_id); raise InvalidCursorError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError('Invalid cursor') from e
+
+
+def after_cursor(query, created_column, id_column, cursor):
+    """Restrict `query` to rows after `cursor` in (created_at, id) DESC order"""
+    if not cursor:
+        return query
+    created_at, row_id = decode_cursor(cursor)
+    # The plain upper bound keeps the predicate an index range on created_at
+    return query.filter(
+        created_column <= created_at,
+        or_(created_column < created_at, and_(created_column == created_at, id_column < row_id)),
+    )
+
+
+def keyset_page(query, created_column, id_column, cursor=None, per_page=20):
+    """Return (rows, next_cursor) for one page; next_cursor is None on the last page"""
+    rows = (
+        after_cursor(query, created_column, id_column, cursor)
+        .order_by(created_column.desc(), id_column.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
@@ -0,0 +1,96 @@
+"""
+Sparse fieldsets for dream listings.
+
+``DreamAnalysis.to_dict`` sends the full dream, analysis and advice (often
+kilobytes of Arabic each) for every item, and the creation time twice. A
+listing can instead ask for ``view=summary`` or an explicit
+``fields=id,created_at,dream_text_preview``: only the columns behind those
+fields are selected, and ``*_preview`` fields read just the first
+PREVIEW_CHARS characters in SQL (``substr``), so the long texts never leave
+the database. The full dream is served by ``GET /api/dreams/<id>``.
+"""
+
+from sqlalchemy import func
+
+from models import DreamAnalysis
+
+PREVIEW_CHARS = 160
+
+# Field name -> column (or SQL expression) it is read from
+_COLUMNS = {
+    'id': DreamAnalysis.id,
+    'user_id': DreamAnalysis.user_id,
+    'dream_text': DreamAnalysis.dream_text,
+    'analysis': DreamAnalysis.analysis,
+    'advice': DreamAnalysis.advice,
+    'mood_before': DreamAnalysis.mood_before,
+    'mood_after': DreamAnalysis.mood_after,
+    'tags': DreamAnalysis.tags,
+    'is_private': DreamAnalysis.is_private,
+    'created_at': DreamAnalysis.created_at,
+    'timestamp': DreamAnalysis.created_at,
+    'updated_at': DreamAnalysis.updated_at,
+    # One extra character tells whether the text was cut
+    'dream_text_preview': func.substr(DreamAnalysis.dream_text, 1, PREVIEW_CHARS + 1),
+    'analysis_preview': func.substr(DreamAnalysis.analysis, 1, PREVIEW_CHARS + 1),
+    'advice_preview': func.substr(DreamAnalysis.advice, 1, PREVIEW_CHARS + 1),
+}
+
+FIELDS = tuple(_COLUMNS)
+VIEWS = {
+    'summary': ('id', 'created_at', 'mood_before', 'mood_after', 'tags', 'dream_text_preview', 'analysis_preview'),
+}
+
+
+def parse_fields(view=None, fields=None):
+    """Fields requested by ?view= or ?fields=; None means the full to_dict()
+
+    Raises ValueError naming the unknown view or fields.
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in _COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(FIELDS)})")
+        # The id is always returned so the client can fetch the full dream
+        return tuple(dict.fromkeys(['id'] + names))
+    if not view or view == 'full':
+        return None
+    if view not in VIEWS:
+        raise ValueError(f"Unknown view '{view}' (allowed: full, {', '.join(VIEWS)})")
+    return VIEWS[view]
+
+
+def columns(fields):
+    """Labelled columns to select for `fields`, plus created_at and id for paging"""
+    selected = {name: _COLUMNS[name] for name in fields}
+    selected.setdefault('created_at', DreamAnalysis.created_at)
+    return [column.label(name) for name, column in selected.items()] + (
+        [] if 'id' in selected else [DreamAnalysis.id.label('id')]
+    )
+
+
+def preview(text, limit=PREVIEW_CHARS):
+    """Cut `text` to at most `limit` characters at a word boundary, marking the cut"""
+    if text is None or len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = cut.rfind(' ')
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip() + '…'
+
+
+def row_to_dict(row, fields):
+    """Serialize a row selected with columns(fields)"""
+    data = {}
+    for name in fields:
+        value = getattr(row, name)
+        if name.endswith('_preview'):
+            value = preview(value)
+        elif name in ('created_at', 'timestamp', 'updated_at'):
+            value = value.isoformat()
+        elif name == 'tags':
+            value = value or []
+        data[name] = value
+    return data
@@ -0,0 +1,256 @@
+"""
+Token-bucket rate limiting for expensive and abuse-prone routes.
+
+Each rule in config.py (``RATELIMIT_<NAME> = '10/minute;burst=5'``) gives a
+bucket per route and per user or client IP: it holds up to ``burst`` tokens
+(default: the count) and refills at count/period. The ``rate_limit``
+decorator takes a token before the view runs, so rejected requests never
+reach bcrypt, the database credit check or the LLM.
+
+Buckets live in process memory, or in the ``rate_limit_buckets`` table when
+``RATELIMIT_STORAGE = 'database'`` so that all gunicorn workers and
+instances share them. Responses carry ``RateLimit-Limit``,
+``RateLimit-Remaining``, ``RateLimit-Reset`` and ``RateLimit-Policy``, and
+rejections add ``Retry-After``.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'second': 1, 'm': 60, 'minute': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+RULE_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+?)s?\s*(?:;\s*burst\s*=\s*(\d+)\s*)?$')
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'reset_after', 'retry_after'])
+
+
+class Rule:
+    """`count` requests per `window` seconds with a bucket of `burst` tokens"""
+
+    def __init__(self, count, window, burst=None):
+        self.count = count
+        self.window = window
+        self.capacity = burst or count
+        self.rate = count / window  # tokens per second
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse '10/minute', '100/hour;burst=20' or '5/10s'; empty means unlimited"""
+        if not spec:
+            return None
+        match = RULE_RE.match(str(spec).lower())
+        if not match or match.group(3) not in PERIODS:
+            raise ValueError(f"Invalid rate limit '{spec}'")
+        count, multiplier, unit, burst = match.groups()
+        return cls(int(count), int(multiplier or 1) * PERIODS[unit], int(burst) if burst else None)
+
+    @property
+    def policy(self):
+        policy = f'{self.count};w={self.window}'
+        if self.capacity != self.count:
+            policy += f';burst={self.capacity}'
+        return policy
+
+    def result(self, allowed, tokens, cost):
+        reset_after = (self.capacity - tokens) / self.rate
+        retry_after = 0 if allowed else (cost - tokens) / self.rate
+        return RateLimitResult(allowed, self.capacity, max(0, int(tokens)), reset_after, retry_after)
+
+
+class MemoryStore:
+    """Buckets in a per-process LRU; each worker enforces its own limits"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, rule, cost, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rule.capacity, now))
+            tokens = min(rule.capacity, tokens + (now - updated) * rule.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return rule.result(allowed, tokens, cost)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseStore:
+    """Buckets in the rate_limit_buckets table, shared by every worker
+
+    A token is taken with one conditional UPDATE that refills and spends in
+    the same statement, so concurrent workers cannot both spend the last one.
+    Runs on its own short transaction, outside the request session.
+    """
+
+    name = 'database'
+
+    def take(self, key, rule, cost, now):
+        table = RateLimitBucket
+        elapsed = now - table.updated_at
+        refilled = case(
+            (table.tokens + elapsed * rule.rate > rule.capacity, rule.capacity),
+            else_=table.tokens + elapsed * rule.rate
+        )
+        for _ in range(2):
+            try:
+                with db.engine.begin() as connection:
+                    spent = connection.execute(
+                        update(table).where(table.key == key, refilled >= cost)
+                        .values(tokens=refilled - cost, updated_at=now)
+                    ).rowcount
+                    row = connection.execute(
+                        select(table.tokens, table.updated_at).where(table.key == key)
+                    ).first()
+                    if row is None:
+                        # First request for this key: start from a full bucket
+                        tokens = rule.capacity - cost if rule.capacity >= cost else rule.capacity
+                        connection.execute(insert(table).values(key=key, tokens=tokens, updated_at=now))
+                        return rule.result(rule.capacity >= cost, tokens, cost)
+            except IntegrityError:
+                continue  # another worker inserted the key first; retry the update
+            if spent:
+                return rule.result(True, row.tokens, cost)
+            tokens = min(rule.capacity, row.tokens + (now - row.updated_at) * rule.rate)
+            return rule.result(False, tokens, cost)
+        raise RuntimeError(f"Could not update rate limit bucket {key}")
+
+    def clear(self):
+        with db.engine.begin() as connection:
+            connection.execute(RateLimitBucket.__table__.delete())
+
+
+class RateLimiter:
+    """Looks up rules, resolves the caller's identity and counts decisions"""
+
+    def __init__(self):
+        self.enabled = False
+        self.store = MemoryStore()
+        self.trust_forwarded = False
+        self._rules = {}
+        self._lock = threading.Lock()
+        self._counts = {'allowed': 0, 'rejected': 0, 'errors': 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('RATELIMIT_ENABLED', True)
+        self.trust_forwarded = config.get('RATELIMIT_TRUST_FORWARDED', False)
+        storage = config.get('RATELIMIT_STORAGE', 'memory').lower()
+        if storage == 'database':
+            self.store = DatabaseStore()
+        elif storage == 'memory':
+            self.store = MemoryStore(config.get('RATELIMIT_MEMORY_MAX_KEYS', 100000))
+        else:
+            raise ValueError(f"Unknown RATELIMIT_STORAGE '{storage}' (expected 'memory' or 'database')")
+        # Parse every configured rule now so a typo fails at startup
+        self._rules = {
+            name[len('RATELIMIT_'):].lower(): Rule.parse(value)
+            for name, value in config.items()
+            if name.startswith('RATELIMIT_') and isinstance(value, str) and '/' in value
+        }
+
+    def rule(self, name):
+        return self._rules.get(name)
+
+    def client_ip(self):
+        if self.trust_forwarded and request.access_route:
+            return request.access_route[0]
+        return request.remote_addr or 'unknown'
+
+    def identity(self, per):
+        if per == 'user':
+            try:
+                user_id = get_jwt_identity()
+            except RuntimeError:
+                user_id = None  # view is not behind jwt_required
+            if user_id:
+                return f'user:{user_id}'
+        return f'ip:{self.client_ip()}'
+
+    def hit(self, name, per='user', cost=1):
+        """Take `cost` tokens for the current request; None when not limited"""
+        rule = self._rules.get(name)
+        if not self.enabled or rule is None:
+            return None
+        key = f'{name}:{self.identity(per)}'
+        try:
+            result = self.store.take(key, rule, cost, time.time())
+        except Exception as e:
+            # Fail open: an unavailable store must not take the API down
+            self._incr('errors')
+            logger.warning(f"Rate limit store error for {key}: {e}")
+            return None
+        self._incr('allowed' if result.allowed else 'rejected')
+        return result
+
+    def _incr(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def to_dict(self):
+        with self._lock:
+            stats = dict(self._counts)
+        stats.update({
+            'enabled': self.enabled,
+            'storage': self.store.name,
+            'rules': {name: rule.policy for name, rule in self._rules.items() if rule},
+        })
+        return stats
+
+
+rate_limiter = RateLimiter()
+
+
+def apply_headers(response, rule, result):
+    response.headers['RateLimit-Limit'] = str(result.limit)
+    response.headers['RateLimit-Remaining'] = str(result.remaining)
+    response.headers['RateLimit-Reset'] = str(math.ceil(result.reset_after))
+    response.headers['RateLimit-Policy'] = rule.policy
+    return response
+
+
+def rate_limit(name, per='user'):
+    """Limit a view by the RATELIMIT_<NAME> rule, per user ('user') or client IP ('ip')
+
+    Place it below @jwt_required() so per-user limits see the identity;
+    without one it falls back to the client IP.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            result = rate_limiter.hit(name, per)
+            if result is None:
+                return view(*args, **kwargs)
+            rule = rate_limiter.rule(name)
+            if not result.allowed:
+                retry_after = max(1, math.ceil(result.retry_after))
+                response = jsonify({'message': 'Too many requests, please slow down', 'retry_after': retry_after})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return apply_headers(response, rule, result)
+            return apply_headers(make_response(view(*args, **kwargs)), rule, result)
+        return wrapped
+    return decorator
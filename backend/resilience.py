@@ -0,0 +1,236 @@
+"""
+Circuit breaker and adaptive concurrency limit around LLM calls.
+
+When the LLM provider degrades, requests should fail fast instead of each
+waiting out the full timeout while threads and database sessions pile up
+behind them. ``LLMGuard`` combines:
+
+- a circuit breaker that opens after consecutive failures, rejects calls
+  while open, and lets a limited number of probes through once the reset
+  timeout has passed (half-open) before closing again;
+- an AIMD concurrency limiter that grows the number of in-flight calls by
+  roughly one per round of successful calls and cuts it multiplicatively
+  on failures or slow responses. Calls over the limit are rejected at once.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from llm_backends import LLMError, LLMNotConfiguredError
+
+
+class LLMUnavailableError(LLMError):
+    """The LLM call was rejected without being attempted"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class ConcurrencyLimitError(LLMUnavailableError):
+    pass
+
+
+def is_service_failure(exc):
+    """Whether an exception says something about the provider's health
+
+    Configuration problems and client errors (4xx other than 408/429) are the
+    caller's fault and must not trip the breaker.
+    """
+    if isinstance(exc, (LLMNotConfiguredError, LLMUnavailableError)):
+        return False
+    status = getattr(exc, 'status_code', None)
+    if isinstance(status, int) and status < 500 and status not in (408, 429):
+        return False
+    return True
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open probes -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.trips = 0
+        self.rejections = 0
+
+    def _current_state(self):
+        # Caller holds the lock
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through; returns True for probes"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+            self.rejections += 1
+            retry_after = self.reset_timeout - (self._clock() - self._opened_at)
+            raise CircuitOpenError('LLM circuit is open', max(retry_after, 1))
+
+    def on_success(self, probe=False):
+        with self._lock:
+            self._consecutive_failures = 0
+            if probe or self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._probes_in_flight = 0
+
+    def on_failure(self, probe=False):
+        with self._lock:
+            self._consecutive_failures += 1
+            if probe or self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.trips += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probes_in_flight = 0
+
+    def on_ignored(self, probe=False):
+        """Release a probe slot for a call whose outcome says nothing about health"""
+        if probe:
+            with self._lock:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'trips': self.trips,
+                'rejections': self.rejections,
+            }
+
+
+class AdaptiveConcurrencyLimiter:
+    """Additive-increase / multiplicative-decrease limit on in-flight calls"""
+
+    def __init__(self, initial=8, minimum=1, maximum=64, latency_target=20.0, backoff=0.7):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._limit = float(initial)
+        self._in_flight = 0
+        self.rejections = 0
+
+    @property
+    def limit(self):
+        with self._lock:
+            return int(self._limit)
+
+    def try_acquire(self):
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                self.rejections += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency, ok):
+        with self._lock:
+            self._in_flight -= 1
+            if ok and latency <= self.latency_target:
+                # About +1 once a full window of calls has succeeded
+                self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            elif ok is not None:
+                self._limit = max(self.minimum, self._limit * self.backoff)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'rejections': self.rejections,
+                'min': self.minimum,
+                'max': self.maximum,
+            }
+
+
+class LLMGuard:
+    """Circuit breaker plus adaptive limiter wrapped around every LLM call"""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.limiter = AdaptiveConcurrencyLimiter()
+
+    def init_app(self, app):
+        config = app.config
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.get('LLM_BREAKER_FAILURE_THRESHOLD', 5),
+            reset_timeout=config.get('LLM_BREAKER_RESET_TIMEOUT', 30.0),
+            half_open_max_calls=config.get('LLM_BREAKER_HALF_OPEN_MAX_CALLS', 1),
+        )
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial=config.get('LLM_LIMIT_INITIAL', 8),
+            minimum=config.get('LLM_LIMIT_MIN', 1),
+            maximum=config.get('LLM_LIMIT_MAX', 64),
+            latency_target=config.get('LLM_LIMIT_LATENCY_TARGET', 20.0),
+            backoff=config.get('LLM_LIMIT_BACKOFF', 0.7),
+        )
+
+    def available(self):
+        """Cheap pre-flight check used before starting a streamed response"""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    @contextmanager
+    def protect(self):
+        """Admit one LLM call or raise LLMUnavailableError, and record its outcome"""
+        probe = self.breaker.before_call()
+        if not self.limiter.try_acquire():
+            self.breaker.on_ignored(probe)
+            raise ConcurrencyLimitError('Too many concurrent analyses, try again shortly', 1)
+
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_service_failure(e):
+                self.breaker.on_failure(probe)
+                self.limiter.release(time.monotonic() - started, ok=False)
+            else:
+                self.breaker.on_ignored(probe)
+                self.limiter.release(time.monotonic() - started, ok=None)
+            raise
+        except BaseException:
+            # GeneratorExit from an abandoned stream: no verdict on provider health
+            self.breaker.on_ignored(probe)
+            self.limiter.release(time.monotonic() - started, ok=None)
+            raise
+        else:
+            self.breaker.on_success(probe)
+            self.limiter.release(time.monotonic() - started, ok=True)
+
+    def to_dict(self):
+        return {'breaker': self.breaker.to_dict(), 'limiter': self.limiter.to_dict()}
+
+
+llm_guard = LLMGuard()
@@ -0,0 +1,59 @@
+"""
+Database schema setup at startup.
+
+Both deploy paths (``python start_server.py`` and gunicorn ``app:app``)
+used to call only ``db.create_all()``, which creates missing tables but
+never alters existing ones, so a new column such as users.data_version
+never reached a deployed database. ``upgrade_database`` runs the Alembic
+migrations instead:
+
+- a database with no current revision (new, created by db.create_all()
+  before migrations ran at startup, or with an empty ``alembic_version``
+  table) gets its missing tables from the models and is stamped at the
+  baseline revision; the later revisions skip whatever create_all
+  already made;
+- ``flask_migrate.upgrade()`` then applies every pending revision.
+
+This runs when app.py is imported, so a failure is logged with the
+database it concerns before it is raised.
+"""
+
+import logging
+import os
+
+from alembic.runtime.migration import MigrationContext
+from flask import current_app
+from flask_migrate import stamp, upgrade
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+BASELINE_REVISION = '20250715_031644'
+
+
+def current_revision():
+    """Revision the database is stamped at, or None"""
+    with db.engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def upgrade_database():
+    """Bring the app's database to the latest revision; needs an app context"""
+    if not current_app.config.get('DATABASE_UPGRADE_ON_START', True):
+        db.create_all()
+        return
+    database = db.engine.url.render_as_string(hide_password=True)
+    try:
+        if current_revision() is None:
+            db.create_all()
+            stamp(revision=BASELINE_REVISION)
+        upgrade()
+    except Exception as e:
+        logger.error(f"Could not migrate database {database} to the latest revision: {e}")
+        raise RuntimeError(f"Database migration failed for {database}") from e
+    except SystemExit as e:
+        # flask_migrate logs an Alembic command error and exits
+        logger.error(f"Could not migrate database {database} to the latest revision (Alembic error above)")
+        raise RuntimeError(f"Database migration failed for {database}") from e
@@ -0,0 +1,276 @@
+"""
+Full-text search over a user's dream journal.
+
+Documents and queries are normalized in Python (diacritics, tatweel and
+alef/ya/ta-marbuta/hamza variants folded, see textnorm.normalize),
+and words with the definite article or a conjunction prefix are indexed a
+second time without it, so 'بحر' finds 'البحر' and 'وبالبحر'. The index
+is stored per dialect:
+
+- SQLite: an FTS5 virtual table ranked with bm25; the user id is an
+  indexed column so a query only touches that user's documents
+- PostgreSQL: a tsvector column with a GIN index ranked with ts_rank_cd
+- anything else: a table of normalized text searched with LIKE
+
+The table is created by migration 20261017_080000 (run at startup, see
+schema.py); the backend is picked from the table found on the app's
+database, so every app instance searches the same way. Rows are indexed
+inside the same transaction that writes the dream: ORM inserts, updates
+and deletes through a session after_flush hook, and bulk inserts through
+``index_rows``.
+"""
+
+import logging
+import re
+
+from sqlalchemy import event, inspect, select, text
+
+from models import db, DreamAnalysis
+from textnorm import normalize, normalize_many, strip_article
+
+logger = logging.getLogger(__name__)
+
+_TERM = re.compile(r'\w+')
+
+
+def search_terms(query, max_terms=8):
+    """Normalized query terms, without duplicates, at most `max_terms`"""
+    terms = []
+    for term in _TERM.findall(normalize(query)):
+        if term not in terms:
+            terms.append(term)
+    return terms[:max_terms]
+
+
+def search_document(value, normalized=None):
+    """Normalized text plus prefix-stripped variants of its words"""
+    if normalized is None:
+        normalized = normalize(value)
+    extra = []
+    for word in _TERM.findall(normalized):
+        stem = strip_article(word)
+        if stem != word:
+            extra.append(stem)
+    return f"{normalized} {' '.join(extra)}" if extra else normalized
+
+
+class SQLiteFTSBackend:
+    name = 'sqlite_fts5'
+
+    def index(self, connection, docs):
+        connection.execute(text(
+            "INSERT INTO dream_search (dream_text, analysis, user_id, dream_id) "
+            "VALUES (:dream_text, :analysis, :user_token, :dream_id)"
+        ), [dict(doc, user_token=self._user_token(doc['user_id'])) for doc in docs])
+
+    def remove(self, connection, dream_ids):
+        connection.execute(text("DELETE FROM dream_search WHERE dream_id = :dream_id"),
+                           [{'dream_id': dream_id} for dream_id in dream_ids])
+
+    @staticmethod
+    def _user_token(user_id):
+        # One token per user so the user filter is an index lookup
+        return 'u' + re.sub(r'\W', '', str(user_id))
+
+    def search(self, connection, user_id, terms, limit, offset):
+        terms_query = ' AND '.join('"%s"*' % term.replace('"', '""') for term in terms)
+        match = f'user_id : {self._user_token(user_id)} AND {{dream_text analysis}} : ({terms_query})'
+        rows = connection.execute(text(
+            "SELECT dream_id, bm25(dream_search, 2.0, 1.0, 0.0) AS score FROM dream_search "
+            "WHERE dream_search MATCH :match ORDER BY score LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'limit': limit, 'offset': offset}).all()
+        total = connection.execute(
+            text("SELECT count(*) FROM dream_search WHERE dream_search MATCH :match"), {'match': match}
+        ).scalar()
+        # bm25 is lower-is-better; report higher-is-better scores
+        return [(row.dream_id, -row.score) for row in rows], total
+
+
+class PostgresBackend:
+    name = 'postgres_tsvector'
+
+    def __init__(self, ts_config='simple'):
+        self.ts_config = ts_config
+
+    def index(self, connection, docs):
+        connection.execute(text(
+            "INSERT INTO dream_search (dream_id, user_id, document) VALUES (:dream_id, :user_id, "
+            "setweight(to_tsvector(CAST(:ts_config AS regconfig), :dream_text), 'A') || "
+            "setweight(to_tsvector(CAST(:ts_config AS regconfig), :analysis), 'B')) "
+            "ON CONFLICT (dream_id) DO UPDATE SET document = EXCLUDED.document"
+        ), [dict(doc, ts_config=self.ts_config) for doc in docs])
+
+    def remove(self, connection, dream_ids):
+        connection.execute(text("DELETE FROM dream_search WHERE dream_id = :dream_id"),
+                           [{'dream_id': dream_id} for dream_id in dream_ids])
+
+    def search(self, connection, user_id, terms, limit, offset):
+        params = {
+            'user_id': str(user_id), 'ts_config': self.ts_config,
+            'query': ' & '.join(f'{term}:*' for term in terms), 'limit': limit, 'offset': offset
+        }
+        query = "to_tsquery(CAST(:ts_config AS regconfig), :query)"
+        rows = connection.execute(text(
+            f"SELECT dream_id, ts_rank_cd(document, {query}) AS score FROM dream_search "
+            f"WHERE user_id = :user_id AND document @@ {query} "
+            "ORDER BY score DESC LIMIT :limit OFFSET :offset"
+        ), params).all()
+        total = connection.execute(text(
+            f"SELECT count(*) FROM dream_search WHERE user_id = :user_id AND document @@ {query}"
+        ), params).scalar()
+        return [(row.dream_id, float(row.score)) for row in rows], total
+
+
+class LikeBackend:
+    name = 'like'
+
+    def index(self, connection, docs):
+        self.remove(connection, [doc['dream_id'] for doc in docs])
+        connection.execute(text(
+            "INSERT INTO dream_search (dream_id, user_id, content) VALUES (:dream_id, :user_id, :content)"
+        ), [dict(doc, content=f"{doc['dream_text']} {doc['analysis']}") for doc in docs])
+
+    def remove(self, connection, dream_ids):
+        connection.execute(text("DELETE FROM dream_search WHERE dream_id = :dream_id"),
+                           [{'dream_id': dream_id} for dream_id in dream_ids])
+
+    def search(self, connection, user_id, terms, limit, offset):
+        params = {'user_id': str(user_id), 'limit': limit, 'offset': offset}
+        conditions = []
+        for index, term in enumerate(terms):
+            params[f't{index}'] = f'%{term}%'
+            conditions.append(f'content LIKE :t{index}')
+        where = 'user_id = :user_id AND ' + ' AND '.join(conditions)
+        rows = connection.execute(text(
+            f"SELECT dream_id FROM dream_search WHERE {where} ORDER BY dream_id LIMIT :limit OFFSET :offset"
+        ), params).all()
+        total = connection.execute(text(f"SELECT count(*) FROM dream_search WHERE {where}"), params).scalar()
+        return [(row.dream_id, 1.0) for row in rows], total
+
+
+def detect_backend(connection, ts_config='simple'):
+    """Backend for the dream_search table on `connection`, or None if it does not exist"""
+    inspector = inspect(connection)
+    if not inspector.has_table('dream_search'):
+        return None
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'dream_search'")).scalar()
+        if 'fts5' in (sql or '').lower():
+            return SQLiteFTSBackend()
+    elif dialect == 'postgresql':
+        if any(column['name'] == 'document' for column in inspector.get_columns('dream_search')):
+            return PostgresBackend(ts_config)
+    return LikeBackend()
+
+
+class SearchIndex:
+    """Finds the backend for the app's database and keeps it in sync"""
+
+    def __init__(self):
+        self.enabled = False
+        self.max_terms = 8
+        self.ts_config = 'simple'
+        self._backends = {}  # engine -> backend
+        self._listening = False
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('SEARCH_ENABLED', True)
+        self.max_terms = config.get('SEARCH_MAX_TERMS', 8)
+        self.ts_config = config.get('SEARCH_PG_CONFIG', 'simple')
+        self._backends = {}
+        if self.enabled and not self._listening:
+            event.listen(db.session, 'after_flush', self._after_flush)
+            self._listening = True
+
+    def backend(self, connection):
+        """Backend for the connection's database; None while the table is missing
+
+        Looked up once per engine. A missing table is not remembered, so
+        the index is used as soon as the migration has created it.
+        """
+        backend = self._backends.get(connection.engine)
+        if backend is None:
+            backend = detect_backend(connection, self.ts_config)
+            if backend is None:
+                logger.warning("dream_search table is missing; run the database migrations")
+                return None
+            self._backends[connection.engine] = backend
+        return backend
+
+    @staticmethod
+    def _docs(rows):
+        """Index documents for (id, user_id, dream_text, analysis) tuples"""
+        texts = normalize_many([value for row in rows for value in (row[2], row[3])])
+        return [
+            {
+                'dream_id': row[0], 'user_id': row[1],
+                'dream_text': search_document(row[2], texts[2 * i]),
+                'analysis': search_document(row[3], texts[2 * i + 1]),
+            }
+            for i, row in enumerate(rows)
+        ]
+
+    def index_rows(self, connection, rows):
+        """Index dream rows (dicts with id, user_id, dream_text, analysis)"""
+        backend = self.backend(connection) if self.enabled and rows else None
+        if backend is None:
+            return
+        backend.index(connection, self._docs([
+            (row['id'], row['user_id'], row['dream_text'], row['analysis']) for row in rows
+        ]))
+
+    def _after_flush(self, session, flush_context):
+        if not self.enabled:
+            return
+        added = [obj for obj in session.new if isinstance(obj, DreamAnalysis)]
+        changed = [obj for obj in session.dirty if isinstance(obj, DreamAnalysis) and session.is_modified(obj)]
+        deleted = [obj.id for obj in session.deleted if isinstance(obj, DreamAnalysis)]
+        if not (added or changed or deleted):
+            return
+        connection = session.connection()
+        backend = self.backend(connection)
+        if backend is None:
+            return
+        if changed or deleted:
+            backend.remove(connection, [obj.id for obj in changed] + deleted)
+        if added or changed:
+            backend.index(connection, self._docs([
+                (obj.id, obj.user_id, obj.dream_text, obj.analysis) for obj in added + changed
+            ]))
+
+    def rebuild(self, connection, batch_size=1000):
+        """Index every stored dream through `connection` (no commit); used by the migration creating the index"""
+        backend = self.backend(connection)
+        indexed = 0
+        last_id = ''
+        while backend is not None:
+            rows = connection.execute(
+                select(DreamAnalysis.id, DreamAnalysis.user_id, DreamAnalysis.dream_text, DreamAnalysis.analysis)
+                .where(DreamAnalysis.id > last_id).order_by(DreamAnalysis.id).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            backend.index(connection, self._docs([
+                (row['id'], row['user_id'], row['dream_text'], row['analysis']) for row in rows
+            ]))
+            indexed += len(rows)
+            last_id = rows[-1]['id']
+        if indexed:
+            logger.info(f"Search index rebuilt with {indexed} dreams")
+        return indexed
+
+    def search(self, user_id, query, limit=20, offset=0):
+        """Return ([(dream_id, score)], total) ranked best first"""
+        terms = search_terms(query, self.max_terms)
+        if not terms or not self.enabled:
+            return [], 0
+        connection = db.session.connection()
+        backend = self.backend(connection)
+        if backend is None:
+            return [], 0
+        return backend.search(connection, user_id, terms, limit, offset)
+
+
+search_index = SearchIndex()
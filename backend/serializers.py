@@ -0,0 +1,87 @@
+"""
+Column-driven ``to_dict`` methods, generated once per model.
+
+A hand-written ``to_dict`` goes through an instrumented attribute
+descriptor for every field and spells out each ``isoformat()`` and None
+check. ``column_serializer`` takes the field list instead and, on first
+use, compiles a function that builds the whole dict in one literal:
+
+- loaded values are read straight from the instance ``__dict__``; an
+  expired or deferred attribute (e.g. after commit) falls back to normal
+  attribute access, which loads it;
+- Date/DateTime columns become ``isoformat()`` strings, with a None check
+  only where the column is nullable;
+- computed fields are plain callables taking the instance.
+
+The output is the same dict the hand-written methods returned.
+"""
+
+from sqlalchemy import Date, DateTime
+
+
+def column_serializer(*fields, defaults=None, doc=None):
+    """Build a ``to_dict(self)`` method from `fields`
+
+    Each field is a column name, or a ``(name, source)`` pair where source
+    is a column name (an alias) or a callable ``source(instance)``.
+    `defaults` maps a field to a literal used when its value is falsy
+    (``tags or []``). The output keys are kept as ``to_dict.fields``.
+    """
+    defaults = defaults or {}
+    compiled = {}
+
+    def to_dict(self):
+        build = compiled.get(type(self))
+        if build is None:
+            build = compiled[type(self)] = _compile(type(self), fields, defaults)
+        return build(self)
+
+    to_dict.__doc__ = doc
+    to_dict.fields = tuple(field if isinstance(field, str) else field[0] for field in fields)
+    return to_dict
+
+
+class _Attributes:
+    """Mapping view of an instance through its (loading) attribute access"""
+
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __getitem__(self, key):
+        return getattr(self.obj, key)
+
+
+def _compile(model, fields, defaults):
+    table_columns = model.__table__.columns
+    namespace = {}
+    items = []
+    for field in fields:
+        name, source = field if isinstance(field, tuple) else (field, field)
+        if callable(source):
+            namespace[f'_computed_{name}'] = source
+            items.append(f'{name!r}: _computed_{name}(obj)')
+            continue
+        column = table_columns[source]
+        value = f'd[{source!r}]'
+        if isinstance(column.type, (Date, DateTime)):
+            value = (f'(None if {value} is None else {value}.isoformat())' if column.nullable
+                     else f'{value}.isoformat()')
+        if name in defaults:
+            value = f'({value} or {defaults[name]!r})'
+        items.append(f'{name!r}: {value}')
+
+    source_code = (
+        'def build(obj, d):\n'
+        f'    return {{{", ".join(items)}}}\n'
+        'def serialize(obj):\n'
+        '    try:\n'
+        '        return build(obj, obj.__dict__)\n'
+        '    except KeyError:  # expired or deferred attribute: load through the mapper\n'
+        '        return build(obj, _Attributes(obj))\n'
+    )
+    namespace['_Attributes'] = _Attributes
+    exec(compile(source_code, f'<{model.__name__}.to_dict>', 'exec'), namespace)
+    return namespace['serialize']
+
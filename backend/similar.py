@@ -0,0 +1,354 @@
+"""
+"Similar dreams" over a user's own history.
+
+Dream text is embedded with a hashed vectorizer: function words are
+dropped, article prefixes stripped (so 'البحر' and 'بحر' match), and the
+character trigrams and stems of the remaining words are hashed with crc32
+into a fixed number of signed buckets, log-scaled and L2-normalized. No
+model or vocabulary is needed, so vectors never go stale and a new dream
+can be added on its own.
+
+Each user's vectors live in two append-only files in SIMILAR_INDEX_DIR:
+``<user>.<dims>.f32`` (a float32 matrix, one row per dream) and
+``<user>.<dims>.ids`` (36-byte dream ids). They are memory-mapped, so all
+gunicorn workers share the same page cache, and top-k is one matrix-vector
+product plus ``argpartition``.
+
+Rows are appended after the transaction that wrote the dream commits
+(session after_commit hook; ``stage`` for bulk inserts). An edited dream
+gets a new row and its older rows are ignored; deleted dreams are skipped
+once the endpoint finds them missing (``note_deleted``). A user's files
+are built from the database the first time they are queried, and rebuilt
+(``compact``) once SIMILAR_COMPACT_DEAD_ROWS of their rows are superseded
+or deleted.
+"""
+
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:  # optional: the similar-dreams endpoint is disabled without it
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows development servers run a single process
+    fcntl = None
+
+from sqlalchemy import event, inspect, select
+
+from models import db, DreamAnalysis
+from textnorm import normalize, strip_article
+
+logger = logging.getLogger(__name__)
+
+ID_BYTES = 36
+_WORD = re.compile(r'\w+')
+_PENDING_KEY = 'similar_pending'
+
+# Function words shared by almost every dream; as features they only add noise
+STOPWORDS = frozenset(normalize(
+    'في من على الى إلى عن مع ثم او أو ان أن إن انا أنا انت هو هي نحن هم كان كنت كانت '
+    'لقد قد لا لم ما هذا هذه ذلك تلك التي الذي كل بعض عند حتى بين وانا وكنت وكان '
+    'the a an and or of in on at to was were i my me it is with'
+).split())
+
+
+def features(text):
+    """Hashed-vectorizer features: trigrams (with boundaries) and stems of content words"""
+    result = []
+    for word in _WORD.findall(normalize(text)):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        word = strip_article(word)
+        result.append('w:' + word)
+        padded = f' {word} '
+        result.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def vectorize(text, dimensions):
+    """Unit-length float32 vector for `text` (all zeros if it has no words)"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    feats = features(text)
+    if not feats:
+        return vector
+    hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in feats), dtype=np.uint32, count=len(feats))
+    # The top bit picks the sign so collisions cancel out instead of piling up
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+    counts = np.bincount(hashes % dimensions, weights=signs, minlength=dimensions)
+    vector[:] = np.sign(counts) * np.log1p(np.abs(counts))
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+class _UserIndex:
+    """Memory-mapped view of one user's files at a given (inode, size)
+
+    After an append only the new ids are decoded, reusing `previous`.
+    """
+
+    __slots__ = ('key', 'size', 'matrix', 'ids', 'live')
+
+    def __init__(self, key, vectors_path, ids_path, dimensions, previous=None):
+        self.key = key
+        row_bytes = dimensions * 4
+        rows = min(os.path.getsize(vectors_path) // row_bytes, os.path.getsize(ids_path) // ID_BYTES)
+        self.size = rows
+        if previous is None or previous.key[0] != key[0] or previous.size > rows:
+            previous = None
+        start = previous.size if previous else 0
+        self.ids = list(previous.ids) if previous else []
+        # Only the last row written for a dream is current
+        self.live = dict(previous.live) if previous else {}
+        if rows:
+            self.matrix = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(rows, dimensions))
+            raw = np.memmap(ids_path, dtype=f'S{ID_BYTES}', mode='r', shape=(rows,))
+            for row in range(start, rows):
+                dream_id = raw[row].decode('ascii')
+                self.ids.append(dream_id)
+                self.live[dream_id] = row
+        else:
+            self.matrix = np.zeros((0, dimensions), dtype=np.float32)
+
+
+class SimilarIndex:
+    """Per-user hashed-vector indexes on disk, updated as dreams are written"""
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.dimensions = 512
+        self.max_open = 256
+        self.compact_dead_rows = 256
+        self._lock = threading.Lock()
+        self._open = OrderedDict()
+        self._deleted = {}  # user id -> ids of indexed dreams found missing from the database
+        self._listening = False
+        self._counts = {'appended': 0, 'built': 0, 'compacted': 0, 'queries': 0}
+
+    @property
+    def available(self):
+        return self.enabled and np is not None
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('SIMILAR_ENABLED', True)
+        self.dimensions = config.get('SIMILAR_DIMENSIONS', 512)
+        self.max_open = config.get('SIMILAR_MAX_OPEN', 256)
+        self.compact_dead_rows = config.get('SIMILAR_COMPACT_DEAD_ROWS', 256)
+        self.directory = config.get('SIMILAR_INDEX_DIR') or os.path.join(app.instance_path, 'similar')
+        if self.enabled and np is None:
+            app.logger.warning("numpy is not installed; similar dreams are disabled")
+        if not self.available:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._listening:
+            event.listen(db.session, 'after_flush', self._after_flush)
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+            self._listening = True
+
+    def _paths(self, user_id):
+        name = re.sub(r'[^\w-]', '', str(user_id))
+        base = os.path.join(self.directory, f'{name}.{self.dimensions}')
+        return base + '.f32', base + '.ids', base + '.lock'
+
+    def _locked(self, user_id):
+        """Exclusive cross-process lock on a user's files (no-op without fcntl)"""
+        return _FileLock(self._paths(user_id)[2])
+
+    # -- writes ----------------------------------------------------------
+
+    def stage(self, session, rows):
+        """Queue dream rows (dicts with id, user_id, dream_text) for after commit"""
+        if self.available and rows:
+            session.info.setdefault(_PENDING_KEY, []).extend(
+                (row['user_id'], row['id'], row['dream_text']) for row in rows
+            )
+
+    def _after_flush(self, session, flush_context):
+        dreams = [obj for obj in session.new if isinstance(obj, DreamAnalysis)]
+        dreams += [
+            obj for obj in session.dirty
+            if isinstance(obj, DreamAnalysis) and inspect(obj).attrs.dream_text.history.has_changes()
+        ]
+        if dreams:
+            session.info.setdefault(_PENDING_KEY, []).extend(
+                (obj.user_id, obj.id, obj.dream_text) for obj in dreams
+            )
+
+    def _after_commit(self, session):
+        pending = session.info.pop(_PENDING_KEY, None)
+        if not pending:
+            return
+        by_user = {}
+        for user_id, dream_id, dream_text in pending:
+            by_user.setdefault(user_id, []).append((dream_id, dream_text))
+        for user_id, dreams in by_user.items():
+            try:
+                self.append(user_id, dreams)
+            except Exception as e:
+                # The index is derived data; a rebuild or compact recovers it
+                logger.warning(f"Could not add {len(dreams)} dreams to the similar index of {user_id}: {e}")
+
+    def _after_rollback(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+    def append(self, user_id, dreams):
+        """Append committed (dream_id, dream_text) pairs to an existing user index
+
+        Users without index files are skipped: their index is built from
+        the database, including these dreams, the first time it is queried.
+        The check is made under the user's lock, so a dream committed while
+        that first build runs waits for the build's files and is appended.
+        """
+        vectors_path, ids_path, _ = self._paths(user_id)
+        with self._locked(user_id):
+            if not os.path.exists(ids_path):
+                return
+            matrix = np.stack([vectorize(text, self.dimensions) for _, text in dreams])
+            ids = b''.join(str(dream_id).encode('ascii').ljust(ID_BYTES, b'\0') for dream_id, _ in dreams)
+            # Drop a half-written row left by a crashed writer so rows stay aligned
+            rows = min(os.path.getsize(vectors_path) // (self.dimensions * 4), os.path.getsize(ids_path) // ID_BYTES)
+            os.truncate(vectors_path, rows * self.dimensions * 4)
+            os.truncate(ids_path, rows * ID_BYTES)
+            self._write(vectors_path, ids_path, matrix, ids, mode='ab')
+        with self._lock:
+            self._counts['appended'] += len(dreams)
+
+    @staticmethod
+    def _write(vectors_path, ids_path, matrix, ids, mode):
+        # Vectors first: readers only use rows present in both files
+        with open(vectors_path, mode) as f:
+            f.write(matrix.astype(np.float32, copy=False).tobytes())
+        with open(ids_path, mode) as f:
+            f.write(ids)
+
+    def build(self, user_id, batch_size=500):
+        """Write a user's index from the database; replaces existing files"""
+        vectors_path, ids_path, _ = self._paths(user_id)
+        tmp_vectors, tmp_ids = vectors_path + '.tmp', ids_path + '.tmp'
+        built = 0
+        with self._locked(user_id):
+            for path in (tmp_vectors, tmp_ids):
+                open(path, 'wb').close()
+            last_id = ''
+            while True:
+                rows = db.session.execute(
+                    select(DreamAnalysis.id, DreamAnalysis.dream_text)
+                    .where(DreamAnalysis.user_id == user_id, DreamAnalysis.id > last_id)
+                    .order_by(DreamAnalysis.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                matrix = np.stack([vectorize(row.dream_text, self.dimensions) for row in rows])
+                ids = b''.join(row.id.encode('ascii').ljust(ID_BYTES, b'\0') for row in rows)
+                self._write(tmp_vectors, tmp_ids, matrix, ids, mode='ab')
+                built += len(rows)
+                last_id = rows[-1].id
+            os.replace(tmp_vectors, vectors_path)
+            os.replace(tmp_ids, ids_path)
+        with self._lock:
+            self._open.pop(user_id, None)
+            self._deleted.pop(user_id, None)
+            self._counts['built'] += 1
+        return built
+
+    def compact(self, user_id):
+        """Rewrite a user's files without superseded rows and deleted dreams"""
+        built = self.build(user_id)
+        with self._lock:
+            self._counts['compacted'] += 1
+        return built
+
+    def note_deleted(self, user_id, dream_ids):
+        """Record indexed dreams found missing from the database; later queries skip them"""
+        if dream_ids:
+            with self._lock:
+                self._deleted.setdefault(user_id, set()).update(dream_ids)
+
+    # -- reads -----------------------------------------------------------
+
+    def _load(self, user_id):
+        vectors_path, ids_path, _ = self._paths(user_id)
+        if not os.path.exists(ids_path):
+            self.build(user_id)
+        stat = os.stat(ids_path)
+        key = (stat.st_ino, stat.st_size)  # a build replaces the file, an append grows it
+        with self._lock:
+            cached = self._open.get(user_id)
+            if cached is not None and cached.key == key:
+                self._open.move_to_end(user_id)
+                return cached
+        index = _UserIndex(key, vectors_path, ids_path, self.dimensions, previous=cached)
+        with self._lock:
+            self._open[user_id] = index
+            self._open.move_to_end(user_id)
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return index
+
+    def similar(self, user_id, dream_id, dream_text, limit=5):
+        """Return [(dream_id, similarity)] for the user's dreams most like `dream_id`"""
+        index = self._load(user_id)
+        with self._lock:
+            self._counts['queries'] += 1
+            deleted = set(self._deleted.get(user_id, ()))
+        if index.size - len(index.live) + len(deleted) >= self.compact_dead_rows:
+            self.compact(user_id)
+            index, deleted = self._load(user_id), set()
+        row = index.live.get(dream_id)
+        query = index.matrix[row] if row is not None else vectorize(dream_text, self.dimensions)
+        if not index.size or not query.any():
+            return []
+        scores = np.asarray(index.matrix @ query)
+        # Drop superseded rows, deleted dreams and the dream itself
+        candidates = [live_row for live_id, live_row in index.live.items() if live_id not in deleted]
+        mask = np.full(index.size, -np.inf, dtype=np.float32)
+        mask[candidates] = 0.0
+        if row is not None:
+            mask[row] = -np.inf
+        scores = scores + mask
+        k = min(limit, len(candidates))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        # Dreams with nothing in common score around zero or below
+        return [(index.ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def to_dict(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['open_indexes'] = len(self._open)
+        stats.update({'enabled': self.available, 'dimensions': self.dimensions})
+        return stats
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+similar_index = SimilarIndex()
@@ -0,0 +1,81 @@
+"""
+Single-flight coalescing of concurrent identical calls.
+
+When several threads ask for the same key at the same time, only the first
+(the leader) runs the function; the others wait for it and share its result
+or exception. Used to collapse mobile retries and double-taps of the same
+dream into a single LLM completion.
+"""
+
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Per-process group of in-flight calls keyed by fingerprint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._calls_total = 0
+        self._executions = 0
+        self._coalesced = 0
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() once per key among concurrent callers
+
+        Returns (result, shared) where shared is True for callers that
+        received another caller's result. Exceptions raised by the leader
+        are re-raised in every waiter.
+        """
+        with self._lock:
+            self._calls_total += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._executions += 1
+                leader = True
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError('Timed out waiting for an in-flight analysis')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'calls': self._calls_total,
+                'executions': self._executions,
+                'coalesced': self._coalesced,
+                'in_flight': len(self._calls),
+            }
+
+
+llm_singleflight = SingleFlight()
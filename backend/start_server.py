@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 import sys
 import os
-from app import create_app, db
+from app import create_app
+from schema import upgrade_database
 
 def main():
     """Main function to start the server"""
@@ -9,9 +10,9 @@ def main():
         print("📦 Starting App...")
         app = create_app()
 
-        # Create database tables if they don't exist
+        # Create missing tables and apply pending migrations
         with app.app_context():
-            db.create_all()
+            upgrade_database()
             print("✅ Database is ready.")
 
         # Get port from environment variable for cloud deployment
@@ -0,0 +1,304 @@
+"""
+Dream symbol extraction with an Aho-Corasick automaton.
+
+The symbol dictionary is an Arabic lexicon (whose meanings and advice the
+offline interpreter also uses) plus English keywords. Every keyword is
+normalized and also compiled with the Arabic prefixes (و، ف، ب، ل، ك، ال
+and their combinations), then all patterns go into one automaton. A single
+pass over the normalized dream text finds every occurrence, so extraction
+is linear in the text length however large the dictionary grows. A match
+counts only at the start of a word and when at most a short suffix follows
+it (for English only an inflection such as -s or -ing), which keeps 'ماء'
+out of 'سماء' and 'sea' out of 'search'.
+
+Stems of SHORT_STEM letters or fewer are too easily part of another word
+('قط' in 'فقط', 'car' in 'cared'): they take only the article forms of
+the prefixes and only the known inflections in SHORT_*_SUFFIXES. Stems
+that are common words of another meaning on their own ('ذهب' went,
+'دار' turned, 'مال' tilted) are left out of the lexicon.
+
+The automaton is built once per process on first use and only read
+afterwards, so all threads share it without locking.
+"""
+
+import threading
+from collections import deque, namedtuple
+
+from sqlalchemy import select, update
+
+from etag import bump as bump_data_version
+from models import db, DreamAnalysis
+from textnorm import normalize
+
+Symbol = namedtuple('Symbol', ['tag', 'label', 'keywords', 'meaning', 'advice'])
+
+# Arabic lexicon: keywords are word stems; the extractor adds the common
+# prefixes (و، ف، ب، ل، ك، ال) and tolerates short suffixes (only the
+# article and known inflections for stems of up to SHORT_STEM letters).
+SYMBOLS = [
+    Symbol('water', 'الماء', ('ماء', 'مياه', 'بحر', 'بحار', 'نهر', 'انهار', 'أنهار', 'مطر', 'أمطار', 'امطار'),
+           'يرمز الماء إلى المشاعر والحياة الداخلية؛ صفاؤه يدل على راحة نفسية، واضطرابه على مشاعر مكبوتة تبحث عن متنفس.',
+           'امنح مشاعرك مساحة للتعبير بالكتابة أو بالحديث مع شخص تثق به.'),
+    Symbol('snake', 'الثعبان', ('ثعبان', 'ثعابين', 'أفعى', 'افعى', 'أفاعي', 'افاعي'),
+           'يشير الثعبان غالباً إلى مخاوف خفية أو شخص لا تطمئن إليه، وقد يرمز أيضاً إلى تحول داخلي يتطلب المواجهة.',
+           'راجع علاقاتك القريبة بهدوء وواجه ما يقلقك بدلاً من تجنبه.'),
+    Symbol('flying', 'الطيران', ('طير', 'طيران', 'أطير', 'اطير', 'يطير', 'أحلق', 'احلق'),
+           'الطيران رمز للحرية والطموح والرغبة في تجاوز القيود اليومية.',
+           'ضع أهدافاً واقعية على مراحل واحتفل بكل خطوة تنجزها.'),
+    Symbol('falling', 'السقوط', ('سقوط', 'سقط', 'أسقط', 'اسقط', 'وقع', 'وقعت', 'هاوية'),
+           'يرتبط السقوط بالقلق من فقدان السيطرة أو الخوف من الفشل في أمر يشغلك.',
+           'حدد مصدر القلق الأكبر في حياتك الآن وقسمه إلى خطوات صغيرة يمكن التحكم بها.'),
+    Symbol('teeth', 'الأسنان', ('أسنان', 'اسنان', 'ضرس', 'أضراس', 'اضراس'),
+           'سقوط الأسنان أو تكسرها يعكس عادة القلق من التغيير أو الخوف من فقدان المكانة أو القدرة على التعبير.',
+           'اهتم بصحتك ونومك، وعبّر عن احتياجاتك بوضوح لمن حولك.'),
+    Symbol('death', 'الموت', ('موت', 'مات', 'ميت', 'ماتت', 'جنازة', 'قبر', 'قبور'),
+           'الموت في الحلم نادراً ما يعني موتاً حقيقياً؛ إنه يرمز غالباً إلى نهاية مرحلة وبداية أخرى.',
+           'تقبّل التغيير الذي تمر به وامنح نفسك وقتاً للتكيف مع البدايات الجديدة.'),
+    Symbol('house', 'البيت', ('بيت', 'منزل', 'غرفة', 'غرف'),
+           'يمثل البيت الذات والحياة الخاصة؛ حالته في الحلم تعكس إحساسك بالأمان والاستقرار.',
+           'خصص وقتاً لترتيب حياتك الخاصة ومساحتك الشخصية.'),
+    Symbol('fire', 'النار', ('نار', 'حريق', 'لهب', 'احتراق', 'تحترق'),
+           'تدل النار على مشاعر قوية كالغضب أو الشغف، وقد تشير إلى تطهير وتجدد بعد أزمة.',
+           'انتبه لمصادر التوتر والغضب في يومك وابحث عن طرق صحية لتفريغها.'),
+    Symbol('chase', 'المطاردة', ('يطارد', 'يطاردني', 'مطاردة', 'يلاحق', 'يلاحقني', 'هرب', 'أهرب', 'اهرب', 'هروب'),
+           'المطاردة تعكس رغبة في الهروب من موقف أو مسؤولية أو شعور لم تواجهه بعد.',
+           'اسأل نفسك عما تتجنبه حالياً، وابدأ بمواجهته خطوة صغيرة كل يوم.'),
+    Symbol('exam', 'الامتحان', ('امتحان', 'إمتحان', 'اختبار', 'إختبار', 'مدرسة', 'جامعة'),
+           'الامتحان في الحلم يرتبط بالشعور بالتقييم والخوف من عدم الاستعداد لتحدٍ قادم.',
+           'استعد لما ينتظرك بخطة واضحة، وذكّر نفسك بما أنجزته سابقاً.'),
+    Symbol('baby', 'الطفل', ('طفل', 'أطفال', 'اطفال', 'رضيع', 'مولود', 'ولادة', 'حامل'),
+           'يرمز الطفل أو الولادة إلى بداية جديدة أو مشروع أو جانب من ذاتك ينمو ويحتاج إلى رعاية.',
+           'اعتنِ بالأفكار والمشاريع الجديدة في حياتك وامنحها الوقت لتنضج.'),
+    Symbol('car', 'السيارة', ('سيارة', 'سيارات', 'قيادة', 'أقود', 'اقود', 'حادث'),
+           'تمثل السيارة مسار حياتك ومدى تحكمك فيه؛ فقدان السيطرة عليها يشير إلى ضغوط تشعر أنها تقودك.',
+           'راجع أولوياتك واستعد زمام المبادرة في القرارات التي تخصك.'),
+    Symbol('money', 'المال', ('أموال', 'اموال', 'نقود', 'فلوس', 'الذهب', 'كنز'),
+           'المال والذهب يرمزان إلى القيمة الذاتية والفرص، وقد يعكسان انشغالاً بالأمان المادي.',
+           'وازن بين طموحك المادي وتقديرك لذاتك بعيداً عما تملك.'),
+    Symbol('wedding', 'الزواج', ('زواج', 'زفاف', 'عرس', 'عريس', 'عروس', 'خطوبة'),
+           'الزواج في الحلم يدل على الارتباط والالتزام أو اندماج جوانب مختلفة من شخصيتك.',
+           'فكر في الالتزامات التي تقبل عليها وتأكد أنها تنسجم مع ما تريده فعلاً.'),
+    Symbol('lost', 'الضياع', ('ضياع', 'ضعت', 'تائه', 'تهت', 'ضائع', 'أبحث', 'ابحث'),
+           'الضياع والبحث يعكسان حيرة في اتخاذ قرار أو شعوراً بعدم وضوح الاتجاه.',
+           'دوّن الخيارات المتاحة أمامك وما يهمك في كل منها قبل أن تقرر.'),
+    Symbol('light', 'النور', ('نور', 'ضوء', 'شمس', 'قمر', 'نجوم', 'نجم'),
+           'النور والشمس رموز للأمل والوضوح والهداية بعد فترة من الغموض.',
+           'تمسك بمصادر الأمل في حياتك واستثمر هذه الطاقة الإيجابية.'),
+    Symbol('dark', 'الظلام', ('ظلام', 'ظلمة', 'عتمة', 'ليل'),
+           'الظلام يشير إلى المجهول أو إلى جوانب من النفس لم تتعرف عليها بعد.',
+           'لا تخشَ المجهول؛ اقترب منه بفضول وامنح نفسك الوقت لفهمه.'),
+    Symbol('animal', 'الحيوانات', ('أسد', 'اسد', 'كلب', 'كلاب', 'قطة', 'قطط', 'ذئب', 'حصان', 'خيل'),
+           'الحيوانات تعبر عن غرائز وطاقات داخلية؛ ودّيتها أو عدوانيتها تعكس علاقتك بهذه الجوانب.',
+           'راقب ردود أفعالك التلقائية هذه الأيام وتعلّم منها.'),
+    Symbol('family', 'العائلة', ('أمي', 'امي', 'أبي', 'ابي', 'والدي', 'والدتي', 'أخي', 'اخي', 'أختي', 'اختي', 'جدتي', 'جدي'),
+           'ظهور أفراد العائلة يعكس الروابط العاطفية والحاجة إلى الدعم أو قضايا لم تُحسم معهم.',
+           'تواصل مع أحد أفراد عائلتك وشاركه ما تشعر به.'),
+    Symbol('fear', 'الخوف', ('خوف', 'خائف', 'خائفة', 'خفت', 'رعب', 'فزع', 'قلق'),
+           'الشعور بالخوف داخل الحلم صدى لقلق حقيقي في يقظتك يستحق الانتباه.',
+           'جرّب تمارين التنفس العميق قبل النوم وخفف من المنبهات مساءً.'),
+    Symbol('joy', 'الفرح', ('فرح', 'سعادة', 'سعيد', 'سعيدة', 'ضحك', 'أضحك', 'اضحك'),
+           'الفرح في الحلم يدل على رضا داخلي وتوازن نفسي أو أمنية تقترب من التحقق.',
+           'استمتع بهذه المرحلة وشارك طاقتك الإيجابية مع من تحب.'),
+    Symbol('crying', 'البكاء', ('بكاء', 'بكيت', 'أبكي', 'ابكي', 'دموع', 'حزن', 'حزين', 'حزينة'),
+           'البكاء والحزن في الحلم قد يكونان تفريغاً صحياً لمشاعر متراكمة.',
+           'اسمح لنفسك بالحزن دون حكم، واطلب الدعم إن شعرت بثقل مستمر.'),
+]
+
+ENGLISH_KEYWORDS = {
+    'water': ('water', 'sea', 'ocean', 'river', 'rain', 'lake'),
+    'snake': ('snake', 'serpent', 'viper', 'cobra'),
+    'flying': ('flying', 'fly', 'flew', 'soar'),
+    'falling': ('falling', 'fall', 'fell', 'cliff'),
+    'teeth': ('teeth', 'tooth'),
+    'death': ('death', 'dead', 'die', 'died', 'funeral', 'grave'),
+    'house': ('house', 'home', 'room'),
+    'fire': ('fire', 'flame', 'burning', 'burn'),
+    'chase': ('chase', 'chased', 'chasing', 'escape', 'running away'),
+    'exam': ('exam', 'test', 'school', 'university'),
+    'baby': ('baby', 'child', 'pregnant', 'birth'),
+    'car': ('car', 'driving', 'drive', 'accident'),
+    'money': ('money', 'gold', 'treasure', 'cash'),
+    'wedding': ('wedding', 'marriage', 'bride', 'groom'),
+    'lost': ('lost', 'searching'),
+    'light': ('light', 'sun', 'moon', 'star'),
+    'dark': ('dark', 'darkness', 'night'),
+    'animal': ('lion', 'dog', 'cat', 'wolf', 'horse'),
+    'family': ('mother', 'father', 'brother', 'sister', 'grandmother', 'grandfather'),
+    'fear': ('fear', 'afraid', 'scared', 'terrified', 'anxious'),
+    'joy': ('joy', 'happy', 'happiness', 'laughing', 'laugh'),
+    'crying': ('crying', 'cry', 'cried', 'tears', 'sad'),
+}
+
+ARABIC_PREFIXES = ('', 'و', 'ف', 'ب', 'ل', 'ك', 'ال', 'وال', 'فال', 'بال', 'كال', 'لل', 'ول', 'وب', 'فب')
+MAX_SUFFIX = 3
+ENGLISH_SUFFIXES = frozenset(('', 's', 'es', 'ed', 'd', 'ing'))
+
+# Short stems: article forms only, and pronoun, plural, feminine (ة is
+# normalized to ه) and tanween-alif endings instead of any short suffix
+SHORT_STEM = 3
+SHORT_STEM_PREFIXES = ('', 'ال', 'وال', 'فال', 'بال', 'كال', 'لل')
+SHORT_ARABIC_SUFFIXES = frozenset(('', 'ا', 'ي', 'ه', 'ك', 'ت', 'ها', 'نا', 'هم', 'كم', 'ات', 'ان', 'ين', 'ون'))
+SHORT_ENGLISH_SUFFIXES = frozenset(('', 's'))
+
+
+class AhoCorasick:
+    """Multi-pattern matcher; patterns map to a value reported on each match"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern, value in patterns:
+            self._add(pattern, value)
+        self._build()
+
+    def _add(self, pattern, value):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] = self._out[state] + ((len(pattern), value),)
+
+    def _build(self):
+        # Breadth-first failure links; outputs are merged along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    @property
+    def states(self):
+        return len(self._goto)
+
+    def iter(self, text):
+        """Yield (start, end, value) for every pattern occurrence"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for length, value in out[state]:
+                    yield index + 1 - length, index + 1, value
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class SymbolExtractor:
+    """Extract symbol tags from dream text in one linear pass"""
+
+    def __init__(self, symbols=SYMBOLS, english=ENGLISH_KEYWORDS):
+        # Each pattern maps to (tag, allowed suffixes); None allows any up to MAX_SUFFIX
+        patterns = {}
+        for symbol in symbols:
+            for keyword in symbol.keywords:
+                stem = normalize(keyword)
+                short = len(stem) <= SHORT_STEM
+                suffixes = SHORT_ARABIC_SUFFIXES if short else None
+                for prefix in SHORT_STEM_PREFIXES if short else ARABIC_PREFIXES:
+                    patterns.setdefault(prefix + stem, (symbol.tag, suffixes))
+        for tag, keywords in english.items():
+            for keyword in keywords:
+                stem = normalize(keyword)
+                suffixes = SHORT_ENGLISH_SUFFIXES if len(stem) <= SHORT_STEM else ENGLISH_SUFFIXES
+                patterns.setdefault(stem, (tag, suffixes))
+        self.tags = [symbol.tag for symbol in symbols]
+        self.pattern_count = len(patterns)
+        self._automaton = AhoCorasick(patterns.items())
+
+    def extract(self, text):
+        """Return symbol tags in order of first appearance"""
+        text = normalize(text)
+        length = len(text)
+        found = []
+        seen = set()
+        for start, end, (tag, suffixes) in self._automaton.iter(text):
+            if tag in seen or (start and _is_word_char(text[start - 1])):
+                continue
+            # Allow a short suffix (plural, pronoun) but not a longer word
+            word_end = end
+            while word_end < length and word_end - end <= MAX_SUFFIX and _is_word_char(text[word_end]):
+                word_end += 1
+            if word_end - end > MAX_SUFFIX or (suffixes is not None and text[end:word_end] not in suffixes):
+                continue
+            seen.add(tag)
+            found.append(tag)
+        return found
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor():
+    """The process-wide extractor, built on first use"""
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = SymbolExtractor()
+    return _extractor
+
+
+def extract_tags(text):
+    return get_extractor().extract(text)
+
+
+def merge_tags(client_tags, dream_text):
+    """Client-sent tags first, then extracted symbols not already present"""
+    tags = [tag for tag in client_tags if isinstance(tag, str)] if isinstance(client_tags, list) else []
+    for tag in extract_tags(dream_text):
+        if tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def backfill_tags(batch_size=500, log=print):
+    """Add extracted symbols to the tags of existing dreams; returns rows updated
+
+    Walks dream_analyses in primary-key order one batch at a time and
+    commits each batch with a single executemany UPDATE.
+    """
+    updated = scanned = 0
+    last_id = ''
+    while True:
+        rows = db.session.execute(
+            select(DreamAnalysis.id, DreamAnalysis.user_id, DreamAnalysis.dream_text, DreamAnalysis.tags)
+            .where(DreamAnalysis.id > last_id)
+            .order_by(DreamAnalysis.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        changes = []
+        user_ids = set()
+        for row in rows:
+            tags = merge_tags(row.tags, row.dream_text)
+            if tags != (row.tags or []):
+                changes.append({'id': row.id, 'tags': tags})
+                user_ids.add(row.user_id)
+        if changes:
+            db.session.execute(update(DreamAnalysis), changes)
+            bump_data_version(db.session.connection(), user_ids)
+        db.session.commit()
+        scanned += len(rows)
+        updated += len(changes)
+        last_id = rows[-1].id
+        log(f"scanned={scanned} updated={updated}")
+    return updated
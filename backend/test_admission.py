@@ -0,0 +1,111 @@
+"""Admission queue: tier ordering and capacity bounded by the adaptive LLM limit"""
+
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejectedError
+from resilience import AdaptiveConcurrencyLimiter
+
+
+def controller(capacity=8, limit=None, floors=None, queue_timeout=0.05):
+    admission = AdmissionController(limit=limit)
+    admission.enabled = True
+    admission.capacity = capacity
+    admission.floors = floors or {'subscriber': 0, 'credit': 0, 'free': 0}
+    admission.queue_timeout = queue_timeout
+    return admission
+
+
+def test_capacity_follows_the_llm_limit_after_failures():
+    limiter = AdaptiveConcurrencyLimiter(initial=8)
+    admission = controller(limit=lambda: limiter.limit)
+    assert admission.effective_capacity == 8
+
+    for _ in range(5):
+        assert limiter.try_acquire()
+        limiter.release(latency=0.1, ok=False)
+    assert limiter.limit == 1
+    assert admission.effective_capacity == 1
+
+    admission.acquire('subscriber')
+    with pytest.raises(AdmissionRejectedError):
+        admission.acquire('subscriber')  # waits in the queue, not shed by the guard
+    assert admission.to_dict()['tiers']['subscriber']['timed_out'] == 1
+    admission.release('subscriber')
+
+
+def test_raised_limit_admits_waiters_on_next_dispatch():
+    limit = [1]
+    admission = controller(limit=lambda: limit[0], queue_timeout=5)
+    admission.acquire('credit')
+    admitted = threading.Event()
+
+    def wait():
+        admission.acquire('credit')
+        admitted.set()
+    thread = threading.Thread(target=wait)
+    thread.start()
+    assert not admitted.wait(0.05)
+
+    limit[0] = 3
+    admission.acquire('free')  # its dispatch sees the new limit and admits the waiter too
+    assert admitted.wait(1)
+    thread.join()
+    assert sum(tier['in_flight'] for tier in admission.to_dict()['tiers'].values()) == 3
+
+
+def test_static_capacity_still_caps_a_higher_limit():
+    admission = controller(capacity=2, limit=lambda: 64)
+    admission.acquire('free')
+    admission.acquire('free')
+    with pytest.raises(AdmissionRejectedError):
+        admission.acquire('free')
+    assert admission.to_dict()['effective_capacity'] == 2
+
+
+def test_smaller_tag_is_admitted_first():
+    admission = controller(capacity=1, queue_timeout=5)
+    admission.acquire('free')
+    order = []
+
+    def wait(tier):
+        admission.acquire(tier)
+        order.append(tier)
+        admission.release(tier)
+    threads = []
+    for tier in ('free', 'subscriber'):
+        threads.append(threading.Thread(target=wait, args=(tier,)))
+        threads[-1].start()
+        while not admission.to_dict()['tiers'][tier]['waiting']:
+            pass  # queue the free waiter first
+    admission.release('free')
+    for thread in threads:
+        thread.join()
+    assert order == ['subscriber', 'free']
+
+
+DEFAULT_FLOORS = {'subscriber': 2, 'credit': 1, 'free': 0}
+
+
+def test_floors_shrink_with_a_low_limit():
+    admission = controller(limit=lambda: 2, floors=dict(DEFAULT_FLOORS))
+    assert admission.effective_floors(2) == {'subscriber': 1, 'credit': 0, 'free': 0}
+
+    admission.acquire('free')  # not kept out by the unused subscriber and credit floors
+    with pytest.raises(AdmissionRejectedError):
+        admission.acquire('free')  # the last slot stays reserved for a subscriber
+    admission.acquire('subscriber')
+    assert admission.to_dict()['tiers']['subscriber']['effective_floor'] == 1
+
+
+def test_idle_controller_admits_any_tier():
+    limit = [1]
+    admission = controller(limit=lambda: limit[0], floors=dict(DEFAULT_FLOORS))
+    for _ in range(3):
+        admission.acquire('free')
+        admission.release('free')  # completed calls are what let the limit rise again
+    assert admission.to_dict()['tiers']['free']['admitted'] == 3
+
+    limit[0] = 8
+    assert admission.effective_floors(8) == DEFAULT_FLOORS
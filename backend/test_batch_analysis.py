@@ -0,0 +1,51 @@
+"""Batch analysis: invalid items are reported one by one and never charged"""
+
+
+def test_batch_reports_invalid_items_without_failing(client, make_user, credits_of):
+    user_id, headers = make_user(credits=5)
+    dreams = [
+        {'dreamText': 'رأيت بحرا واسعا وسفينة بيضاء'},
+        {'dreamText': 123},
+        {'dreamText': ''},
+        'not an object',
+        {'context': 'no text'},
+        {'dreamText': 'رأيت أمي في بيت قديم'},
+    ]
+
+    response = client.post('/api/dreams/analyze/batch', json={'dreams': dreams}, headers=headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    results = body['results']
+    assert [r['index'] for r in results] == list(range(len(dreams)))
+    assert [r['success'] for r in results] == [True, False, False, False, False, True]
+    assert results[1]['message'] == 'Dream text must be a string'
+    assert results[2]['message'] == 'Dream text cannot be empty'
+    assert results[3]['message'] == 'Dream text is required'
+    assert results[4]['message'] == 'Dream text is required'
+    assert body['succeeded'] == 2 and body['failed'] == 4
+    assert body['credits_charged'] == 2
+    assert credits_of(user_id) == 3
+
+
+def test_batch_of_only_invalid_items_charges_nothing(client, make_user, credits_of):
+    user_id, headers = make_user(credits=1)
+
+    response = client.post('/api/dreams/analyze/batch', json={'dreams': [{'dreamText': 1}, {'dreamText': [2]}]},
+                           headers=headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] is False and body['failed'] == 2
+    assert body['credits_charged'] == 0
+    assert credits_of(user_id) == 1
+
+
+def test_analyze_rejects_non_string_dream_text(client, make_user, credits_of):
+    user_id, headers = make_user(credits=1)
+
+    for url in ('/api/dreams/analyze', '/api/dreams/analyze/stream'):
+        response = client.post(url, json={'dreamText': 123}, headers=headers)
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'Dream text must be a string'
+    assert credits_of(user_id) == 1
@@ -0,0 +1,64 @@
+"""Response compression: Accept-Encoding negotiation, small bodies and streams"""
+
+import gzip
+import json
+
+import pytest
+
+from models import db, DreamAnalysis
+
+
+@pytest.fixture
+def journal(app, make_user):
+    """Headers of a user whose dream history is well over COMPRESSION_MIN_SIZE"""
+    user_id, headers = make_user()
+    with app.app_context():
+        db.session.add_all(
+            DreamAnalysis(user_id=user_id, dream_text=f'رأيت البحر والأمواج عالية {n}', analysis='تفسير ' * 20,
+                          advice='نصيحة')
+            for n in range(20)
+        )
+        db.session.commit()
+    return headers
+
+
+def get_dreams(client, headers, encoding):
+    return client.get('/api/dreams', headers=dict(headers, **{'Accept-Encoding': encoding}))
+
+
+def test_gzip(client, journal):
+    response = get_dreams(client, journal, 'gzip')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['ETag'].endswith('-gzip"')
+    body = json.loads(gzip.decompress(response.get_data()))
+    assert len(body['dreams']) == 20
+
+
+def test_brotli_preferred_on_a_tie(client, journal):
+    brotli = pytest.importorskip('brotli')
+    response = get_dreams(client, journal, 'gzip, br')
+    assert response.headers['Content-Encoding'] == 'br'
+    assert len(json.loads(brotli.decompress(response.get_data()))['dreams']) == 20
+
+    assert get_dreams(client, journal, 'gzip, br;q=0.5').headers['Content-Encoding'] == 'gzip'
+
+
+def test_identity_and_small_bodies_are_sent_as_is(client, journal, make_user):
+    response = get_dreams(client, journal, 'identity')
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(response.get_json()['dreams']) == 20
+
+    _, empty = make_user()
+    response = get_dreams(client, empty, 'gzip')
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['dreams'] == []
+
+
+def test_streamed_export_is_compressed(client, journal):
+    response = client.get('/api/dreams/export', headers=dict(journal, **{'Accept-Encoding': 'gzip'}))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+    assert len(lines) == 20
@@ -0,0 +1,75 @@
+"""Credit reservation: conditional take, refunds, and the analyze route around them"""
+
+import sys
+
+from credits import CreditReservation, reserve_credits, release_credits
+
+
+def test_reserve_takes_credits_only_when_the_balance_allows(app, make_user, credits_of):
+    user_id, _ = make_user(credits=2)
+
+    with app.app_context():
+        assert reserve_credits(user_id, 3) is False
+    assert credits_of(user_id) == 2
+
+    with app.app_context():
+        assert reserve_credits(user_id, 2) is True
+        assert reserve_credits(user_id, 1) is False
+    assert credits_of(user_id) == 0
+
+
+def test_release_gives_credits_back(app, make_user, credits_of):
+    user_id, _ = make_user(credits=1)
+
+    with app.app_context():
+        release_credits(user_id, 2)
+        release_credits(user_id, 0)
+    assert credits_of(user_id) == 3
+
+
+def test_reservation_partial_release_then_confirm(app, make_user, credits_of):
+    user_id, _ = make_user(credits=5)
+
+    with app.app_context():
+        reservation = CreditReservation.reserve(user_id, 3)
+        assert reservation.charged and credits_of(user_id) == 2
+        reservation.release(1)
+        assert reservation.amount == 2 and not reservation.settled
+        reservation.confirm()
+        reservation.release()  # settled: keeps the confirmed credits
+    assert credits_of(user_id) == 3
+
+
+def test_reservation_is_none_when_balance_is_too_low(app, make_user, credits_of):
+    user_id, _ = make_user(credits=0)
+
+    with app.app_context():
+        assert CreditReservation.reserve(user_id, 1) is None
+        assert not CreditReservation.none(user_id).charged
+    assert credits_of(user_id) == 0
+
+
+def test_analyze_charges_one_credit_then_returns_402(client, make_user, credits_of):
+    user_id, headers = make_user(credits=1)
+
+    response = client.post('/api/dreams/analyze', json={'dreamText': 'رأيت نهرا صافيا'}, headers=headers)
+    assert response.status_code == 200
+    assert credits_of(user_id) == 0
+
+    response = client.post('/api/dreams/analyze', json={'dreamText': 'رأيت نهرا صافيا مرة أخرى'}, headers=headers)
+    assert response.status_code == 402
+    assert response.get_json()['requires_subscription'] is True
+    assert credits_of(user_id) == 0
+
+
+def test_analyze_refunds_the_credit_when_analysis_fails(client, make_user, credits_of, monkeypatch):
+    user_id, headers = make_user(credits=1)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('backend exploded')
+    monkeypatch.setattr(sys.modules['app'], 'run_analysis', fail)
+
+    response = client.post('/api/dreams/analyze', json={'dreamText': 'رأيت قمرا'}, headers=headers)
+
+    assert response.status_code == 500
+    assert credits_of(user_id) == 1
@@ -34,9 +34,9 @@ print(f".env file exists: {os.path.exists('.env')}")
 try:
     if os.path.exists('.env'):
         with open('.env', 'r') as f:
-            content = f.read()
-            print(f"\n.env file content (first line): {content.split('\\n')[0]}")
-            print(f"Total lines in .env: {len(content.split('\\n'))}")
+            lines = f.read().split('\n')
+            print(f"\n.env file content (first line): {lines[0]}")
+            print(f"Total lines in .env: {len(lines)}")
     else:
         print("\n.env file does not exist in current directory")
 except Exception as e:
@@ -0,0 +1,59 @@
+"""Conditional GET: 304 on a matching ETag, a new ETag after every write"""
+
+import gzip
+
+from models import db, DreamAnalysis
+
+
+def add_dream(app, user_id, text='رأيت البحر'):
+    with app.app_context():
+        db.session.add(DreamAnalysis(user_id=user_id, dream_text=text, analysis='تفسير', advice='نصيحة'))
+        db.session.commit()
+
+
+def test_matching_etag_gets_304(client, make_user):
+    _, headers = make_user()
+    response = client.get('/api/dreams', headers=headers)
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    response = client.get('/api/dreams', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.get_data() == b''
+
+
+def test_etag_changes_after_a_write(app, client, make_user):
+    user_id, headers = make_user()
+    etag = client.get('/api/dreams', headers=headers).headers['ETag']
+
+    add_dream(app, user_id)
+    response = client.get('/api/dreams', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.get_json()['dreams']) == 1
+
+
+def test_etag_depends_on_the_query_and_the_user(client, make_user):
+    _, headers = make_user()
+    _, other = make_user()
+    etag = client.get('/api/dreams', headers=headers).headers['ETag']
+
+    assert client.get('/api/dreams?per_page=5', headers=dict(headers, **{'If-None-Match': etag})).status_code == 200
+    assert client.get('/api/dreams', headers=dict(other, **{'If-None-Match': etag})).status_code == 200
+
+
+def test_compressed_etag_revalidates(app, client, make_user):
+    user_id, headers = make_user()
+    for n in range(20):
+        add_dream(app, user_id, f'رأيت البحر والأمواج عالية {n} ' * 3)
+    headers = dict(headers, **{'Accept-Encoding': 'gzip'})
+    response = client.get('/api/dreams', headers=headers)
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+    assert len(gzip.decompress(response.get_data())) > 1024
+
+    response = client.get('/api/dreams', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
@@ -0,0 +1,48 @@
+"""Event log counters: an event is either emitted or dropped, never both"""
+
+import io
+import threading
+
+from eventlog import EventLog
+
+
+class BlockingStream(io.StringIO):
+    """Stream whose writes wait until released, so the queue fills up"""
+
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+
+    def write(self, text):
+        self.released.wait(5)
+        return super().write(text)
+
+
+def test_full_queue_counts_drops_instead_of_emits():
+    log = EventLog()
+    log.queue_size = 2
+    log.stream = BlockingStream()
+    try:
+        for n in range(10):
+            log.emit('test', n=n)
+        counts = log.to_dict()
+        assert counts['dropped'] > 0
+        assert counts['emitted'] + counts['dropped'] == 10
+        assert counts['emitted'] <= log.queue_size + 1  # the listener may hold one record
+    finally:
+        log.stream.released.set()
+        log.close()
+    assert log.stream.getvalue().count('\n') == log.to_dict()['emitted']
+
+
+def test_sampled_out_events_are_not_queued():
+    log = EventLog()
+    log.rates = {'noisy': 0.0}
+    log.stream = io.StringIO()
+    try:
+        assert log.emit('noisy') is False
+        assert log.emit('kept') is True
+    finally:
+        log.close()
+    counts = log.to_dict()
+    assert (counts['sampled_out'], counts['emitted'], counts['dropped']) == (1, 1, 0)
@@ -0,0 +1,35 @@
+"""Offline interpreter: symbol sections only for symbols the dream really mentions"""
+
+import pytest
+
+from interpreter import GENERIC_ADVICE, GENERIC_ANALYSIS, PREAMBLE, RuleBasedInterpreter
+
+
+@pytest.fixture
+def interpreter():
+    return RuleBasedInterpreter()
+
+
+@pytest.mark.parametrize('text', [
+    'ذهبت إلى العمل فقط ثم عدت',
+    'جلست مع صديقي كمال نتحدث عن حلقة الأمس',
+    'ركبت القطار وأكلت قطعة خبز ودارت الأيام',
+    'I cared about my work',
+])
+def test_neutral_dream_gets_only_the_generic_sections(interpreter, text):
+    assert interpreter.interpret(text) == (GENERIC_ANALYSIS, GENERIC_ADVICE, [])
+
+
+def test_symbols_get_their_sections(interpreter):
+    analysis, advice, tags = interpreter.interpret('رأيت ثعبانا في البيت ثم هربت خائفا')
+
+    assert tags == ['snake', 'house', 'chase', 'fear']
+    lines = analysis.split('\n')
+    assert lines[0] == PREAMBLE
+    assert [line.split(':')[0] for line in lines[1:]] == ['- الثعبان', '- البيت', '- المطاردة', '- الخوف']
+    assert GENERIC_ANALYSIS not in analysis and advice != GENERIC_ADVICE
+
+
+def test_sections_are_capped(interpreter):
+    _, _, tags = interpreter.interpret('بحر وثعبان وطيران وسقوط وأسنان وموت')
+    assert len(tags) == interpreter.max_symbols
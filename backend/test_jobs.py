@@ -0,0 +1,166 @@
+"""Analysis jobs: claiming, retries, max attempts and the credit held by each job"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from analysis import AnalysisResult
+from credits import reserve_credits
+from jobs import claim_next_job, enqueue_job, process_job, requeue_stale_jobs
+from models import db, AnalysisJob, DreamAnalysis
+from resilience import LLMUnavailableError
+
+MAX_ATTEMPTS = 3
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(app):
+    """Jobs left by other tests would be claimed first"""
+    with app.app_context():
+        AnalysisJob.query.delete()
+        db.session.commit()
+
+
+@pytest.fixture
+def charged_job(app, make_user):
+    """Queue a job the way the async route does: one credit reserved with it"""
+    def make(payload, credits=5):
+        user_id, _ = make_user(credits=credits)
+        with app.app_context():
+            assert reserve_credits(user_id, 1, commit=False)
+            job = enqueue_job(user_id, payload, credit_charged=True)
+            db.session.commit()
+            return user_id, job.id
+    return make
+
+
+def run_attempts(app, count):
+    with app.app_context():
+        for _ in range(count):
+            job = claim_next_job()
+            assert job is not None
+            process_job(job, MAX_ATTEMPTS)
+
+
+def failing_backend(monkeypatch, error):
+    """Make every analysis raise `error`; returns the list of calls"""
+    calls = []
+
+    def run_analysis(*args):
+        calls.append(args)
+        raise error
+    monkeypatch.setattr(jobs, 'run_analysis', run_analysis)
+    return calls
+
+
+def job_state(app, job_id):
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        return job.status, job.attempts, job.credit_charged
+
+
+def test_unbilled_result_whose_save_fails_is_refunded_once(app, charged_job, credits_of, monkeypatch):
+    fallback = AnalysisResult('تفسير', 'نصيحة', 0, fallback=True)  # not billable by default
+    monkeypatch.setattr(jobs, 'run_analysis', lambda *args: fallback)
+    user_id, job_id = charged_job({'dreamText': 'حلم', 'dream_id': 'deleted-dream'})
+    assert credits_of(user_id) == 4
+
+    run_attempts(app, 1)
+    assert job_state(app, job_id) == ('queued', 1, True)
+    assert credits_of(user_id) == 4  # apply_analysis raised LookupError: no refund yet
+
+    run_attempts(app, MAX_ATTEMPTS - 1)
+    assert job_state(app, job_id) == ('failed', MAX_ATTEMPTS, False)
+    assert credits_of(user_id) == 5
+
+
+def test_unbilled_result_is_refunded_with_the_stored_analysis(app, charged_job, credits_of, monkeypatch):
+    fallback = AnalysisResult('تفسير', 'نصيحة', 0, fallback=True)
+    monkeypatch.setattr(jobs, 'run_analysis', lambda *args: fallback)
+    user_id, job_id = charged_job({'dreamText': 'حلم'})
+
+    run_attempts(app, 1)
+    assert job_state(app, job_id) == ('succeeded', 1, False)
+    assert credits_of(user_id) == 5
+
+
+def test_claim_takes_each_queued_job_once(app, charged_job):
+    _, first = charged_job({'dreamText': 'حلم أول'})
+    _, second = charged_job({'dreamText': 'حلم ثان'})
+
+    with app.app_context():
+        claimed = [claim_next_job(), claim_next_job()]
+        assert [job.id for job in claimed] == [first, second]  # oldest first
+        assert [(job.status, job.attempts) for job in claimed] == [('running', 1), ('running', 1)]
+        assert claimed[0].started_at is not None
+        assert claim_next_job() is None
+
+
+def test_successful_job_stores_the_dream_and_keeps_the_credit(app, charged_job, credits_of):
+    user_id, job_id = charged_job({'dreamText': 'رأيت البحر', 'tags': ['رحلة']})
+
+    run_attempts(app, 1)
+    assert job_state(app, job_id) == ('succeeded', 1, True)
+    assert credits_of(user_id) == 4
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        dream = db.session.get(DreamAnalysis, job.dream_id)
+        assert (dream.user_id, dream.dream_text, dream.tags) == (user_id, 'رأيت البحر', ['رحلة', 'water'])
+        assert job.error is None and job.finished_at is not None
+
+
+def test_failing_backend_is_retried_then_the_credit_released(app, charged_job, credits_of, monkeypatch):
+    calls = failing_backend(monkeypatch, RuntimeError('backend exploded'))
+    user_id, job_id = charged_job({'dreamText': 'حلم'})
+
+    for attempt in range(1, MAX_ATTEMPTS):
+        run_attempts(app, 1)
+        assert job_state(app, job_id) == ('queued', attempt, True)
+        assert credits_of(user_id) == 4
+
+    run_attempts(app, 1)
+    assert job_state(app, job_id) == ('failed', MAX_ATTEMPTS, False)
+    assert credits_of(user_id) == 5
+    assert len(calls) == MAX_ATTEMPTS
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        assert job.error == 'backend exploded' and job.finished_at is not None
+        assert claim_next_job() is None
+
+
+def test_shed_job_is_requeued_without_using_an_attempt(app, charged_job, credits_of, monkeypatch):
+    failing_backend(monkeypatch, LLMUnavailableError('circuit open', retry_after=2.5))
+    user_id, job_id = charged_job({'dreamText': 'حلم'})
+
+    with app.app_context():
+        assert process_job(claim_next_job(), MAX_ATTEMPTS) == 3
+    assert job_state(app, job_id) == ('queued', 0, True)
+    assert credits_of(user_id) == 4
+
+
+def test_subscriber_job_fails_without_a_refund(app, make_user, credits_of, monkeypatch):
+    failing_backend(monkeypatch, RuntimeError('backend exploded'))
+    user_id, _ = make_user(credits=2)
+    with app.app_context():
+        job = enqueue_job(user_id, {'dreamText': 'حلم'}, credit_charged=False)
+        db.session.commit()
+        job_id = job.id
+
+    with app.app_context():
+        process_job(claim_next_job(), max_attempts=1)
+    assert job_state(app, job_id) == ('failed', 1, False)
+    assert credits_of(user_id) == 2
+
+
+def test_stale_running_jobs_are_requeued(app, charged_job):
+    _, stale = charged_job({'dreamText': 'حلم قديم'})
+    _, fresh = charged_job({'dreamText': 'حلم جديد'})
+
+    with app.app_context():
+        claim_next_job(), claim_next_job()
+        db.session.get(AnalysisJob, stale).started_at = datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+        assert requeue_stale_jobs(stale_after_seconds=600) == 1
+    assert job_state(app, stale)[0] == 'queued'
+    assert job_state(app, fresh)[0] == 'running'
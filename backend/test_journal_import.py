@@ -0,0 +1,100 @@
+"""Journal import: NDJSON and JSON array bodies, per-row errors, queued analyses"""
+
+import io
+import json
+
+import pytest
+
+from jobs import job_workers
+from journal_import import ImportFormatError, iter_json_array, validate_row
+
+
+def post_import(client, headers, body, content_type, **params):
+    return client.post('/api/dreams/import', data=body, content_type=content_type,
+                       query_string=params, headers=headers)
+
+
+def test_ndjson_import_reports_bad_rows_by_index_and_line(client, make_user):
+    _, headers = make_user()
+    body = '\n'.join([
+        json.dumps({'dream_text': 'رأيت البحر', 'created_at': '2026-01-01T08:00:00Z'}),
+        '',
+        '{not json',
+        json.dumps({'dreamText': 'حلمت بقطة', 'tags': ['رحلة']}),
+        json.dumps({'analysis': 'no text'}),
+        json.dumps({'dream_text': 'text', 'is_private': 'yes'}),
+    ])
+
+    response = post_import(client, headers, body, 'application/x-ndjson')
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result['imported'], result['failed']) == (2, 3)
+    assert [(error['index'], error['line']) for error in result['errors']] == [(1, 3), (3, 5), (4, 6)]
+    assert result['errors'][0]['message'].startswith('Invalid JSON')
+    assert result['errors'][1]['message'] == 'dream_text is required'
+    assert result['errors_truncated'] is False
+
+    dreams = client.get('/api/dreams', headers=headers).get_json()['dreams']
+    assert sorted(dream['dream_text'] for dream in dreams) == ['حلمت بقطة', 'رأيت البحر']
+
+
+def test_json_array_import(client, make_user):
+    _, headers = make_user()
+    body = json.dumps([{'dream_text': 'حلم أول'}, {'dream_text': ''}, {'dream_text': 'حلم ثالث'}])
+
+    result = post_import(client, headers, body, 'application/json').get_json()
+    assert (result['imported'], result['failed']) == (2, 1)
+    assert result['errors'] == [{'index': 1, 'message': 'Dream text cannot be empty'}]
+
+
+def test_malformed_array_imports_nothing(client, make_user):
+    _, headers = make_user()
+    response = post_import(client, headers, '[{"dream_text": "حلم"}, {"dream_text"', 'application/json')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid JSON in dream 1'
+    assert client.get('/api/dreams', headers=headers).get_json()['dreams'] == []
+
+
+def test_unsupported_content_type(client, make_user):
+    _, headers = make_user()
+    assert post_import(client, headers, 'dream_text=x', 'text/plain').status_code == 415
+
+
+def test_export_imports_back(client, make_user):
+    _, source = make_user()
+    _, target = make_user()
+    post_import(client, source, json.dumps({'dream_text': 'رأيت البحر', 'mood_before': 'calm'}), 'application/x-ndjson')
+
+    exported = client.get('/api/dreams/export', headers=source).get_data()
+    result = post_import(client, target, exported, 'application/x-ndjson').get_json()
+    assert (result['imported'], result['failed']) == (1, 0)
+    dream = client.get('/api/dreams', headers=target).get_json()['dreams'][0]
+    assert (dream['dream_text'], dream['mood_before']) == ('رأيت البحر', 'calm')
+
+
+def test_analyze_queues_jobs_and_wakes_the_workers(app, client, make_user, credits_of, monkeypatch):
+    user_id, headers = make_user(credits=3)
+    calls = []
+    monkeypatch.setitem(app.config, 'ANALYSIS_JOBS_ENABLED', True)
+    monkeypatch.setattr(job_workers, 'ensure_started', lambda: calls.append('ensure_started'))
+    monkeypatch.setattr(job_workers, 'notify', lambda: calls.append('notify'))
+
+    body = '\n'.join(json.dumps({'dream_text': text}) for text in ('حلم أول', 'حلم ثان'))
+    result = post_import(client, headers, body, 'application/x-ndjson', analyze='true').get_json()
+    assert len(result['jobs']) == 2 and result['credits_charged'] == 2
+    assert credits_of(user_id) == 1
+    assert calls == ['ensure_started', 'notify']
+
+
+def test_missing_and_empty_dream_text_are_told_apart():
+    assert validate_row({'analysis': 'x'}, 'user', None) == (None, 'dream_text is required')
+    assert validate_row({'dream_text': None}, 'user', None) == (None, 'Dream text cannot be empty')
+    assert validate_row({'dreamText': 7}, 'user', None) == (None, 'dream_text must be a string')
+
+
+def test_json_array_reader_handles_chunk_boundaries():
+    items = [{'dream_text': 'حلم ' * n, 'n': 10 ** n} for n in range(1, 6)]
+    stream = io.BytesIO(json.dumps(items).encode('utf-8'))
+    assert [item for _, _, item, _ in iter_json_array(stream, chunk_size=3)] == items
+    with pytest.raises(ImportFormatError):
+        list(iter_json_array(io.BytesIO(b'{"dream_text": "x"}')))
@@ -0,0 +1,84 @@
+"""Dream history pagination: keyset cursors and the legacy page parameter"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, DreamAnalysis
+from pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def journal(app, make_user):
+    """A user with 7 dreams, three sharing one created_at; returns (headers, ids newest first)"""
+    user_id, headers = make_user()
+    start = datetime(2026, 1, 1)
+    times = [start + timedelta(hours=n) for n in range(4)] + [start + timedelta(hours=5)] * 3
+    with app.app_context():
+        dreams = [
+            DreamAnalysis(user_id=user_id, dream_text=f'حلم {n}', analysis='تفسير', advice='نصيحة', created_at=when)
+            for n, when in enumerate(times)
+        ]
+        db.session.add_all(dreams)
+        db.session.commit()
+        ordered = sorted(dreams, key=lambda dream: (dream.created_at, dream.id), reverse=True)
+        return headers, [dream.id for dream in ordered]
+
+
+def test_cursor_pages_cover_every_dream_once(client, journal):
+    headers, ids = journal
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {'per_page': 3}
+        if cursor:
+            params['cursor'] = cursor
+        body = client.get('/api/dreams', query_string=params, headers=headers).get_json()
+        seen += [dream['id'] for dream in body['dreams']]
+        pages += 1
+        cursor = body['next_cursor']
+        assert body['has_more'] is (cursor is not None)
+        if cursor is None:
+            break
+
+    assert seen == ids  # ties on created_at are split by id, nothing repeated or skipped
+    assert pages == 3
+
+
+def test_last_full_page_has_no_next_cursor(client, journal):
+    headers, ids = journal
+    body = client.get('/api/dreams', query_string={'per_page': len(ids)}, headers=headers).get_json()
+    assert len(body['dreams']) == len(ids)
+    assert body['next_cursor'] is None and body['has_more'] is False
+    assert 'total' not in body
+
+
+def test_include_total(client, journal):
+    headers, ids = journal
+    body = client.get('/api/dreams', query_string={'per_page': 2, 'include_total': 'true'}, headers=headers).get_json()
+    assert body['total'] == len(ids)
+    assert len(body['dreams']) == 2
+
+
+def test_invalid_cursor_is_rejected(client, journal):
+    headers, _ = journal
+    for cursor in ('not-a-cursor', encode_cursor(datetime(2026, 1, 1), 'x')[:-3]):
+        response = client.get('/api/dreams', query_string={'cursor': cursor}, headers=headers)
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'Invalid cursor'
+
+
+def test_page_parameter_keeps_offset_pagination(client, journal):
+    headers, ids = journal
+    body = client.get('/api/dreams', query_string={'page': 2, 'per_page': 3}, headers=headers).get_json()
+    assert [dream['id'] for dream in body['dreams']] == ids[3:6]
+    assert (body['total'], body['pages'], body['current_page']) == (len(ids), 3, 2)
+    assert 'next_cursor' not in body
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 17, 8, 30, 15, 123456)
+    cursor = encode_cursor(created_at, 'a1b2')
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (created_at, 'a1b2')
+    with pytest.raises(InvalidCursorError):
+        decode_cursor('!!!')
@@ -0,0 +1,80 @@
+"""Token-bucket rate limiting: rule parsing, both stores and the 429 response"""
+
+import pytest
+
+from ratelimit import DatabaseStore, MemoryStore, Rule, rate_limiter
+
+
+@pytest.fixture
+def limited(app, monkeypatch):
+    """Enable the limiter with the given {rule name: spec} for one test"""
+    def enable(rules, store=None):
+        monkeypatch.setattr(rate_limiter, 'enabled', True)
+        monkeypatch.setattr(rate_limiter, 'store', store or MemoryStore())
+        monkeypatch.setattr(rate_limiter, '_rules', {name: Rule.parse(spec) for name, spec in rules.items()})
+    return enable
+
+
+def test_rule_parse():
+    rule = Rule.parse('100/hour;burst=20')
+    assert (rule.count, rule.window, rule.capacity) == (100, 3600, 20)
+    assert rule.policy == '100;w=3600;burst=20'
+    assert Rule.parse('5/10s').window == 10
+    assert Rule.parse('') is None
+    with pytest.raises(ValueError):
+        Rule.parse('5/fortnight')
+
+
+def test_memory_bucket_refills_over_time():
+    store, rule = MemoryStore(), Rule.parse('2/minute')
+
+    assert store.take('k', rule, 1, 1000).allowed
+    assert store.take('k', rule, 1, 1000).allowed
+    rejected = store.take('k', rule, 1, 1000)
+    assert not rejected.allowed and rejected.retry_after == pytest.approx(30)
+    assert store.take('k', rule, 1, 1030).allowed
+    assert store.take('other', rule, 1, 1000).allowed
+
+
+def test_database_bucket_is_shared(app):
+    store, rule = DatabaseStore(), Rule.parse('2/minute')
+
+    with app.app_context():
+        store.clear()
+        assert store.take('k', rule, 1, 1000).allowed
+        assert DatabaseStore().take('k', rule, 1, 1000).allowed  # another worker
+        assert not store.take('k', rule, 1, 1000).allowed
+        assert store.take('k', rule, 1, 1030).allowed
+        store.clear()
+
+
+def test_rejected_request_gets_429_with_retry_after(client, limited):
+    limited({'login': '2/minute'})
+    credentials = {'login': 'nobody', 'password': 'wrong-password'}
+
+    for remaining in (1, 0):
+        response = client.post('/api/auth/login', json=credentials)
+        assert response.status_code == 404  # unknown user, still counted
+        assert response.headers['RateLimit-Remaining'] == str(remaining)
+        assert response.headers['RateLimit-Policy'] == '2;w=60'
+
+    response = client.post('/api/auth/login', json=credentials)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+    assert response.get_json()['retry_after'] == 30
+
+
+def test_limits_are_per_user(client, limited, make_user):
+    limited({'export': '1/hour'})
+    _, first = make_user()
+    _, second = make_user()
+
+    assert client.get('/api/dreams/export', headers=first).status_code == 200
+    assert client.get('/api/dreams/export', headers=first).status_code == 429
+    assert client.get('/api/dreams/export', headers=second).status_code == 200
+
+
+def test_disabled_limiter_adds_no_headers(client):
+    response = client.post('/api/auth/login', json={'login': 'nobody', 'password': 'wrong-password'})
+    assert response.status_code == 404
+    assert 'RateLimit-Limit' not in response.headers
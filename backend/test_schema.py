@@ -0,0 +1,52 @@
+"""Startup migrations: stamping databases made before migrations ran"""
+
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from flask_migrate import Migrate
+from sqlalchemy import inspect
+
+from models import db
+from schema import MIGRATIONS_DIR, current_revision, upgrade_database
+
+HEAD = '20261017_100000'
+
+
+def database_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    Migrate(app, db, directory=MIGRATIONS_DIR)
+    return app
+
+
+def test_empty_alembic_version_table_is_stamped(tmp_path):
+    # instance/dreams_v2.db has the baseline tables and an empty alembic_version
+    path = tmp_path / 'dreams.db'
+    shutil.copy(Path(__file__).parent / 'instance' / 'dreams_v2.db', path)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT COUNT(*) FROM alembic_version').fetchone() == (0,)
+
+    app = database_app(path)
+    with app.app_context():
+        assert current_revision() is None
+        upgrade_database()
+        assert current_revision() == HEAD
+        columns = {column['name'] for column in inspect(db.engine).get_columns('users')}
+        assert 'data_version' in columns
+        upgrade_database()  # already at head
+        assert current_revision() == HEAD
+
+
+def test_failed_migration_names_the_database(tmp_path):
+    path = tmp_path / 'broken.db'
+    with sqlite3.connect(path) as connection:
+        connection.execute('CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)')
+        connection.execute("INSERT INTO alembic_version VALUES ('no_such_revision')")
+
+    app = database_app(path)
+    with app.app_context(), pytest.raises(RuntimeError, match='Database migration failed for .*broken.db'):
+        upgrade_database()
@@ -0,0 +1,49 @@
+"""Dream search: the index comes from the migrations, on any app instance"""
+
+import sqlalchemy as sa
+
+from models import db, DreamAnalysis, User
+from schema import upgrade_database
+
+
+def add_dream(user_id, dream_text):
+    dream = DreamAnalysis(user_id=user_id, dream_text=dream_text, analysis='تفسير', advice='نصيحة')
+    db.session.add(dream)
+    db.session.commit()
+    return dream.id
+
+
+def test_search_finds_the_users_dreams(app, client, make_user):
+    user_id, headers = make_user()
+    other_id, other = make_user()
+    with app.app_context():
+        dream_id = add_dream(user_id, 'رأيت البحر هائجا')
+        add_dream(other_id, 'رأيت البحر هادئا')
+
+    body = client.get('/api/dreams/search', query_string={'q': 'بحر'}, headers=headers).get_json()
+    assert [dream['id'] for dream in body['dreams']] == [dream_id]
+    assert body['total'] == 1
+    assert client.get('/api/dreams/search', query_string={'q': 'طائرة'}, headers=other).get_json()['dreams'] == []
+
+
+def test_new_app_instance_gets_the_index_from_the_migrations():
+    from app import create_app
+    from search import search_index
+
+    instance = create_app('testing')
+    with instance.app_context():
+        db.create_all()  # a database made before migrations ran at startup
+        user = User(email='legacy@test.local', username='legacy')
+        user.set_password('secret1')
+        db.session.add(user)
+        db.session.commit()
+        dream_id = add_dream(user.id, 'كنت أسبح في البحر')
+        assert not sa.inspect(db.engine).has_table('dream_search')
+
+        upgrade_database()  # creates dream_search and indexes the stored dream
+        matches, total = search_index.search(user.id, 'البحر')
+        assert [match for match, _ in matches] == [dream_id] and total == 1
+
+        later_id = add_dream(user.id, 'بحر واسع')
+        matches, total = search_index.search(user.id, 'بحر')
+        assert {match for match, _ in matches} == {dream_id, later_id} and total == 2
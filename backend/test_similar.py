@@ -0,0 +1,130 @@
+"""Similar dreams: building, appending, replacing and compacting per-user vectors"""
+
+import threading
+
+import pytest
+from sqlalchemy import event
+
+pytest.importorskip('numpy')
+
+from models import db, DreamAnalysis
+from similar import SimilarIndex, fcntl
+
+
+@pytest.fixture
+def index(app, tmp_path, monkeypatch):
+    """A SimilarIndex on its own directory, listening to the app's session"""
+    monkeypatch.setitem(app.config, 'SIMILAR_ENABLED', True)
+    monkeypatch.setitem(app.config, 'SIMILAR_INDEX_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'SIMILAR_DIMENSIONS', 256)
+    monkeypatch.setitem(app.config, 'SIMILAR_COMPACT_DEAD_ROWS', 100)
+    index = SimilarIndex()
+    index.init_app(app)
+    yield index
+    for name, listener in (('after_flush', index._after_flush), ('after_commit', index._after_commit),
+                           ('after_rollback', index._after_rollback)):
+        event.remove(db.session, name, listener)
+
+
+@pytest.fixture
+def dreams(app, make_user):
+    """A user with three dreams: two about the sea, one about fire; returns (user id, ids)"""
+    user_id, _ = make_user()
+    texts = ['كنت أسبح في البحر والأمواج عالية', 'رأيت البحر والأمواج من بعيد', 'اشتعلت النار في المطبخ']
+    with app.app_context():
+        rows = [DreamAnalysis(user_id=user_id, dream_text=text, analysis='', advice='') for text in texts]
+        db.session.add_all(rows)
+        db.session.commit()
+        return user_id, [row.id for row in rows]
+
+
+def add_dream(user_id, text):
+    dream = DreamAnalysis(user_id=user_id, dream_text=text, analysis='', advice='')
+    db.session.add(dream)
+    db.session.commit()
+    return dream.id
+
+
+def test_build_ranks_the_closest_dream_first(app, index, dreams):
+    user_id, (sea, sea_again, fire) = dreams
+    with app.app_context():
+        assert index.build(user_id) == 3
+        matches = index.similar(user_id, sea, 'كنت أسبح في البحر والأمواج عالية')
+    assert matches[0][0] == sea_again
+    assert sea not in [match for match, _ in matches]
+    assert index.to_dict()['built'] == 1
+
+
+def test_committed_dream_is_appended(app, index, dreams):
+    user_id, (sea, _, _) = dreams
+    with app.app_context():
+        add_dream(user_id, 'حلم قبل أول بحث')
+        assert index.to_dict()['appended'] == 0  # no files yet: built on the first query
+        index.build(user_id)
+        new = add_dream(user_id, 'سبحت في البحر مع الأمواج العالية')
+        assert index.to_dict()['appended'] == 1
+        assert new in [match for match, _ in index.similar(user_id, sea, '')]
+
+
+@pytest.mark.skipif(fcntl is None, reason='needs the cross-process file lock')
+def test_dream_committed_during_the_first_build_is_appended(app, index, dreams):
+    user_id, (sea, _, _) = dreams
+    with app.app_context():
+        late = add_dream(user_id, 'البحر والأمواج مرة أخرى')  # committed before any index exists
+        vectors_path, ids_path, _ = index._paths(user_id)
+        building = index._locked(user_id)
+        building.__enter__()  # a first build is running
+        appending = threading.Thread(target=index.append, args=(user_id, [(late, 'البحر والأمواج مرة أخرى')]))
+        appending.start()
+        appending.join(0.2)
+        assert appending.is_alive()  # waits for the build instead of skipping the dream
+        for path in (vectors_path, ids_path):
+            open(path, 'wb').close()  # the build's select ran before the commit
+        building.__exit__(None, None, None)
+        appending.join()
+
+        assert index._load(user_id).ids == [late]
+
+
+def test_reanalysis_replaces_the_vector(app, index, dreams):
+    user_id, (sea, sea_again, fire) = dreams
+    with app.app_context():
+        index.build(user_id)
+        dream = db.session.get(DreamAnalysis, fire)
+        dream.dream_text = 'غرقت في البحر بين الأمواج'
+        db.session.commit()
+
+        loaded = index._load(user_id)
+        assert (loaded.size, len(loaded.live)) == (4, 3)
+        assert loaded.live[fire] == 3  # the old fire vector is superseded
+        assert {match for match, _ in index.similar(user_id, fire, '')} == {sea, sea_again}
+
+
+def test_deleted_dreams_are_skipped(app, index, dreams):
+    user_id, (sea, sea_again, fire) = dreams
+    with app.app_context():
+        index.build(user_id)
+        db.session.delete(db.session.get(DreamAnalysis, sea_again))
+        db.session.commit()
+
+        index.note_deleted(user_id, [sea_again])
+        assert sea_again not in [match for match, _ in index.similar(user_id, sea, '')]
+        index.build(user_id)
+        assert sea_again not in index._load(user_id).live
+
+
+def test_dead_rows_trigger_a_compaction(app, index, dreams):
+    user_id, (sea, sea_again, fire) = dreams
+    index.compact_dead_rows = 2
+    with app.app_context():
+        index.build(user_id)
+        dream = db.session.get(DreamAnalysis, fire)
+        for text in ('النار في البيت', 'النار في الغابة'):
+            dream.dream_text = text
+            db.session.commit()
+        assert index._load(user_id).size == 5
+
+        index.similar(user_id, sea, '')
+        loaded = index._load(user_id)
+        assert loaded.size == len(loaded.live) == 3
+        assert index.to_dict()['compacted'] == 1
@@ -0,0 +1,56 @@
+"""Symbol extraction: real symbols are tagged, look-alike words are not"""
+
+import pytest
+
+from symbols import extract_tags, merge_tags
+
+
+@pytest.mark.parametrize('text', [
+    'ذهبت إلى العمل فقط',
+    'ركبت القطار',
+    'قطعة خبز',
+    'صديقي كمال',
+    'حلقة',
+    'دارت الأيام',
+    'I cared a lot',
+])
+def test_look_alike_words_are_not_symbols(text):
+    assert extract_tags(text) == []
+
+
+def test_cared_is_not_car():
+    # 'cars' is a real match; 'cared' must not add a second reason for it
+    assert extract_tags('I cared about cars') == ['car']
+    assert extract_tags('I cared about them') == []
+
+
+@pytest.mark.parametrize('text, tags', [
+    ('رأيت قطة سوداء', ['animal']),
+    ('رأيت القطط في الشارع', ['animal']),
+    ('وجدت كنزا من الذهب', ['money']),
+    ('سقطت من مكان عال', ['falling']),
+    ('رأيت نارا في البيت', ['fire', 'house']),
+    ('والبحر هائج', ['water']),
+    ('هربت من الكلب', ['chase', 'animal']),
+    ('رأيت أمي تبكي', ['family']),
+    ('I was flying over the sea', ['flying', 'water']),
+    ('the cats chased me', ['animal', 'chase']),
+])
+def test_symbols_are_found(text, tags):
+    assert extract_tags(text) == tags
+
+
+def test_short_stems_take_no_one_letter_prefix():
+    assert extract_tags('فقط') == []
+    assert extract_tags('كمال') == []
+    assert extract_tags('بالنار') == ['fire']
+
+
+def test_symbol_must_start_a_word():
+    assert extract_tags('رأيت السماء') == []
+    assert extract_tags('searching the research') == ['lost']
+
+
+def test_merge_keeps_client_tags_first():
+    assert merge_tags(['رحلة', 'water'], 'رأيت بحرا والقطة') == ['رحلة', 'water', 'animal']
+    assert merge_tags('not a list', 'فقط') == []